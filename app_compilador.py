@@ -1,15 +1,36 @@
 import sys
 import os
+import argparse
+import atexit
+import ctypes
+import threading
+import queue
 import subprocess
 import time
 import shutil
 import tempfile  # Para crear carpeta temporal estándar
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from PIL import Image
-from docx import Document
-from fpdf import FPDF
-from PyPDF2 import PdfMerger, PdfReader, PdfWriter
+import io
+import functools
+import zlib
+import collections
+import csv
+import heapq
+import itertools
+import contextlib
+import hashlib
+import json
+import re
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+# Pillow y python-docx se importan dentro de las funciones que convierten imágenes y DOCX:
+# la ventana aparece antes y cada proceso carga solo lo que usan los archivos que recibe.
+# Tk se importa en run_gui: la línea de comandos y el servicio funcionan sin él
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, NumberObject, StreamObject
+)
 from PyPDF2.errors import PdfReadError
 from pathlib import Path  # Para manejo seguro de rutas
 
@@ -17,415 +38,4915 @@ from pathlib import Path  # Para manejo seguro de rutas
 selected_mode = None
 selected_files = []
 
+# Estado de la compilación en segundo plano de la interfaz
+compile_thread = None
+cancel_event = None
+progress_queue = queue.Queue()
+PROGRESS_POLL_MS = 100
+# Tramo de la barra de progreso (inicio, ancho en %) que ocupa cada etapa
+PROGRESS_STAGES = {
+    "analizando": (0, 5),
+    "convirtiendo": (5, 55),
+    "uniendo": (60, 15),
+    "optimizando": (75, 5),
+    "comprimiendo": (80, 20),
+}
 
-def txt_to_pdf(text_path, pdf_path):
-    """Convierte un archivo de texto a PDF."""
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Arial", size=12)
-    with open(text_path, "r", encoding="utf-8") as f:
-        for line in f:
-            pdf.multi_cell(0, 10, line)
-    pdf.output(pdf_path)
+# Archivo donde la interfaz agrega las métricas de cada compilación (ver write_metrics);
+# sin definir COMPILADOR_METRICAS no se mide nada
+METRICS_PATH = os.environ.get("COMPILADOR_METRICAS")
+# Con COMPILADOR_MEDIR_ARRANQUE definida la ventana se cierra apenas se dibuja, para que
+# benchmarks/benchmark_arranque.py mida cuánto tarda en aparecer
+STARTUP_PROBE = bool(os.environ.get("COMPILADOR_MEDIR_ARRANQUE"))
 
+# Cantidad de procesos para la etapa de conversión (None = todos los núcleos disponibles)
+MAX_WORKERS = None
 
-def docx_to_pdf(docx_path, pdf_path):
-    """Convierte un archivo DOCX a PDF."""
-    doc = Document(docx_path)
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Arial", size=12)
-    for para in doc.paragraphs:
-        pdf.multi_cell(0, 10, para.text)
-    pdf.output(pdf_path)
+# Caché persistente de PDFs intermedios, compartido entre ejecuciones
+CACHE_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "CompiladorPDF", "cache"
+)
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+# Cambiar esta versión cuando cambie la salida de algún conversor invalida el caché
+CONVERTER_VERSION = 4
 
+# Los PDFs intermedios de hasta este tamaño se pasan en memoria entre las etapas; los más
+# grandes se escriben en la carpeta temporal (ver SpooledPdf)
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+# Máximo que la etapa de conversión mantiene en memoria entre todos los PDFs intermedios
+# hasta unirlos; lo que sobra se escribe en la carpeta temporal
+SPOOL_TOTAL_MAX_BYTES = 256 * 1024 * 1024
+# Sufijo de los archivos que se escriben junto al destino antes de reemplazarlo (ver partial_path)
+PARTIAL_SUFFIX = ".parcial"
 
-def image_to_pdf(image_path, pdf_path):
-    """Convierte una imagen a PDF."""
-    image = Image.open(image_path)
-    if image.mode == "RGBA":
-        image = image.convert("RGB")
-    image.save(pdf_path, "PDF", resolution=100.0)
+# Umbrales de tamaño del PDF final para elegir la compresión de Ghostscript
+SIZE_LIMIT_NONE = 3 * 1024 * 1024
+SIZE_LIMIT_EBOOK = 8 * 1024 * 1024
+# Niveles de compresión, de menor a mayor
+COMPRESSION_LEVELS = ["none", "ebook", "screen"]
 
+# Tamaño máximo del PDF final (None = umbrales fijos). Con un máximo se busca la compresión
+# más suave que lo cumple (ver compress_to_size) entre estos niveles, de menor a mayor
+# degradación: (resolución de las imágenes en DPI, QFactor de JPEG; 0.15 es casi sin
+# pérdida y 2.4 la calidad mínima de Acrobat)
+TARGET_MAX_BYTES = None
+TARGET_LEVELS = [
+    (300, 0.4), (200, 0.4), (150, 0.4), (150, 0.76), (120, 0.76), (100, 0.76),
+    (85, 1.3), (72, 1.3), (60, 1.3), (50, 2.4),
+]
+# Páginas de la muestra con la que se prueban los niveles; se apunta a este margen por
+# debajo del máximo, y como mucho se hacen estas pasadas sobre el documento entero
+TARGET_SAMPLE_PAGES = 8
+TARGET_SIZE_MARGIN = 0.95
+TARGET_MAX_FULL_PASSES = 2
 
-def clean_pdf(input_path, output_path):
+# Optimización sin pérdida del PDF unido antes de decidir si hace falta Ghostscript (ver
+# optimize_pdf): nivel de zlib para los streams que se vuelven a comprimir y cantidad de
+# objetos por cada stream de objetos
+OPTIMIZE_PDF = True
+OPTIMIZE_ZLIB_LEVEL = 9
+OPTIMIZE_OBJECTS_PER_STREAM = 200
+# Filtros que se pueden decodificar y volver a codificar con Flate sin perder nada
+LOSSLESS_FILTERS = {
+    "/FlateDecode", "/Fl", "/LZWDecode", "/LZW", "/ASCIIHexDecode", "/AHx", "/ASCII85Decode", "/A85",
+}
+
+# Página de los PDFs de texto, igual que la que armaba FPDF (medidas en mm)
+MM_TO_POINTS = 72 / 25.4
+TEXT_PAGE_WIDTH_MM = 210.0
+TEXT_PAGE_HEIGHT_MM = 297.0
+# FPDF usa 1 cm redondeado a 28.35 pt de margen, y la décima parte dentro de cada celda
+TEXT_MARGIN_MM = 28.35 / MM_TO_POINTS
+TEXT_BOTTOM_MARGIN_MM = 15.0
+TEXT_CELL_MARGIN_MM = TEXT_MARGIN_MM / 10
+TEXT_LINE_HEIGHT_MM = 10.0
+TEXT_FONT_SIZE = 12.0
+# Ancho útil de un renglón en milésimas del tamaño de letra (la unidad de HELVETICA_WIDTHS)
+TEXT_MAX_WIDTH = (
+    (TEXT_PAGE_WIDTH_MM - 2 * TEXT_MARGIN_MM - 2 * TEXT_CELL_MARGIN_MM) * 1000.0 / (TEXT_FONT_SIZE / MM_TO_POINTS)
+)
+# Anchos de Helvetica por byte en WinAnsiEncoding (cp1252), los mismos que usa FPDF
+HELVETICA_WIDTHS = (
+    278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278,
+    278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278, 278,
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584, 350,
+    556, 350, 222, 556, 333, 1000, 556, 556, 333, 1000, 667, 333, 1000, 350, 611, 350,
+    350, 222, 222, 333, 333, 350, 556, 1000, 333, 1000, 500, 333, 944, 350, 500, 667,
+    278, 333, 556, 556, 556, 556, 260, 556, 333, 737, 370, 556, 584, 333, 737, 333,
+    400, 584, 333, 333, 333, 556, 537, 278, 333, 333, 365, 556, 834, 834, 834, 611,
+    667, 667, 667, 667, 667, 667, 1000, 722, 667, 667, 667, 667, 278, 278, 278, 278,
+    722, 722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722, 722, 667, 667, 611,
+    556, 556, 556, 556, 556, 556, 889, 500, 556, 556, 556, 556, 278, 278, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 584, 611, 556, 556, 556, 556, 500, 556, 500,
+)
+# Las palabras se repiten mucho (sobre todo en los logs): se guarda el ancho de hasta esta
+# cantidad de palabras distintas en lugar de sumarlo de nuevo (ver wrap_text)
+TEXT_WORD_CACHE_SIZE = 65536
+
+# Encabezados y tablas de los DOCX, con letra más chica que el cuerpo
+DOCX_SMALL_FONT_SIZE = 10.0
+DOCX_SMALL_LINE_HEIGHT_MM = 6.0
+DOCX_CELL_PADDING_MM = 1.0
+# Imágenes de DOCX ya codificadas que se guardan en memoria en cada proceso (ver encode_docx_image)
+DOCX_IMAGE_CACHE_SIZE = 32
+
+# Resolución con la que las imágenes se ubican en la página
+IMAGE_DPI = 100.0
+# Modos de imagen que se embeben como JPEG (DCTDecode); los JPEG en estos modos se copian sin decodificar
+JPEG_PASSTHROUGH_MODES = ("L", "RGB")
+# Máximo de imágenes consecutivas que se convierten juntas a un mismo PDF intermedio
+IMAGE_BATCH_SIZE = 50
+# Filas de cada franja al reducir imágenes (ver resize_image)
+IMAGE_BAND_ROWS = 512
+# Bytes por píxel aproximados de una imagen (no JPEG) codificada en el PDF, según su modo
+IMAGE_BYTES_PER_PIXEL = {"1": 0.02, "L": 0.1}
+# Reducción de imágenes al convertir según el nivel que necesitaría el resultado,
+# equivalente a lo que haría Ghostscript (/ebook mantiene 100 DPI, /screen baja a 72)
+IMAGE_OPTIONS = {
+    "none": {},
+    "ebook": {"quality": 60},
+    "screen": {"max_dpi": 72, "quality": 50},
+}
+# Proporción aproximada del tamaño de las imágenes después de esa reducción
+IMAGE_SIZE_FACTOR = {"none": 1.0, "ebook": 0.8, "screen": 0.4}
+
+# Tipo de conversión de cada extensión soportada
+INPUT_KINDS = {".pdf": "pdf", ".png": "image", ".jpg": "image", ".jpeg": "image", ".txt": "txt", ".docx": "docx"}
+# Análisis previo de las entradas (ver scan_inputs): hilos y bytes que se leen del final de cada PDF
+SCAN_MAX_THREADS = 8
+SCAN_TRAILER_BYTES = 1024
+# Costo aproximado de convertir cada tipo de archivo en el pool, para repartir primero los más
+# caros: (segundos fijos, segundos por MB de entrada, segundos por megapíxel decodificado).
+# "jpeg" son los JPEG que se copian sin decodificar; los PDFs no se convierten (se leen al unir)
+CONVERSION_COST = {
+    "pdf": (0.001, 0.0, 0.0),
+    "jpeg": (0.002, 0.0, 0.0),
+    "image": (0.005, 0.0, 0.045),
+    "txt": (0.002, 0.5, 0.0),
+    "docx": (0.01, 0.5, 0.0),
+}
+
+# Modo incremental: registro de las fuentes de cada PDF unido, junto a él con extensión .json
+SOURCE_RECORD_VERSION = 1
+# Se reconstruye desde cero cuando las páginas descartadas por actualizaciones superan
+# esta proporción de las páginas vigentes (el archivo crece con cada actualización)
+INCREMENTAL_MAX_DEAD_RATIO = 1.0
+
+# Modo vigilancia (ver FolderWatcher): cada cuánto se revisan las carpetas, y cuánto tiempo
+# sin cambios tiene que pasar antes de compilar una (los archivos que se están copiando cambian)
+WATCH_POLL_SECONDS = 2.0
+WATCH_DEBOUNCE_SECONDS = 10.0
+
+# Modo servicio (ver CompileServer): dirección por defecto (solo esta máquina), tamaño máximo
+# de los archivos subidos en un trabajo, tamaño de los pedazos en que se envía el PDF, y cuánto
+# se guarda el resultado de un trabajo terminado para descargarlo
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_MAX_UPLOAD_BYTES = 256 * 1024 * 1024
+SERVER_CHUNK_BYTES = 1024 * 1024
+# Tamaño máximo de un pedido JSON (rutas, no archivos: se lee entero en memoria)
+SERVER_MAX_JSON_BYTES = 1024 * 1024
+SERVER_RESULT_TTL_SECONDS = 3600
+# Nivel con el que se deja inicializado el intérprete de Ghostscript al arrancar el servicio
+SERVER_WARM_PDF_SETTING = "/ebook"
+
+# Profundidad máxima de referencias que se siguen al copiar un objeto para deduplicarlo;
+# más abajo los objetos se copian sin deduplicar, para no agotar la pila de Python
+DEDUP_MAX_DEPTH = 100
+
+# Compresión por tramos: documentos con más páginas se dividen y se comprimen en paralelo
+GS_CHUNK_PAGES = 100
+# Procesos de Ghostscript simultáneos (None = todos los núcleos disponibles)
+GS_MAX_PROCESSES = None
+
+# Librería gsapi de Ghostscript, buscada junto a gswin64c.exe (ver GhostscriptWorker)
+GS_LIBRARY_NAMES = ["gsdll64.dll", "libgs.so.10", "libgs.so", "libgs.dylib"]
+GS_PERMIT_FILE_READING = 0
+GS_PERMIT_FILE_WRITING = 1
+# Handle de la salida estándar en la API de Windows (ver diagnostics_to_stderr)
+STD_OUTPUT_HANDLE = -11
+
+# Estado de Ghostscript del proceso: ruta resuelta y librería cargada
+_gs_executable = None
+_gs_worker = None
+_gs_worker_unavailable = False
+_gs_worker_lock = threading.Lock()
+
+# Anchos ya medidos de las palabras del texto plano (ver wrap_text y TEXT_WORD_CACHE_SIZE)
+_word_widths = {}
+
+
+def txt_to_pdf(text_path, pdf_path):
     """
-    Limpia un PDF para evitar errores de lectura.
-    Devuelve True si se pudo limpiar, False si el PDF está corrupto.
+    Convierte un archivo de texto a PDF.
+    Usa la misma página que antes con FPDF (A4, Helvetica 12, renglones de 10 mm, texto
+    justificado al cortar líneas largas), pero lee el archivo de a una línea y escribe
+    cada página apenas se completa: la memoria no depende del tamaño del archivo.
     """
+    writer = TextPdfWriter(pdf_path)
     try:
-        reader = PdfReader(input_path)
-        writer = PdfWriter()
-        for page in reader.pages:
-            writer.add_page(page)
-        writer.add_metadata({})
-        with open(output_path, "wb") as f_out:
-            writer.write(f_out)
-        return True
-    except PdfReadError as e:
-        print(f"Error leyendo el PDF {input_path}: {e}. Saltando este archivo.")
-        return False
+        with open(text_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                writer.add_paragraph(line)
+    finally:
+        writer.close()
 
 
-def compress_pdf(input_path, output_path, compression_level="none"):
+def docx_to_pdf(docx_path, pdf_path):
     """
-    Comprime el PDF usando Ghostscript según el nivel de compresión.
+    Convierte un archivo DOCX a PDF. Los párrafos se escriben como antes (Helvetica 12,
+    renglones de 10 mm); las tablas y las imágenes en línea se dibujan en el orden en que
+    aparecen, y el encabezado de la primera sección se repite en cada página.
     """
-    if compression_level == "none":
-        return input_path
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.text.paragraph import Paragraph
 
-    if getattr(sys, 'frozen', False):
-        base_path = os.path.dirname(sys.executable)
-    else:
-        base_path = os.path.dirname(os.path.abspath(__file__))
+    doc = Document(docx_path)
+    header = []
+    if doc.sections and not doc.sections[0].header.is_linked_to_previous:
+        header = [p.text for p in doc.sections[0].header.paragraphs if p.text.strip()]
 
-    # gs_executable = os.path.join(base_path,"DistribucionApp", "gs", "gs10.05.1", "bin", "gswin64c.exe")
-    gs_executable = os.path.join(base_path, "gs", "gs10.05.1", "bin", "gswin64c.exe")
+    writer = DocxPdfWriter(pdf_path, header)
+    try:
+        for block in doc.element.body.iterchildren():
+            if block.tag == qn("w:p"):
+                text = Paragraph(block, doc).text
+                # Igual que multi_cell: un salto de línea al final no agrega un renglón
+                if text.endswith("\n"):
+                    text = text[:-1]
+                for line in text.split("\n"):
+                    writer.add_paragraph(line)
+                for drawing in block.iter(qn("w:drawing")):
+                    add_docx_drawing(writer, doc, drawing)
+            elif block.tag == qn("w:tbl"):
+                rows = []
+                for row in block.iterchildren(qn("w:tr")):
+                    # Las celdas combinadas a lo ancho son un solo <w:tc> con gridSpan
+                    rows.append([
+                        ("\n".join(Paragraph(p, doc).text for p in cell.iterchildren(qn("w:p"))), cell.grid_span)
+                        for cell in row.iterchildren(qn("w:tc"))
+                    ])
+                writer.add_table(rows)
+    finally:
+        writer.close()
 
-    print("Ruta a Ghostscript:", gs_executable)
-    print("¿Existe Ghostscript en esa ruta?", os.path.exists(gs_executable))
 
-    if compression_level == "ebook":
-        pdf_setting = "/ebook"
-    elif compression_level == "screen":
-        pdf_setting = "/screen"
-    else:
-        pdf_setting = "/screen"
+def add_docx_drawing(writer, doc, drawing):
+    """Agrega la imagen de un <w:drawing> del documento; las que no se pueden leer se saltan."""
+    from docx.oxml.ns import qn
 
-    args = [
-        gs_executable,
-        "-sDEVICE=pdfwrite",
-        "-dCompatibilityLevel=1.4",
-        f"-dPDFSETTINGS={pdf_setting}",
-        "-dNOPAUSE",
-        "-dQUIET",
-        "-dBATCH",
-        f"-sOutputFile={output_path}",
-        input_path
-    ]
+    extent = drawing.find(".//" + qn("wp:extent"))
+    blip = drawing.find(".//" + qn("a:blip"))
+    if extent is None or blip is None:
+        return
+    part = doc.part.related_parts.get(blip.get(qn("r:embed")))
+    if part is None:
+        return
+    # Las medidas del DOCX están en EMU: 36000 por milímetro
+    width_mm = int(extent.get("cx")) / 36000
+    height_mm = int(extent.get("cy")) / 36000
+    if width_mm <= 0 or height_mm <= 0:
+        return
     try:
-        subprocess.run(args, check=True)
-        if os.path.exists(output_path):
-            print(f"Archivo comprimido creado: {output_path}, tamaño: {os.path.getsize(output_path)} bytes")
-        else:
-            print(f"Archivo comprimido NO creado: {output_path}")
-        try:
-            if os.path.exists(output_path) and os.path.getsize(output_path) < os.path.getsize(input_path):
-                return output_path
-            else:
-                if os.path.exists(output_path):
-                    os.remove(output_path)
-                return input_path
-        except Exception as e:
-            print(f"Error verificando tamaño archivo comprimido: {e}")
-            return input_path
+        writer.add_image(part.blob, width_mm, height_mm)
     except Exception as e:
-        print(f"Error al comprimir PDF: {e}")
-        return input_path
+        print(f"No se pudo agregar una imagen del documento: {e}")
 
 
-def compile_pdfs_in_directory(directory):
+def resize_image(image, size):
     """
-    Compila y une PDFs a partir de todos los archivos en un directorio.
-    Usa una carpeta temporal estándar para archivos intermedios.
+    Reduce la imagen a size (LANCZOS) por franjas horizontales. Pillow reduce en dos pasadas
+    y arma una imagen intermedia casi del tamaño del original; por franjas solo se arma
+    la de cada franja. Los bordes entre franjas no se notan porque cada una usa los
+    píxeles vecinos del original.
     """
-    temp_dir = tempfile.mkdtemp(prefix="temp_pdfs_compilador_")
-    print(f"Carpeta temporal creada para directorio: {temp_dir}")
+    from PIL import Image
 
-    merger = PdfMerger()
+    result = Image.new(image.mode, size)
+    scale_y = image.height / size[1]
+    for top in range(0, size[1], IMAGE_BAND_ROWS):
+        bottom = min(size[1], top + IMAGE_BAND_ROWS)
+        box = (0, top * scale_y, image.width, bottom * scale_y)
+        result.paste(image.resize((size[0], bottom - top), Image.LANCZOS, box=box), (0, top))
+    return result
 
-    for filename in sorted(os.listdir(directory)):
-        filepath = os.path.join(directory, filename)
-        name, ext = os.path.splitext(filename)
-        ext = ext.lower()
 
-        try:
-            if ext == ".pdf":
-                temp_pdf = os.path.join(temp_dir, f"{name}_clean.pdf")
-                print(f"Limpiando PDF: {filepath} -> {temp_pdf}")
-                if clean_pdf(filepath, temp_pdf):
-                    merger.append(temp_pdf)
-                else:
-                    print(f"Saltando PDF corrupto: {filepath}")
-            elif ext in [".png", ".jpg", ".jpeg"]:
-                temp_pdf = os.path.join(temp_dir, f"{name}_temp.pdf")
-                print(f"Convirtiendo imagen a PDF: {filepath} -> {temp_pdf}")
-                image_to_pdf(filepath, temp_pdf)
-                merger.append(temp_pdf)
-            elif ext == ".txt":
-                temp_pdf = os.path.join(temp_dir, f"{name}_temp.pdf")
-                print(f"Convirtiendo txt a PDF: {filepath} -> {temp_pdf}")
-                txt_to_pdf(filepath, temp_pdf)
-                merger.append(temp_pdf)
-            elif ext == ".docx":
-                temp_pdf = os.path.join(temp_dir, f"{name}_temp.pdf")
-                print(f"Convirtiendo docx a PDF: {filepath} -> {temp_pdf}")
-                docx_to_pdf(filepath, temp_pdf)
-                merger.append(temp_pdf)
+def image_to_pdf(image_path, pdf_path, max_dpi=None, quality=None):
+    """
+    Convierte una imagen a PDF.
+    max_dpi: si es menor que la resolución de página (100 DPI) reduce los píxeles
+    manteniendo el tamaño de la página. quality: calidad JPEG de la imagen embebida.
+    Ver ImagePdfWriter.add_image.
+    """
+    writer = ImagePdfWriter(pdf_path)
+    try:
+        writer.add_image(image_path, max_dpi, quality)
+    finally:
+        writer.close()
+
+
+def images_to_pdf(image_paths, pdf_path, max_dpi=None, quality=None, metrics=None):
+    """
+    Convierte varias imágenes a un único PDF, una página por imagen y en el mismo orden.
+    Devuelve la cantidad de páginas de cada imagen (0 si no se pudo convertir, y se salta).
+    metrics: PipelineMetrics donde se registra la conversión de cada imagen.
+    """
+    page_counts = []
+    writer = ImagePdfWriter(pdf_path)
+    try:
+        for image_path in image_paths:
+            try:
+                with measure_stage(metrics, "convirtiendo", image_path, os.path.getsize(image_path)) as record:
+                    start = writer.bytes_written
+                    writer.add_image(image_path, max_dpi, quality)
+                    record["bytes_out"] = writer.bytes_written - start
+            except Exception as e:
+                print(f"Error procesando {image_path}: {e}. Saltando este archivo.")
+                page_counts.append(0)
             else:
-                print(f"Extensión no soportada: {ext}, archivo: {filepath}")
-        except Exception as e:
-            print(f"Error procesando {filepath}: {e}. Saltando este archivo.")
+                page_counts.append(1)
+    finally:
+        writer.close()
+    return page_counts
 
-    dir_name = os.path.basename(os.path.normpath(directory))
-    output_pdf = os.path.join(directory, f"{dir_name}_UNIDO.pdf")
-    print(f"Archivo PDF final: {output_pdf}")
 
-    if len(merger.pages) > 0:
-        merger.write(output_pdf)
-        merger.close()
-    else:
-        merger.close()
-        shutil.rmtree(temp_dir)
-        raise ValueError("No se encontraron archivos PDF válidos para compilar.")
+class SpooledPdf:
+    """
+    Destino de escritura de un PDF intermedio: queda en memoria mientras no pase de
+    max_bytes (por defecto SPOOL_MAX_BYTES) y, si crece más, sigue en spill_path.
+    Como tempfile.SpooledTemporaryFile, pero el archivo tiene nombre para poder pasarlo
+    entre procesos. getvalue() devuelve los bytes o la ruta, también después de close().
+    """
 
-    size_bytes = os.path.getsize(output_pdf)
-    print(f"Tamaño archivo final: {size_bytes} bytes")
+    def __init__(self, spill_path, max_bytes=None):
+        self.spill_path = spill_path
+        self.max_bytes = SPOOL_MAX_BYTES if max_bytes is None else max_bytes
+        self._buffer = io.BytesIO()
+        self._file = None
+        self.closed = False
 
-    if size_bytes < 3 * 1024 * 1024:
-        compression_level = "none"
-    elif size_bytes < 8 * 1024 * 1024:
-        compression_level = "ebook"
-    else:
-        compression_level = "screen"
+    def write(self, data):
+        if self._file is None and self._buffer.tell() + len(data) > self.max_bytes:
+            self._file = open(self.spill_path, "wb")
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        if self._file is not None:
+            return self._file.write(data)
+        return self._buffer.write(data)
 
-    compressed_pdf = os.path.join(directory, f"{dir_name}_unido_comprimido.pdf")
-    print(f"Archivo PDF comprimido: {compressed_pdf}")
-    final_pdf = compress_pdf(output_pdf, compressed_pdf, compression_level=compression_level)
+    def tell(self):
+        return (self._file or self._buffer).tell()
 
-    # Si se creó un archivo comprimido, reemplazamos el original y devolvemos la ruta correcta
-    if final_pdf != output_pdf:
-        os.replace(final_pdf, output_pdf)
-        final_path = output_pdf
-    else:
-        final_path = output_pdf
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self.closed = True
 
-    try:
-        shutil.rmtree(temp_dir)
-    except Exception as e:
-        print(f"Error eliminando directorio temporal {temp_dir}: {e}")
+    def getvalue(self):
+        """Bytes del PDF si quedó en memoria, o la ruta del archivo si pasó a disco."""
+        if self._file is not None:
+            return self.spill_path
+        return self._buffer.getvalue()
 
-    # Devolvemos la ruta del archivo final (comprimido o no)
-    return final_path
 
+def source_size(source):
+    """Tamaño de un PDF intermedio, sea una ruta o sus bytes (ver SpooledPdf)."""
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
 
-def compile_pdfs_from_files(files):
+
+def pdf_reader(source):
+    """PdfReader de un PDF intermedio, sea una ruta o sus bytes."""
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def named_destinations(reader):
     """
-    Compila y une PDFs a partir de una lista de archivos específicos.
-    Usa una carpeta temporal estándar para archivos intermedios.
-    NOTA: No elimina la carpeta temporal aquí para evitar borrar el archivo final antes de moverlo.
+    Destinos con nombre del PDF (/Dests del catálogo y el árbol /Names /Dests), como
+    {nombre: destino explícito}. StreamingPdfMerger no copia el catálogo, así que los enlaces
+    que los usan se reescriben con el destino explícito.
     """
-    temp_dir = tempfile.mkdtemp(prefix="temp_pdfs_compilador_")
-    print(f"Carpeta temporal creada para archivos: {temp_dir}")
+    root = reader.trailer["/Root"]
+    result = {}
+
+    def add(name, value):
+        value = value.get_object()
+        if isinstance(value, DictionaryObject):
+            value = value.get("/D", NullObject()).get_object()
+        if isinstance(value, ArrayObject):
+            result[str(name)] = value
+
+    dests = root.get("/Dests")
+    if dests is not None:
+        for name, value in dests.get_object().items():
+            add(name, value)
+    names = root.get("/Names")
+    pending = [names.get_object().get("/Dests")] if names is not None else []
+    visited = set()
+    while pending:
+        node = pending.pop()
+        if node is None:
+            continue
+        if isinstance(node, IndirectObject):
+            if node.idnum in visited:
+                continue
+            visited.add(node.idnum)
+        node = node.get_object()
+        if not isinstance(node, DictionaryObject):
+            continue
+        pairs = node.get("/Names", ArrayObject()).get_object()
+        for index in range(0, len(pairs) - 1, 2):
+            add(pairs[index].get_object(), pairs[index + 1])
+        pending.extend(node.get("/Kids", ArrayObject()).get_object())
+    return result
+
+
+def _pdf_number(value):
+    """Número real para escribir en un PDF: hasta cuatro decimales, sin ceros de más."""
+    return (b"%.4f" % value).rstrip(b"0").rstrip(b".")
+
+
+class StreamingPdfMerger:
+    """
+    Une PDFs escribiendo cada objeto directamente en el archivo de salida.
+    Cada fuente se lee una sola vez y sus páginas se copian sin metadatos (/Info),
+    igual que hacía clean_pdf. Solo se mantiene en memoria la fuente que se está
+    copiando, así que el pico de memoria depende del PDF más grande y no del total.
+
+    Los objetos copiados se escriben una sola vez aunque se repitan: cada uno se identifica
+    por el hash de su contenido ya renumerado, así que un logo, una fuente o un documento
+    entero que aparece en varias fuentes reutiliza el objeto ya escrito. Las páginas en sí
+    no se comparten (cada una tiene que estar una sola vez en el árbol de páginas), pero sí
+    su contenido y sus recursos.
+
+    Los enlaces a páginas que no se copian en el mismo append (de otra parte del documento,
+    o que quedaron fuera de la selección) se quitan, en lugar de dejar destinos vacíos.
+    """
+
+    def __init__(self, output_path):
+        # output_path también puede ser un destino ya abierto, como SpooledPdf
+        self.output_path = output_path
+        self._stream = open(output_path, "wb") if isinstance(output_path, (str, os.PathLike)) else output_path
+        self._stream.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets = {}
+        self._next_id = 1
+        self._pages_id = self._new_id()
+        self._page_ids = []
+        self._id_map = {}
+        self._pending = collections.deque()
+        self._unique = {}
+        self._copying = set()
+        self.duplicate_bytes = 0
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
 
-    merger = PdfMerger()
+    @property
+    def bytes_written(self):
+        return self._stream.tell()
 
-    for filepath in files:
-        print(f"Procesando archivo: {filepath}")
-        name, ext = os.path.splitext(os.path.basename(filepath))
-        ext = ext.lower()
+    @property
+    def final_size(self):
+        """Tamaño aproximado (por exceso) que tendrá el archivo al cerrarlo con close."""
+        return self._stream.tell() + 20 * (self._next_id + 1) + 16 * len(self._page_ids) + 256
 
+    def mark(self):
+        """Punto al que se puede volver con rollback, para deshacer los append posteriores."""
+        return self._stream.tell(), self._next_id, len(self._page_ids), self.duplicate_bytes
+
+    def rollback(self, mark):
+        """
+        Descarta todo lo escrito después de mark (ver mark), recortando el archivo. Solo para
+        destinos que admiten truncate, como los archivos.
+        """
+        position, next_id, page_count, duplicate_bytes = mark
+        self._stream.seek(position)
+        self._stream.truncate()
+        self._next_id = next_id
+        del self._page_ids[page_count:]
+        self.duplicate_bytes = duplicate_bytes
+        for obj_id in [obj_id for obj_id in self._offsets if obj_id >= next_id]:
+            del self._offsets[obj_id]
+        for digest in [digest for digest, obj_id in self._unique.items() if obj_id >= next_id]:
+            del self._unique[digest]
+
+    def _new_id(self):
+        new_id = self._next_id
+        self._next_id += 1
+        return new_id
+
+    def _write_object(self, obj_id, obj):
+        self._offsets[obj_id] = self._stream.tell()
+        self._stream.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        obj.write_to_stream(self._stream, None)
+        self._stream.write(b"\nendobj\n")
+
+    def _write_raw(self, obj_id, data):
+        """Escribe un objeto ya serializado (data) con el número obj_id."""
+        self._offsets[obj_id] = self._stream.tell()
+        self._stream.write(b"%d 0 obj\n%b\nendobj\n" % (obj_id, data))
+
+    def _write_unique(self, data, obj_id=None):
+        """
+        Escribe un objeto ya serializado (data) si no se escribió uno igual antes, y devuelve
+        su número. obj_id: número ya reservado para el objeto; si se pasa, se escribe siempre.
+        """
+        digest = hashlib.sha256(data).digest()
+        existing = self._unique.get(digest)
+        if existing is not None and obj_id is None:
+            self.duplicate_bytes += len(data)
+            return existing
+        if obj_id is None:
+            obj_id = self._new_id()
+        if existing is None:
+            self._unique[digest] = obj_id
+        self._offsets[obj_id] = self._stream.tell()
+        self._stream.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        self._stream.write(data)
+        self._stream.write(b"\nendobj\n")
+        return obj_id
+
+    def _copy_ref(self, ref):
+        key = (ref.idnum, ref.generation)
+        if key in self._id_map:
+            return IndirectObject(self._id_map[key], 0, None)
+        target = ref.get_object()
+        if target is None:
+            return NullObject()
+        if isinstance(target, DictionaryObject):
+            obj_type = target.get("/Type")
+            if obj_type == "/Pages":
+                return IndirectObject(self._pages_id, 0, None)
+            if obj_type in ("/Page", "/Catalog"):
+                # Referencia a una página que no se copia (o al catálogo de la fuente)
+                return NullObject()
+        if key in self._copying or len(self._copying) >= DEDUP_MAX_DEPTH:
+            # Referencia circular (o cadena muy larga): el objeto se copia después con un
+            # número reservado ahora, sin buscar si ya se escribió uno igual
+            new_id = self._new_id()
+            self._id_map[key] = new_id
+            if key not in self._copying:
+                self._pending.append((new_id, target))
+            return IndirectObject(new_id, 0, None)
+
+        # Primero se copian los objetos a los que apunta, para que el contenido ya renumerado
+        # identifique al objeto completo
+        self._copying.add(key)
+        try:
+            copied = self._copy(target)
+        finally:
+            self._copying.discard(key)
+        data = io.BytesIO()
+        copied.write_to_stream(data, None)
+        # Si mientras tanto se le reservó un número (por una referencia circular), se usa ese
+        new_id = self._write_unique(data.getvalue(), self._id_map.get(key))
+        self._id_map[key] = new_id
+        return IndirectObject(new_id, 0, None)
+
+    def _copy(self, obj, skip_keys=()):
+        """Copia un objeto de la fuente renumerando sus referencias indirectas."""
+        if isinstance(obj, IndirectObject):
+            return self._copy_ref(obj)
+        if isinstance(obj, StreamObject):
+            new_obj = obj.__class__()
+            new_obj._data = obj._data
+            for key, value in obj.items():
+                new_obj[NameObject(key)] = self._copy(value)
+            return new_obj
+        if isinstance(obj, DictionaryObject):
+            new_obj = DictionaryObject()
+            for key, value in obj.items():
+                if key not in skip_keys:
+                    new_obj[NameObject(key)] = self._copy(value)
+            return new_obj
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value) for value in obj)
+        return obj
+
+    def append(self, input_path, pages=None, reader=None, rotation=0):
+        """
+        Agrega las páginas de input_path (todas, o los índices de pages, en ese orden) al PDF de salida.
+        reader: PdfReader ya abierto de input_path, para copiar varios tramos sin volver a leerlo.
+        rotation: grados (múltiplo de 90) que se suman a la rotación de cada página.
+        Devuelve la cantidad de páginas agregadas, o 0 si el PDF está corrupto.
+        """
+        try:
+            if reader is None:
+                reader = PdfReader(input_path)
+            if reader.is_encrypted:
+                reader.decrypt("")
+            source_pages = list(reader.pages)
+            if pages is not None:
+                source_pages = [source_pages[i] for i in pages]
+        except PdfReadError as e:
+            print(f"Error leyendo el PDF {input_path}: {e}. Saltando este archivo.")
+            return 0
+
+        self._id_map = {}
+        self._pending.clear()
+        first_page = len(self._page_ids)
         try:
-            if ext == ".pdf":
-                temp_pdf = os.path.join(temp_dir, f"{name}_clean.pdf")
-                print(f"Limpiando PDF: {filepath} -> {temp_pdf}")
-                if clean_pdf(filepath, temp_pdf):
-                    merger.append(temp_pdf)
+            # Se asignan los números de todas las páginas antes de copiar, para que
+            # los enlaces entre páginas (anotaciones, destinos) apunten a la copia
+            new_ids = []
+            for page in source_pages:
+                ref = page.indirect_reference
+                new_id = self._new_id()
+                if ref is not None:
+                    self._id_map[(ref.idnum, ref.generation)] = new_id
+                new_ids.append(new_id)
+            page_keys = set(self._id_map)
+            names = None
+            for page, new_id in zip(source_pages, new_ids):
+                page_obj = self._copy(page, skip_keys=("/Parent", "/StructParents", "/Annots"))
+                if "/Annots" in page:
+                    if names is None:
+                        names = named_destinations(reader)
+                    annotations = self._copy_annotations(page["/Annots"], names, page_keys)
+                    if annotations:
+                        page_obj[NameObject("/Annots")] = annotations
+                page_obj[NameObject("/Parent")] = IndirectObject(self._pages_id, 0, None)
+                if rotation:
+                    page_obj[NameObject("/Rotate")] = NumberObject((page.rotation + rotation) % 360)
+                self._write_object(new_id, page_obj)
+                self._page_ids.append(new_id)
+                while self._pending:
+                    obj_id, obj = self._pending.popleft()
+                    data = io.BytesIO()
+                    self._copy(obj).write_to_stream(data, None)
+                    self._write_unique(data.getvalue(), obj_id)
+        except PdfReadError as e:
+            # Se descartan las páginas de esta fuente; los objetos ya escritos quedan sin referencias
+            del self._page_ids[first_page:]
+            print(f"Error leyendo el PDF {input_path}: {e}. Saltando este archivo.")
+            return 0
+        except Exception:
+            del self._page_ids[first_page:]
+            raise
+        finally:
+            self._id_map = {}
+            self._pending.clear()
+        return len(self._page_ids) - first_page
+
+    def _copy_annotations(self, annotations, names, page_keys):
+        """
+        Copia las anotaciones de una página sin los enlaces a páginas que no están en page_keys
+        (las que se copian en este append). Los destinos con nombre se reemplazan por el
+        destino explícito de names (ver named_destinations).
+        """
+        copied = ArrayObject()
+        for ref in annotations.get_object():
+            annotation = ref.get_object()
+            if isinstance(annotation, DictionaryObject) and annotation.get("/Subtype") == "/Link":
+                action = annotation.get("/A", NullObject()).get_object()
+                if isinstance(action, DictionaryObject) and action.get("/S") == "/GoTo":
+                    destination = action.get("/D", NullObject()).get_object()
+                elif "/Dest" in annotation:
+                    destination = annotation["/Dest"]
+                    action = None
                 else:
-                    print(f"Saltando PDF corrupto: {filepath}")
-            elif ext in [".png", ".jpg", ".jpeg"]:
-                temp_pdf = os.path.join(temp_dir, f"{name}_temp.pdf")
-                print(f"Convirtiendo imagen a PDF: {filepath} -> {temp_pdf}")
-                image_to_pdf(filepath, temp_pdf)
-                merger.append(temp_pdf)
-            elif ext == ".txt":
-                temp_pdf = os.path.join(temp_dir, f"{name}_temp.pdf")
-                print(f"Convirtiendo txt a PDF: {filepath} -> {temp_pdf}")
-                txt_to_pdf(filepath, temp_pdf)
-                merger.append(temp_pdf)
-            elif ext == ".docx":
-                temp_pdf = os.path.join(temp_dir, f"{name}_temp.pdf")
-                print(f"Convirtiendo docx a PDF: {filepath} -> {temp_pdf}")
-                docx_to_pdf(filepath, temp_pdf)
-                merger.append(temp_pdf)
+                    copied.append(self._copy(ref))
+                    continue
+                named = not isinstance(destination, ArrayObject)
+                if named:
+                    destination = names.get(str(destination))
+                page = destination[0] if destination else None
+                if not isinstance(page, IndirectObject) or (page.idnum, page.generation) not in page_keys:
+                    continue
+                if named:
+                    ref = DictionaryObject(annotation)
+                    if action is None:
+                        ref[NameObject("/Dest")] = destination
+                    else:
+                        ref[NameObject("/A")] = DictionaryObject(action)
+                        ref["/A"][NameObject("/D")] = destination
+            copied.append(self._copy(ref))
+        return copied
+
+    def _write_jpeg(self, source, width, height, mode):
+        """
+        Escribe una imagen JPEG como XObject (DCTDecode) sin decodificarla y devuelve su número.
+        source: ruta de un archivo JPEG (se copia por bloques) o sus bytes. mode: "L" o "RGB".
+        """
+        image_id = self._new_id()
+        if isinstance(source, bytes):
+            length = len(source)
+        else:
+            length = os.path.getsize(source)
+        self._offsets[image_id] = self._stream.tell()
+        color_space = "/DeviceGray" if mode == "L" else "/DeviceRGB"
+        self._stream.write(
+            f"{image_id} 0 obj\n<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode /Length {length} >>\n"
+            f"stream\n".encode("ascii")
+        )
+        if isinstance(source, bytes):
+            self._stream.write(source)
+        else:
+            with open(source, "rb") as f:
+                shutil.copyfileobj(f, self._stream, 1024 * 1024)
+        self._stream.write(b"\nendstream\nendobj\n")
+        return image_id
+
+    def _add_page(self, content, width, height, resources, compress=False):
+        """
+        Escribe una página nueva de width x height puntos con su contenido (bytes). La página
+        y su contenido se serializan directamente, sin armar los objetos de PyPDF2: con el
+        texto plano se escribe una página cada pocos renglones.
+        """
+        content_id = self._new_id()
+        if compress:
+            content = zlib.compress(content)
+            header = b"<< /Length %d /Filter /FlateDecode >>" % len(content)
+        else:
+            header = b"<< /Length %d >>" % len(content)
+        self._write_raw(content_id, header + b"\nstream\n" + content + b"\nendstream")
+
+        if isinstance(resources, IndirectObject):
+            resources = b"%d %d R" % (resources.idnum, resources.generation)
+        else:
+            serialized = io.BytesIO()
+            resources.write_to_stream(serialized, None)
+            resources = serialized.getvalue()
+        page_id = self._new_id()
+        self._write_raw(page_id, b"<< /Type /Page /Parent %d 0 R /MediaBox [ 0 0 %s %s ] /Resources %b /Contents %d 0 R >>" % (
+            self._pages_id, _pdf_number(width), _pdf_number(height), resources, content_id
+        ))
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """Escribe el árbol de páginas, el catálogo y la tabla xref, y cierra el archivo."""
+        if self._stream.closed:
+            return
+        pages = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(i, 0, None) for i in self._page_ids),
+            NameObject("/Count"): NumberObject(len(self._page_ids)),
+        })
+        self._write_object(self._pages_id, pages)
+        catalog_id = self._new_id()
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(self._pages_id, 0, None),
+        })
+        self._write_object(catalog_id, catalog)
+
+        xref_location = self._stream.tell()
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            if obj_id in self._offsets:
+                lines.append(f"{self._offsets[obj_id]:010d} 00000 n \n")
             else:
-                print(f"Extensión no soportada: {ext}, archivo: {filepath}")
-        except Exception as e:
-            print(f"Error procesando {filepath}: {e}. Saltando este archivo.")
+                lines.append("0000000000 65535 f \n")
+        self._stream.write("".join(lines).encode("ascii"))
+        self._stream.write(
+            f"trailer\n<< /Size {size} /Root {catalog_id} 0 R >>\n"
+            f"startxref\n{xref_location}\n%%EOF\n".encode("ascii")
+        )
+        self._stream.close()
 
-    output_pdf = os.path.join(temp_dir, "temp_output.pdf")
-    print(f"Archivo PDF final temporal: {output_pdf}")
 
-    if len(merger.pages) > 0:
-        merger.write(output_pdf)
-        merger.close()
-    else:
-        merger.close()
-        # No eliminamos temp_dir aquí para evitar borrar el archivo final
-        raise ValueError("No se encontraron archivos PDF válidos para compilar.")
+class IncrementalPdfMerger(StreamingPdfMerger):
+    """
+    Agrega una actualización incremental al final de un PDF existente en lugar de reescribirlo.
+    Las páginas existentes se conservan con keep_pages y las nuevas se copian con append;
+    close() reemplaza el árbol de páginas y escribe una tabla xref con /Prev a la anterior.
+    Solo admite PDFs con tabla xref clásica y un árbol de páginas plano, como los que
+    escriben StreamingPdfMerger y Ghostscript; en otro caso lanza ValueError.
+    """
 
-    # Verificar que el archivo final existe antes de continuar
-    if not os.path.exists(output_pdf):
-        print(f"Error: archivo final no encontrado: {output_pdf}")
-        # No eliminamos temp_dir aquí para evitar borrar el archivo final
-        raise FileNotFoundError(f"Archivo final no encontrado: {output_pdf}")
+    def __init__(self, output_path):
+        reader = PdfReader(output_path)
+        if reader.is_encrypted:
+            raise ValueError("El PDF está cifrado")
+        with open(output_path, "rb") as f:
+            f.seek(max(0, os.path.getsize(output_path) - 1024))
+            tail = f.read()
+            startxref_pos = tail.rfind(b"startxref")
+            if startxref_pos < 0:
+                raise ValueError("No se encontró startxref")
+            self._prev = int(tail[startxref_pos + len(b"startxref"):].split()[0])
+            f.seek(self._prev)
+            if f.read(4) != b"xref":
+                raise ValueError("El PDF usa streams de xref")
 
-    size_bytes = os.path.getsize(output_pdf)
-    print(f"Tamaño archivo final: {size_bytes} bytes")
+        root_ref = reader.trailer.raw_get("/Root")
+        pages_ref = reader.trailer["/Root"].raw_get("/Pages")
+        pages_root = pages_ref.get_object()
+        if root_ref.generation != 0 or pages_ref.generation != 0 or set(pages_root.keys()) - {"/Type", "/Kids", "/Count"}:
+            raise ValueError("Árbol de páginas no soportado")
+        self.existing_page_ids = []
+        for page in reader.pages:
+            ref = page.indirect_reference
+            parent = page.raw_get("/Parent")
+            if ref is None or ref.generation != 0 or getattr(parent, "idnum", None) != pages_ref.idnum:
+                raise ValueError("Árbol de páginas no soportado")
+            self.existing_page_ids.append(ref.idnum)
 
-    if size_bytes < 3 * 1024 * 1024:
-        compression_level = "none"
-    elif size_bytes < 8 * 1024 * 1024:
-        compression_level = "ebook"
-    else:
-        compression_level = "screen"
+        self._trailer = DictionaryObject({
+            NameObject(key): reader.trailer.raw_get(key) for key in ("/Root", "/Info", "/ID") if key in reader.trailer
+        })
+        self.output_path = output_path
+        self._original_size = os.path.getsize(output_path)
+        self._stream = open(output_path, "r+b")
+        self._stream.seek(0, os.SEEK_END)
+        self._offsets = {}
+        self._next_id = int(reader.trailer["/Size"])
+        self._pages_id = pages_ref.idnum
+        self._page_ids = []
+        self._id_map = {}
+        self._pending = collections.deque()
+        self._unique = {}
+        self._copying = set()
+        self.duplicate_bytes = 0
 
-    compressed_pdf = os.path.join(temp_dir, "temp_compressed.pdf")
-    print(f"Archivo PDF comprimido temporal: {compressed_pdf}")
-    final_pdf = compress_pdf(output_pdf, compressed_pdf, compression_level=compression_level)
+    def keep_pages(self, pages):
+        """Conserva las páginas existentes indicadas (índices en el PDF original), en ese orden."""
+        self._page_ids.extend(self.existing_page_ids[i] for i in pages)
+        return len(pages)
 
-    print(f"compress_pdf devolvió: {final_pdf}")
-    print(f"¿Existe archivo final? {os.path.exists(final_pdf)}")
+    def abort(self):
+        """Descarta lo agregado: el archivo vuelve a quedar exactamente como estaba."""
+        if not self._stream.closed:
+            self._stream.truncate(self._original_size)
+            self._stream.close()
 
-    # Si se creó un archivo comprimido, reemplazamos el original y devolvemos la ruta correcta
-    if final_pdf != output_pdf:
-        os.replace(final_pdf, output_pdf)
-        final_path = output_pdf
-    else:
-        final_path = output_pdf
+    def close(self):
+        """Escribe el nuevo árbol de páginas, la sección xref incremental y el trailer."""
+        if self._stream.closed:
+            return
+        pages = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(i, 0, None) for i in self._page_ids),
+            NameObject("/Count"): NumberObject(len(self._page_ids)),
+        })
+        self._write_object(self._pages_id, pages)
 
-    # NO eliminamos temp_dir aquí para evitar borrar el archivo final
-    # La eliminación se hará después de mover el archivo final en run_compilation
+        # Una subsección por cada tramo de números de objeto consecutivos
+        xref_location = self._stream.tell()
+        lines = ["xref\n"]
+        obj_ids = sorted(self._offsets)
+        start = 0
+        while start < len(obj_ids):
+            end = start
+            while end + 1 < len(obj_ids) and obj_ids[end + 1] == obj_ids[end] + 1:
+                end += 1
+            lines.append(f"{obj_ids[start]} {end - start + 1}\n")
+            lines.extend(f"{self._offsets[obj_id]:010d} 00000 n \n" for obj_id in obj_ids[start:end + 1])
+            start = end + 1
+        self._stream.write("".join(lines).encode("ascii"))
 
-    # Devolvemos la ruta del archivo final y la carpeta temporal para eliminarla luego
-    return final_path, temp_dir
+        self._trailer[NameObject("/Size")] = NumberObject(self._next_id)
+        self._trailer[NameObject("/Prev")] = NumberObject(self._prev)
+        self._stream.write(b"trailer\n")
+        self._trailer.write_to_stream(self._stream, None)
+        self._stream.write(f"\nstartxref\n{xref_location}\n%%EOF\n".encode("ascii"))
+        self._stream.close()
 
 
-def select_files():
+class VolumePdfMerger:
     """
-    Abre un diálogo para seleccionar múltiples archivos y guarda la lista globalmente.
-    Muestra en el Entry la cantidad de archivos seleccionados.
+    Une PDFs como StreamingPdfMerger pero repartiendo las páginas en una serie de volúmenes
+    (ver volume_path) de como máximo max_bytes cada uno. El tamaño se controla mientras se
+    escribe: si un documento no entra en lo que queda del volumen, se deshace (ver
+    StreamingPdfMerger.rollback) y pasa entero al siguiente; solo los documentos que no
+    entran ni en un volumen vacío se cortan entre páginas. Una página que sola supera
+    max_bytes queda en un volumen propio.
+    volume_path: función que recibe el número de volumen (desde 1) y devuelve dónde escribirlo.
+    units: tramos de páginas que se agregaron juntos, como (volumen desde 0, primera página en
+    el volumen, cantidad), para volver a repartirlos después de comprimir (ver repack_volumes).
     """
-    global selected_files, selected_mode
-    selected_files = filedialog.askopenfilenames(
-        title="Selecciona los archivos a compilar",
-        filetypes=[
-            ("Todos los archivos", "*.*"),
-            ("Archivos PDF", "*.pdf"),
-            ("Archivos de texto", "*.txt"),
-            ("Archivos Word", "*.docx"),
-            ("Imágenes", "*.png;*.jpg;*.jpeg")
-        ]
-    )
-    if selected_files:
-        entry_dir.delete(0, tk.END)
-        entry_dir.insert(0, f"{len(selected_files)} archivos seleccionados")
-        selected_mode = "files"
 
+    def __init__(self, volume_path, max_bytes):
+        self.volume_path = volume_path
+        self.max_bytes = max_bytes
+        self.paths = []
+        self.units = []
+        self._closed_pages = 0
+        self._closed_bytes = 0
+        self._duplicate_bytes = 0
+        self._merger = None
+        self._closed = False
+        self._new_volume()
+        self._empty_size = self._merger.final_size
 
-def run_compilation():
+    @property
+    def page_count(self):
+        return self._closed_pages + self._merger.page_count
+
+    @property
+    def bytes_written(self):
+        return self._closed_bytes + self._merger.bytes_written
+
+    @property
+    def duplicate_bytes(self):
+        return self._duplicate_bytes + self._merger.duplicate_bytes
+
+    def _new_volume(self):
+        if self._merger is not None:
+            self._close_volume()
+        self.paths.append(self.volume_path(len(self.paths) + 1))
+        self._merger = StreamingPdfMerger(self.paths[-1])
+
+    def _close_volume(self):
+        self._closed_bytes += self._merger.bytes_written
+        self._merger.close()
+        self._closed_pages += self._merger.page_count
+        self._duplicate_bytes += self._merger.duplicate_bytes
+
+    def append(self, input_path, pages=None, reader=None, rotation=0):
+        """Igual que StreamingPdfMerger.append, pasando a otro volumen cuando hace falta."""
+        try:
+            if reader is None:
+                reader = PdfReader(input_path)
+            if pages is None:
+                pages = range(len(reader.pages))
+        except PdfReadError as e:
+            print(f"Error leyendo el PDF {input_path}: {e}. Saltando este archivo.")
+            return 0
+        added = self._append_fitting(input_path, list(pages), reader, rotation)
+        if added is None:
+            print(f"{input_path} no entra en un volumen, se reparte entre varios")
+            added = sum(self._append_fitting(input_path, [page], reader, rotation) for page in pages)
+        return added
+
+    def _append_fitting(self, input_path, pages, reader, rotation):
+        """
+        Agrega pages al volumen actual, o a uno nuevo si no entran en lo que queda. Devuelve
+        las páginas agregadas, o None (sin agregar nada) si no entrarían ni en un volumen vacío.
+        """
+        merger = self._merger
+        size_before = merger.final_size
+        mark = merger.mark()
+        added = merger.append(input_path, pages=pages, reader=reader, rotation=rotation)
+        if not added or merger.final_size <= self.max_bytes:
+            if added:
+                self.units.append((len(self.paths) - 1, merger.page_count - added, added))
+            return added
+        if merger.page_count == added:
+            # El volumen estaba vacío
+            if len(pages) == 1:
+                print(f"Una página de {input_path} supera sola el tamaño de volumen")
+                self.units.append((len(self.paths) - 1, 0, added))
+                return added
+            merger.rollback(mark)
+            return None
+        grown = merger.final_size - size_before
+        merger.rollback(mark)
+        if len(pages) > 1 and self._empty_size + grown > self.max_bytes:
+            # Tampoco entraría en un volumen vacío: se corta aprovechando lo que queda de este
+            return None
+        self._new_volume()
+        return self._append_fitting(input_path, pages, reader, rotation)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._close_volume()
+
+
+def repack_volumes(volume_pdfs, units, max_bytes, volume_path):
     """
-    Ejecuta la compilación según el modo seleccionado (carpeta o archivos).
-    Mueve el PDF final a la carpeta Descargas con nombre adecuado. 
-    Elimina la carpeta temporal solo después de mover el archivo final.
+    Vuelve a repartir las páginas de volume_pdfs, ya optimizados o comprimidos, en volúmenes
+    de como máximo max_bytes, con los mismos tramos (units, ver VolumePdfMerger) y en el mismo
+    orden. Los volúmenes se cortan al unir, con el tamaño antes de comprimir, así que después
+    pueden quedar muy por debajo del máximo; con el tamaño real suelen entrar en menos.
+    Devuelve las rutas de los volúmenes nuevos (de volume_path, como en VolumePdfMerger), o
+    None si no quedan menos volúmenes, o si algún volumen cambió de cantidad de páginas.
     """
-    global selected_mode, selected_files
-    input_value = entry_dir.get()
-    if not input_value:
-        messagebox.showerror("Error", "Por favor, selecciona una carpeta o archivos válidos.")
-        return
+    if -(-sum(os.path.getsize(path) for path in volume_pdfs) // max_bytes) >= len(volume_pdfs):
+        return None
+    readers = [PdfReader(path) for path in volume_pdfs]
+    pages = collections.Counter()
+    for volume, _, count in units:
+        pages[volume] += count
+    if any(pages[volume] != len(reader.pages) for volume, reader in enumerate(readers)):
+        return None
+
+    merger = VolumePdfMerger(volume_path, max_bytes)
     try:
-        btn_compile.config(state=tk.DISABLED)
-        if selected_mode == "folder":
-            output_pdf = compile_pdfs_in_directory(input_value)
-            downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
-            dir_name = os.path.basename(os.path.normpath(input_value))
-            output_pdf_dest = os.path.join(downloads_path, f"{dir_name}_UNIDO.pdf")
-            if os.path.exists(output_pdf_dest):
-                os.remove(output_pdf_dest)
-            print(f"Moviendo archivo final de {output_pdf} a {output_pdf_dest}")
-            if not os.path.exists(output_pdf):
-                print(f"Error: archivo final no existe: {output_pdf}")
+        for volume, first_page, count in units:
+            merger.append(volume_pdfs[volume], pages=range(first_page, first_page + count), reader=readers[volume])
+    finally:
+        merger.close()
+    if len(merger.paths) >= len(volume_pdfs):
+        for path in merger.paths:
+            os.remove(path)
+        return None
+    return merger.paths
+
+
+def wrap_text(data, max_width):
+    """
+    Corta una línea (bytes en cp1252) en renglones de hasta max_width (en milésimas del
+    tamaño de letra), igual que FPDF.multi_cell. Devuelve una lista de tuplas
+    (renglón, espacio extra por cada espacio para justificarlo, en las mismas unidades).
+    Mide la línea entera, o palabra por palabra si no entra, en lugar de carácter por carácter.
+    """
+    # Ningún carácter mide más de 1015: las líneas cortas no hace falta medirlas
+    if len(data) * 1015 <= max_width or sum(map(HELVETICA_WIDTHS.__getitem__, data)) <= max_width:
+        return [(data, 0)]
+
+    lines = []
+    space_width = HELVETICA_WIDTHS[32]
+    start = 0
+    position = 0
+    width = 0
+    spaces = 0
+    if len(_word_widths) > TEXT_WORD_CACHE_SIZE:
+        _word_widths.clear()
+    for word in data.split(b" "):
+        word_width = _word_widths.get(word)
+        if word_width is None:
+            word_width = _word_widths[word] = sum(map(HELVETICA_WIDTHS.__getitem__, word))
+        if position > start:
+            # La palabra va después de un espacio del mismo renglón
+            spaces += 1
+            if width + space_width + word_width > max_width:
+                # Se justifica repartiendo el espacio sobrante entre los espacios del renglón
+                lines.append((data[start:position - 1], (max_width - width) / (spaces - 1) if spaces > 1 else 0))
+                start = position
+                spaces = 0
             else:
-                shutil.move(output_pdf, output_pdf_dest)
-            output_pdf = output_pdf_dest
-        elif selected_mode == "files":
-            if not selected_files:
-                messagebox.showerror("Error", "No hay archivos seleccionados.")
-                return
-            # Ahora recibimos también la carpeta temporal para eliminarla después
-            output_pdf, temp_dir = compile_pdfs_from_files(selected_files)
-            downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
-            base_name = "Documentos_UNIDOS"
-            i = 1
-            while True:
-                candidate = os.path.join(downloads_path, f"{base_name}_{i}.pdf")
-                if not os.path.exists(candidate):
-                    output_pdf_dest = candidate
-                    break
-                i += 1
-            print(f"Moviendo archivo final de {output_pdf} a {output_pdf_dest}")
-            if not os.path.exists(output_pdf):
-                print(f"Error: archivo final no existe: {output_pdf}")
+                width += space_width + word_width
+        if position == start:
+            if word_width > max_width:
+                # Una palabra más ancha que el renglón se corta donde no entra
+                return lines + _wrap_characters(data[start:], max_width)
+            width = word_width
+        position += len(word) + 1
+    lines.append((data[start:], 0))
+    return lines
+
+
+def _wrap_characters(data, max_width):
+    """Corte de líneas de multi_cell carácter por carácter, para palabras que no entran en un renglón."""
+    lines = []
+    start = 0
+    i = 0
+    separator = -1
+    width = 0
+    separator_width = 0
+    spaces = 0
+    while i < len(data):
+        byte = data[i]
+        if byte == 32:
+            separator = i
+            separator_width = width
+            spaces += 1
+        width += HELVETICA_WIDTHS[byte]
+        if width > max_width:
+            if separator == -1:
+                if i == start:
+                    i += 1
+                lines.append((data[start:i], 0))
             else:
-                shutil.move(output_pdf, output_pdf_dest)
-            # Eliminamos la carpeta temporal solo después de mover el archivo final
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                print(f"Error eliminando directorio temporal {temp_dir}: {e}")
-            output_pdf = output_pdf_dest
+                lines.append((data[start:separator], (max_width - separator_width) / (spaces - 1) if spaces > 1 else 0))
+                i = separator + 1
+            separator = -1
+            start = i
+            width = 0
+            spaces = 0
         else:
-            messagebox.showerror("Error", "Modo de selección desconocido.")
+            i += 1
+    lines.append((data[start:], 0))
+    return lines
+
+
+def _text_position(x_mm, baseline_mm):
+    """Comienzo de los operadores de _text_operation, hasta el paréntesis que abre el texto."""
+    return f"BT {x_mm * MM_TO_POINTS:.2f} {(TEXT_PAGE_HEIGHT_MM - baseline_mm) * MM_TO_POINTS:.2f} Td (".encode("ascii")
+
+
+def _escape_text(data):
+    """Escapa las barras invertidas y los paréntesis de un texto de PDF (bytes)."""
+    if b"\\" in data or b"(" in data or b")" in data:
+        return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return data
+
+
+def _text_operation(x_mm, baseline_mm, data):
+    """Operadores PDF para escribir data (bytes en cp1252) con la línea base en x_mm, baseline_mm."""
+    return _text_position(x_mm, baseline_mm) + _escape_text(data) + b") Tj ET"
+
+
+class TextPdfWriter(StreamingPdfMerger):
+    """
+    PDF de texto plano que se escribe de a una página. Corta y justifica las líneas
+    igual que FPDF.multi_cell (ver wrap_text).
+    """
+
+    def __init__(self, output_path):
+        super().__init__(output_path)
+        self._font_id = self._new_id()
+        self._write_object(self._font_id, DictionaryObject({
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+            NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+        }))
+        self._fonts = DictionaryObject({NameObject("/F1"): IndirectObject(self._font_id, 0, None)})
+        # Las páginas sin imágenes comparten el mismo diccionario de recursos
+        resources_id = self._new_id()
+        self._write_object(resources_id, DictionaryObject({NameObject("/Font"): self._fonts}))
+        self._resources = IndirectObject(resources_id, 0, None)
+        # Comienzo de la operación de cada renglón según su altura: se repiten en cada página
+        self._line_positions = {}
+        self._start_page()
+
+    def _start_page(self):
+        """Prepara una página nueva; la página se escribe en _flush_page."""
+        self._operations = []
+        self._images = DictionaryObject()
+        self._y = TEXT_MARGIN_MM
+
+    def add_paragraph(self, text):
+        """Agrega una línea del archivo; si no entra en el ancho de la página se corta en varios renglones."""
+        data = text.replace("\r", "").rstrip("\n").encode("cp1252", errors="replace")
+        for line, spacing in wrap_text(data, TEXT_MAX_WIDTH):
+            self._add_line(line, spacing / 1000.0 * TEXT_FONT_SIZE)
+
+    def _add_line(self, data, word_spacing=0):
+        if self._y + TEXT_LINE_HEIGHT_MM > TEXT_PAGE_HEIGHT_MM - TEXT_BOTTOM_MARGIN_MM:
+            self._flush_page()
+        if data:
+            position = self._line_positions.get(self._y)
+            if position is None:
+                baseline = self._y + 0.5 * TEXT_LINE_HEIGHT_MM + 0.3 * TEXT_FONT_SIZE / MM_TO_POINTS
+                position = self._line_positions[self._y] = _text_position(TEXT_MARGIN_MM + TEXT_CELL_MARGIN_MM, baseline)
+            operation = position + _escape_text(data) + b") Tj ET"
+            if word_spacing:
+                operation = f"{word_spacing:.3f} Tw ".encode("ascii") + operation + b" 0 Tw"
+            self._operations.append(operation)
+        self._y += TEXT_LINE_HEIGHT_MM
+
+    def _flush_page(self):
+        content = b"\n".join([f"BT /F1 {TEXT_FONT_SIZE:.2f} Tf ET".encode("ascii")] + self._operations)
+        resources = self._resources
+        if self._images:
+            resources = DictionaryObject({
+                NameObject("/Font"): self._fonts,
+                NameObject("/XObject"): self._images,
+            })
+        self._add_page(
+            content, round(TEXT_PAGE_WIDTH_MM * MM_TO_POINTS, 2), round(TEXT_PAGE_HEIGHT_MM * MM_TO_POINTS, 2),
+            resources, compress=True
+        )
+        self._start_page()
+
+    def close(self):
+        if not self._stream.closed:
+            self._flush_page()
+        super().close()
+
+
+class DocxPdfWriter(TextPdfWriter):
+    """
+    PDF de un documento DOCX. Los párrafos se escriben igual que el texto plano; además
+    dibuja tablas con bordes, imágenes en línea y el encabezado en cada página.
+    """
+
+    def __init__(self, output_path, header=()):
+        self._header = [line.encode("cp1252", errors="replace") for line in header]
+        super().__init__(output_path)
+
+    def _start_page(self):
+        super()._start_page()
+        if self._header:
+            operations = [f"q BT /F1 {DOCX_SMALL_FONT_SIZE:.2f} Tf ET".encode("ascii")]
+            for line in self._header:
+                baseline = self._y + 0.5 * DOCX_SMALL_LINE_HEIGHT_MM + 0.3 * DOCX_SMALL_FONT_SIZE / MM_TO_POINTS
+                operations.append(_text_operation(TEXT_MARGIN_MM + TEXT_CELL_MARGIN_MM, baseline, line))
+                self._y += DOCX_SMALL_LINE_HEIGHT_MM
+            # Una línea separa el encabezado del cuerpo
+            line_y = (TEXT_PAGE_HEIGHT_MM - self._y - 1) * MM_TO_POINTS
+            operations.append(
+                f"0.57 w {TEXT_MARGIN_MM * MM_TO_POINTS:.2f} {line_y:.2f} m "
+                f"{(TEXT_PAGE_WIDTH_MM - TEXT_MARGIN_MM) * MM_TO_POINTS:.2f} {line_y:.2f} l S Q".encode("ascii")
+            )
+            self._operations.extend(operations)
+            self._y += 2
+        self._page_top = self._y
+
+    def add_image(self, blob, width_mm, height_mm):
+        """Agrega una imagen del documento (bytes) con el tamaño indicado, achicada si no entra en la página."""
+        data, width, height, mode = encode_docx_image(blob)
+        bottom = TEXT_PAGE_HEIGHT_MM - TEXT_BOTTOM_MARGIN_MM
+        scale = min(
+            1.0,
+            (TEXT_PAGE_WIDTH_MM - 2 * TEXT_MARGIN_MM) / width_mm,
+            (bottom - self._page_top) / height_mm,
+        )
+        width_mm, height_mm = width_mm * scale, height_mm * scale
+        if self._y + height_mm > bottom:
+            self._flush_page()
+        image_id = self._write_jpeg(data, width, height, mode)
+        name = f"/Im{len(self._images)}"
+        self._images[NameObject(name)] = IndirectObject(image_id, 0, None)
+        self._operations.append(
+            f"q {width_mm * MM_TO_POINTS:.2f} 0 0 {height_mm * MM_TO_POINTS:.2f} "
+            f"{TEXT_MARGIN_MM * MM_TO_POINTS:.2f} {(TEXT_PAGE_HEIGHT_MM - self._y - height_mm) * MM_TO_POINTS:.2f} cm "
+            f"{name} Do Q".encode("ascii")
+        )
+        self._y += height_mm
+
+    def add_table(self, rows):
+        """
+        Agrega una tabla con columnas de igual ancho. rows es una lista de filas, cada una
+        una lista de celdas (texto, cantidad de columnas que ocupa). Las filas que no entran
+        pasan a la página siguiente, y las más altas que una página se cortan entre páginas.
+        """
+        columns = max((sum(span for _, span in row) for row in rows), default=0)
+        if not columns:
             return
+        column_width = (TEXT_PAGE_WIDTH_MM - 2 * TEXT_MARGIN_MM) / columns
+        font_mm = DOCX_SMALL_FONT_SIZE / MM_TO_POINTS
+        bottom = TEXT_PAGE_HEIGHT_MM - TEXT_BOTTOM_MARGIN_MM
+        for row in rows:
+            spans = [span for _, span in row]
+            cell_lines = []
+            for text, span in row:
+                max_width = (span * column_width - 2 * TEXT_CELL_MARGIN_MM) * 1000.0 / font_mm
+                lines = []
+                for paragraph in text.split("\n"):
+                    data = paragraph.encode("cp1252", errors="replace")
+                    lines.extend(line for line, _ in wrap_text(data, max_width))
+                cell_lines.append(lines)
+            while True:
+                needed = max(1, max(len(lines) for lines in cell_lines))
+                available = int((bottom - self._y - 2 * DOCX_CELL_PADDING_MM) // DOCX_SMALL_LINE_HEIGHT_MM)
+                if available < needed and self._y > self._page_top:
+                    self._flush_page()
+                    continue
+                count = max(1, min(needed, available))
+                self._draw_row([lines[:count] for lines in cell_lines], spans, count, column_width)
+                cell_lines = [lines[count:] for lines in cell_lines]
+                if not any(cell_lines):
+                    break
+                self._flush_page()
 
-        messagebox.showinfo("Éxito", f"PDF generado:\n{output_pdf}")
-        try:
-            os.startfile(output_pdf)
-        except Exception as e:
-            print(f"No se pudo abrir el archivo: {e}")
-    except Exception as e:
-        messagebox.showerror("Error", f"Ocurrió un error:\n{e}")
-    finally:
-        btn_compile.config(state=tk.NORMAL)
+    def _draw_row(self, cell_lines, spans, count, column_width):
+        height = count * DOCX_SMALL_LINE_HEIGHT_MM + 2 * DOCX_CELL_PADDING_MM
+        operations = [f"q 0.57 w BT /F1 {DOCX_SMALL_FONT_SIZE:.2f} Tf ET".encode("ascii")]
+        x = TEXT_MARGIN_MM
+        for lines, span in zip(cell_lines, spans):
+            operations.append(
+                f"{x * MM_TO_POINTS:.2f} {(TEXT_PAGE_HEIGHT_MM - self._y - height) * MM_TO_POINTS:.2f} "
+                f"{span * column_width * MM_TO_POINTS:.2f} {height * MM_TO_POINTS:.2f} re S".encode("ascii")
+            )
+            for index, line in enumerate(lines):
+                if line:
+                    baseline = (
+                        self._y + DOCX_CELL_PADDING_MM + (index + 0.5) * DOCX_SMALL_LINE_HEIGHT_MM
+                        + 0.3 * DOCX_SMALL_FONT_SIZE / MM_TO_POINTS
+                    )
+                    operations.append(_text_operation(x + TEXT_CELL_MARGIN_MM, baseline, line))
+            x += span * column_width
+        operations.append(b"Q")
+        self._operations.extend(operations)
+        self._y += height
+
+
+@functools.lru_cache(maxsize=DOCX_IMAGE_CACHE_SIZE)
+def encode_docx_image(blob):
+    """
+    Prepara una imagen de un DOCX para embeberla como JPEG: (datos, ancho, alto, modo).
+    Los JPEG se usan tal cual; el resto se pasa a RGB sobre fondo blanco y se codifica.
+    Queda en caché dentro del proceso: los membretes y logos que se repiten en una tanda
+    de formularios se codifican una sola vez.
+    """
+    from PIL import Image
 
+    with Image.open(io.BytesIO(blob)) as image:
+        if image.format == "JPEG" and image.mode in JPEG_PASSTHROUGH_MODES:
+            return blob, image.width, image.height, image.mode
+        if image.mode not in JPEG_PASSTHROUGH_MODES:
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        encoded = io.BytesIO()
+        image.save(encoded, "JPEG")
+        return encoded.getvalue(), image.width, image.height, image.mode
 
-root = tk.Tk()
-root.title("Compilador de PDFs")
-root.geometry("600x150")
-root.resizable(False, False)
 
-lbl = tk.Label(root, text="Selecciona el directorio con archivos a compilar:")
-lbl.pack(pady=10)
+class ImagePdfWriter(StreamingPdfMerger):
+    """
+    PDF con una imagen por página. Los JPEG se embeben como DCTDecode sin decodificarlos:
+    los datos se copian por bloques desde el archivo, así que la memoria no depende
+    del tamaño de la imagen. El resto del archivo (páginas, catálogo, xref) lo escribe
+    StreamingPdfMerger, por lo que también se pueden agregar PDFs con append.
+    """
 
-frame = tk.Frame(root)
-frame.pack(pady=5, padx=10, fill="x")
+    def add_image(self, image_path, max_dpi=None, quality=None):
+        """
+        Agrega una imagen como una página (ver image_to_pdf).
+        Los JPEG que no hay que reducir ni recomprimir se copian tal cual, sin decodificarlos;
+        los que hay que reducir se decodifican directamente a escala reducida (draft).
+        """
+        from PIL import Image
 
-entry_dir = tk.Entry(frame, width=50)
-entry_dir.pack(side=tk.LEFT, fill="x", expand=True)
+        with Image.open(image_path) as image:
+            resolution = IMAGE_DPI
+            size = None
+            if max_dpi and max_dpi < resolution:
+                size = (
+                    max(1, round(image.width * max_dpi / resolution)),
+                    max(1, round(image.height * max_dpi / resolution)),
+                )
+                resolution = float(max_dpi)
 
+            if image.format == "JPEG" and image.mode in JPEG_PASSTHROUGH_MODES and size is None and not quality:
+                self.add_jpeg(image_path, image.width, image.height, image.mode, resolution)
+                return
 
-def select_directory():
+            if size is not None and image.format == "JPEG":
+                # El decodificador JPEG reduce 1/2, 1/4 u 1/8 al leer: no se arma la imagen completa
+                image.draft(image.mode, size)
+            if image.mode == "RGBA":
+                image = image.convert("RGB")
+            if size is not None:
+                image = resize_image(image, size)
+
+            if image.mode in JPEG_PASSTHROUGH_MODES:
+                # Mismo JPEG que generaría Pillow al guardar como PDF, pero sin su copia en memoria del PDF
+                encoded = io.BytesIO()
+                image.save(encoded, "JPEG", **({"quality": quality} if quality else {}))
+                self.add_jpeg(encoded.getvalue(), image.width, image.height, image.mode, resolution)
+            else:
+                # Otros modos (blanco y negro, paleta, CMYK) no se guardan como JPEG: quality no aplica
+                encoded = io.BytesIO()
+                image.save(encoded, "PDF", resolution=resolution)
+                if not self.append(image_path, reader=PdfReader(encoded)):
+                    raise ValueError("No se pudo leer el PDF generado por Pillow")
+
+    def add_jpeg(self, source, width, height, mode, resolution=IMAGE_DPI):
+        """
+        Agrega una página del tamaño de la imagen a la resolución indicada.
+        source: ruta de un archivo JPEG o sus bytes. mode: "L" o "RGB".
+        """
+        image_id = self._write_jpeg(source, width, height, mode)
+        page_width = width * 72.0 / resolution
+        page_height = height * 72.0 / resolution
+        resources = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): IndirectObject(image_id, 0, None)}),
+        })
+        content = f"q {page_width:.4f} 0 0 {page_height:.4f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._add_page(content, page_width, page_height, resources)
+
+
+def clean_pdf(input_path, output_path):
     """
-    Abre un diálogo para seleccionar una carpeta y actualiza el Entry y modo.
+    Limpia un PDF para evitar errores de lectura.
+    Devuelve True si se pudo limpiar, False si el PDF está corrupto.
     """
-    global selected_mode
-    folder_selected = filedialog.askdirectory()
-    if folder_selected:
-        entry_dir.delete(0, tk.END)
-        entry_dir.insert(0, folder_selected)
-        selected_mode = "folder"
+    merger = StreamingPdfMerger(output_path)
+    try:
+        merger.append(input_path)
+    finally:
+        merger.close()
+    if merger.page_count == 0:
+        os.remove(output_path)
+        return False
+    return True
+
 
+def image_components(image):
+    """Componentes de color por píxel de un XObject de imagen, o None si no se sabe."""
+    if image.get("/ImageMask"):
+        return 1
+    color_space = image.get("/ColorSpace")
+    if isinstance(color_space, IndirectObject):
+        color_space = color_space.get_object()
+    if isinstance(color_space, ArrayObject) and color_space:
+        family = color_space[0]
+        if family == "/ICCBased" and len(color_space) > 1:
+            return color_space[1].get_object().get("/N")
+        if family == "/DeviceN" and len(color_space) > 1:
+            return len(color_space[1].get_object())
+        color_space = family
+    return {
+        "/DeviceGray": 1, "/G": 1, "/CalGray": 1, "/Indexed": 1, "/I": 1, "/Separation": 1,
+        "/DeviceRGB": 3, "/RGB": 3, "/CalRGB": 3, "/Lab": 3, "/DeviceCMYK": 4, "/CMYK": 4,
+    }.get(color_space)
 
-btn_browse_folder = tk.Button(frame, text="Seleccionar Carpeta", command=select_directory)
-btn_browse_folder.pack(side=tk.LEFT, padx=5)
 
-btn_browse_files = tk.Button(frame, text="Seleccionar Archivos", command=select_files)
-btn_browse_files.pack(side=tk.LEFT, padx=5)
+def png_predicted(data, width, height, components, bits):
+    """
+    Comprime los píxeles de una imagen (filas completas, como en el PDF) con los predictores
+    de PNG: Pillow elige el filtro de cada fila y el resultado es el contenido de los IDAT,
+    que es lo que espera FlateDecode con /Predictor 15. Devuelve None si el formato de los
+    píxeles no tiene equivalente en PNG.
+    """
+    from PIL import Image
+
+    mode = {(1, 1): "1", (1, 8): "L", (2, 8): "LA", (3, 8): "RGB"}.get((components, bits))
+    if mode is None or len(data) != height * ((width * components * bits + 7) // 8):
+        return None
+    encoded = io.BytesIO()
+    Image.frombytes(mode, (width, height), data).save(encoded, "PNG", compress_level=OPTIMIZE_ZLIB_LEVEL)
+    png = encoded.getvalue()
+    chunks = []
+    position = 8
+    while position < len(png):
+        length = int.from_bytes(png[position:position + 4], "big")
+        if png[position + 4:position + 8] == b"IDAT":
+            chunks.append(png[position + 8:position + 8 + length])
+        position += 12 + length
+    return b"".join(chunks)
+
+
+def optimize_stream(stream):
+    """
+    Vuelve a comprimir un stream con Flate (las imágenes, con predictores de PNG) si sus
+    filtros se pueden deshacer sin pérdida y el resultado es más chico. Los JPEG, CCITT,
+    JBIG2 y JPEG 2000 quedan como están. Las imágenes que ya usan predictores no se tocan:
+    decodificarlas con PyPDF2 es lento y ya están optimizadas.
+    """
+    filters = stream.get("/Filter", ArrayObject())
+    if not isinstance(filters, ArrayObject):
+        filters = ArrayObject([filters])
+    if any(name not in LOSSLESS_FILTERS for name in filters):
+        return
+    parms = stream.get("/DecodeParms")
+    if isinstance(parms, ArrayObject):
+        if any(not isinstance(value, NullObject) for value in parms):
+            return
+        parms = None
+    image = stream.get("/Subtype") == "/Image"
+    if image and parms is not None and parms.get_object().get("/Predictor", 1) > 1:
+        return
+    try:
+        data = stream.get_data()
+    except Exception:
+        return
+    new_parms = None
+    encoded = None
+    if image:
+        width, height = stream.get("/Width"), stream.get("/Height")
+        components = image_components(stream)
+        bits = 1 if stream.get("/ImageMask") else stream.get("/BitsPerComponent")
+        if isinstance(width, int) and isinstance(height, int) and components and bits:
+            encoded = png_predicted(data, width, height, components, bits)
+            if encoded is not None:
+                new_parms = DictionaryObject({
+                    NameObject("/Predictor"): NumberObject(15),
+                    NameObject("/Colors"): NumberObject(components),
+                    NameObject("/BitsPerComponent"): NumberObject(bits),
+                    NameObject("/Columns"): NumberObject(width),
+                })
+    if encoded is None:
+        encoded = zlib.compress(data, OPTIMIZE_ZLIB_LEVEL)
+    if len(encoded) >= len(stream._data):
+        return
+    stream._data = encoded
+    stream[NameObject("/Filter")] = NameObject("/FlateDecode")
+    if new_parms is None:
+        stream.pop("/DecodeParms", None)
+    else:
+        stream[NameObject("/DecodeParms")] = new_parms
+
+
+def optimize_pdf(input_path, output_path, object_streams=True):
+    """
+    Reescribe el PDF sin pérdida: solo con los objetos alcanzables desde el catálogo (y /Info),
+    renumerados; con los streams comprimidos con Flate donde eso los achica (ver
+    optimize_stream); y, con object_streams, con los objetos que no son streams agrupados en
+    streams de objetos comprimidos y la tabla xref en un stream. Sin object_streams la tabla
+    xref es la clásica, que necesita IncrementalPdfMerger para actualizar el PDF después.
+    Devuelve output_path si el resultado es más chico, o input_path (como compress_pdf).
+    """
+    try:
+        with open(input_path, "rb") as source:
+            reader = PdfReader(source)
+            if reader.is_encrypted:
+                return input_path
+            roots = {"/Root": reader.trailer.raw_get("/Root")}
+            if "/Info" in reader.trailer:
+                roots["/Info"] = reader.trailer.raw_get("/Info")
+
+            # Números nuevos en el orden en que se encuentran los objetos
+            new_ids = {}
+            order = []
+
+            def visit(obj):
+                pending = [obj]
+                while pending:
+                    obj = pending.pop()
+                    if isinstance(obj, IndirectObject):
+                        key = (obj.idnum, obj.generation)
+                        if key in new_ids:
+                            continue
+                        target = obj.get_object()
+                        if target is None:
+                            continue
+                        new_ids[key] = len(order) + 1
+                        order.append(target)
+                        pending.append(target)
+                    elif isinstance(obj, DictionaryObject):
+                        pending.extend(value for name, value in obj.items() if name != "/Length")
+                    elif isinstance(obj, ArrayObject):
+                        pending.extend(obj)
+
+            for root in roots.values():
+                visit(root)
+
+            def renumbered(obj):
+                if isinstance(obj, IndirectObject):
+                    new_id = new_ids.get((obj.idnum, obj.generation))
+                    return IndirectObject(new_id, 0, None) if new_id else NullObject()
+                if isinstance(obj, StreamObject):
+                    new_obj = obj.__class__()
+                    new_obj._data = obj._data
+                    for name, value in obj.items():
+                        if name != "/Length":
+                            new_obj[NameObject(name)] = renumbered(value)
+                    optimize_stream(new_obj)
+                    return new_obj
+                if isinstance(obj, DictionaryObject):
+                    return DictionaryObject({NameObject(name): renumbered(value) for name, value in obj.items()})
+                if isinstance(obj, ArrayObject):
+                    return ArrayObject(renumbered(value) for value in obj)
+                return obj
+
+            with open(output_path, "wb") as output:
+                output.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+                # Por número de objeto: (1, posición) o (2, stream de objetos, índice)
+                entries = {}
+                # Los streams de objetos y el de xref van después de los objetos originales
+                next_id = len(order) + 1
+                packed = []
+                for obj_id, obj in enumerate(order, start=1):
+                    obj = renumbered(obj)
+                    if object_streams and not isinstance(obj, StreamObject):
+                        packed.append((obj_id, serialized_pdf_object(obj)))
+                        if len(packed) == OPTIMIZE_OBJECTS_PER_STREAM:
+                            next_id = _write_object_stream(output, next_id, packed, entries)
+                            packed = []
+                    else:
+                        entries[obj_id] = (1, output.tell())
+                        output.write(f"{obj_id} 0 obj\n".encode("ascii") + serialized_pdf_object(obj) + b"\nendobj\n")
+                if packed:
+                    next_id = _write_object_stream(output, next_id, packed, entries)
+
+                trailer = DictionaryObject({
+                    NameObject(name): renumbered(value) for name, value in roots.items()
+                })
+                if "/ID" in reader.trailer:
+                    trailer[NameObject("/ID")] = renumbered(reader.trailer["/ID"])
+                xref_location = output.tell()
+                if object_streams:
+                    xref_id = next_id
+                    entries[xref_id] = (1, xref_location)
+                    offset_width = max(4, (xref_location.bit_length() + 7) // 8)
+                    rows = [b"\x00" + bytes(offset_width) + b"\xff\xff"]
+                    for obj_id in range(1, xref_id + 1):
+                        kind, first, second = entries[obj_id] + (0,) * (3 - len(entries[obj_id]))
+                        rows.append(
+                            bytes([kind]) + first.to_bytes(offset_width, "big") + second.to_bytes(2, "big")
+                        )
+                    xref = StreamObject()
+                    xref._data = zlib.compress(b"".join(rows), OPTIMIZE_ZLIB_LEVEL)
+                    xref.update(trailer)
+                    xref.update({
+                        NameObject("/Type"): NameObject("/XRef"),
+                        NameObject("/Size"): NumberObject(xref_id + 1),
+                        NameObject("/W"): ArrayObject([NumberObject(1), NumberObject(offset_width), NumberObject(2)]),
+                        NameObject("/Filter"): NameObject("/FlateDecode"),
+                    })
+                    output.write(f"{xref_id} 0 obj\n".encode("ascii") + serialized_pdf_object(xref) + b"\nendobj\n")
+                else:
+                    lines = [f"xref\n0 {next_id}\n", "0000000000 65535 f \n"]
+                    lines.extend(f"{entries[obj_id][1]:010d} 00000 n \n" for obj_id in range(1, next_id))
+                    output.write("".join(lines).encode("ascii"))
+                    trailer[NameObject("/Size")] = NumberObject(next_id)
+                    output.write(b"trailer\n" + serialized_pdf_object(trailer) + b"\n")
+                output.write(f"startxref\n{xref_location}\n%%EOF\n".encode("ascii"))
+    except Exception as e:
+        print(f"No se pudo optimizar {input_path}: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return input_path
+
+    if os.path.getsize(output_path) < os.path.getsize(input_path):
+        print(f"PDF optimizado sin pérdida: {os.path.getsize(input_path)} -> {os.path.getsize(output_path)} bytes")
+        return output_path
+    os.remove(output_path)
+    return input_path
+
+
+def serialized_pdf_object(obj):
+    """El objeto de PyPDF2 escrito como en el archivo PDF, en bytes."""
+    data = io.BytesIO()
+    obj.write_to_stream(data, None)
+    return data.getvalue()
+
+
+def _write_object_stream(output, stream_id, packed, entries):
+    """
+    Escribe los objetos ya serializados de packed (número, bytes) en un stream de objetos
+    comprimido con número stream_id, y los registra en entries (ver optimize_pdf).
+    Devuelve el siguiente número libre.
+    """
+    header = " ".join(f"{obj_id} {offset}" for obj_id, offset in zip(
+        (obj_id for obj_id, _ in packed),
+        itertools.accumulate((len(data) + 1 for _, data in packed[:-1]), initial=0),
+    )).encode("ascii") + b"\n"
+    stream = StreamObject()
+    stream._data = zlib.compress(header + b"\n".join(data for _, data in packed), OPTIMIZE_ZLIB_LEVEL)
+    stream.update({
+        NameObject("/Type"): NameObject("/ObjStm"),
+        NameObject("/N"): NumberObject(len(packed)),
+        NameObject("/First"): NumberObject(len(header)),
+        NameObject("/Filter"): NameObject("/FlateDecode"),
+    })
+    for index, (obj_id, _) in enumerate(packed):
+        entries[obj_id] = (2, stream_id, index)
+    entries[stream_id] = (1, output.tell())
+    output.write(f"{stream_id} 0 obj\n".encode("ascii") + serialized_pdf_object(stream) + b"\nendobj\n")
+    return stream_id + 1
+
+
+def _ps_string(text):
+    """Convierte texto en un literal de cadena PostScript."""
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return f"({escaped})"
+
+
+class GhostscriptWorker:
+    """
+    Ghostscript cargado una sola vez desde la librería gsapi (gsdll64.dll / libgs.so) y usado
+    para todas las compresiones del proceso, evitando lanzar un ejecutable en cada llamada.
+    Ghostscript admite una sola instancia por proceso, así que los trabajos se serializan.
+    Cada documento se procesa en una instancia nueva del intérprete, que se descarta al
+    terminar: pdfwrite arrastra estado entre trabajos (cuenta las páginas de los anteriores,
+    con lo que desvía los destinos de los enlaces, y guarda sus destinos pendientes), y no
+    se puede saber de antemano qué documentos lo van a usar. Para que el próximo documento no
+    espere a que se cree e inicialice la suya, al terminar cada uno se prepara la siguiente en
+    un hilo aparte, con los mismos ajustes (ver _prepare_next); warm_up prepara la primera.
+    """
+
+    def __init__(self, library_path):
+        loader = ctypes.WinDLL if os.name == "nt" else ctypes.CDLL
+        self._lib = loader(library_path)
+        self._lib.gsapi_new_instance.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p]
+        self._lib.gsapi_set_arg_encoding.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self._lib.gsapi_init_with_args.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+        self._lib.gsapi_run_string.argtypes = [
+            ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int)
+        ]
+        self._lib.gsapi_add_control_path.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p]
+        self._lib.gsapi_remove_control_path.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p]
+        self._lib.gsapi_exit.argtypes = [ctypes.c_void_p]
+        self._lib.gsapi_delete_instance.argtypes = [ctypes.c_void_p]
+        self._lock = threading.Lock()
+        self._instance = None
+        self._pdf_setting = None
+        self._image_settings = None
+        self._closed = False
+
+    def _start(self, pdf_setting, image_settings=None):
+        instance = ctypes.c_void_p()
+        code = self._lib.gsapi_new_instance(ctypes.byref(instance), None)
+        if code < 0:
+            raise RuntimeError(f"gsapi_new_instance devolvió {code}")
+        self._lib.gsapi_set_arg_encoding(instance, 1)  # UTF-8
+        args = [
+            "gs", "-dSAFER", "-dNOPAUSE", "-dQUIET",
+            "-sDEVICE=pdfwrite", "-dCompatibilityLevel=1.4", f"-dPDFSETTINGS={pdf_setting}",
+            *ghostscript_image_args(image_settings), f"-sOutputFile={os.devnull}",
+        ]
+        argv = (ctypes.c_char_p * len(args))(*[arg.encode("utf-8") for arg in args])
+        code = self._lib.gsapi_init_with_args(instance, len(args), argv)
+        if code < 0:
+            self._lib.gsapi_exit(instance)
+            self._lib.gsapi_delete_instance(instance)
+            raise RuntimeError(f"gsapi_init_with_args devolvió {code}")
+        self._instance = instance
+        self._pdf_setting = pdf_setting
+        self._image_settings = image_settings
+
+    def _stop(self):
+        """Descarta el intérprete; devuelve el código de gsapi_exit (0 si no había)."""
+        code = 0
+        if self._instance is not None:
+            code = self._lib.gsapi_exit(self._instance)
+            self._lib.gsapi_delete_instance(self._instance)
+            self._instance = None
+        return code
+
+    def warm_up(self, pdf_setting, image_settings=None):
+        """Inicializa el intérprete con pdf_setting si todavía no está, para que la próxima compresión no espere."""
+        with self._lock:
+            if self._instance is None and not self._closed:
+                self._start(pdf_setting, image_settings)
+
+    def _prepare_next(self, pdf_setting, image_settings):
+        """
+        Crea en un hilo aparte la instancia del próximo documento (casi siempre se comprime
+        con los mismos ajustes), mientras el que llamó sigue con su trabajo. Si el próximo
+        documento llega antes, espera a que termine de inicializarse; si usa otros ajustes,
+        se descarta.
+        """
+        def prepare():
+            try:
+                self.warm_up(pdf_setting, image_settings)
+            except Exception as e:
+                print(f"No se pudo preparar el intérprete de Ghostscript: {e}")
+
+        threading.Thread(target=prepare, name="ghostscript", daemon=True).start()
+
+    def compress(self, input_path, output_path, pdf_setting, image_settings=None):
+        """
+        Equivale a ejecutar gswin64c.exe con -dPDFSETTINGS=pdf_setting sobre input_path.
+        image_settings: resolución y calidad de las imágenes (ver ghostscript_image_args).
+        Lanza una excepción si falla. La instancia del intérprete se descarta siempre al
+        terminar, y se prepara la del próximo documento (ver la clase).
+        """
+        input_bytes = os.path.abspath(input_path).encode("utf-8")
+        output_bytes = os.path.abspath(output_path).encode("utf-8")
+        with self._lock:
+            if self._instance is not None and (
+                (self._pdf_setting, self._image_settings) != (pdf_setting, image_settings)
+            ):
+                self._stop()
+            if self._instance is None:
+                self._start(pdf_setting, image_settings)
+            try:
+                # Con -dSAFER solo se puede leer y escribir en las rutas habilitadas explícitamente
+                self._lib.gsapi_add_control_path(self._instance, GS_PERMIT_FILE_READING, input_bytes)
+                self._lib.gsapi_add_control_path(self._instance, GS_PERMIT_FILE_WRITING, output_bytes)
+                # pdfwrite completa el archivo al descartar el intérprete (gsapi_exit)
+                job = (
+                    f"<< /OutputFile {_ps_string(os.path.abspath(output_path))} >> setpagedevice "
+                    f"{ghostscript_image_ps(image_settings)} {_ps_string(os.path.abspath(input_path))} run"
+                )
+                exit_code = ctypes.c_int()
+                code = self._lib.gsapi_run_string(self._instance, job.encode("utf-8"), 0, ctypes.byref(exit_code))
+                if code < 0:
+                    raise RuntimeError(f"Ghostscript devolvió {code}")
+            finally:
+                code = self._stop()
+            if code < 0:
+                raise RuntimeError(f"gsapi_exit devolvió {code}")
+        self._prepare_next(pdf_setting, image_settings)
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            raise RuntimeError(f"Ghostscript no generó {output_path}")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._stop()
+
+
+def ghostscript_image_args(image_settings):
+    """
+    Argumentos de Ghostscript que reducen todas las imágenes en color y en grises a la
+    resolución de image_settings (una tupla (DPI, QFactor) de TARGET_LEVELS) y las codifican
+    en JPEG, también las que ya lo eran (si no, pdfwrite las copia sin aplicar la calidad);
+    las de blanco y negro quedan al doble de resolución. Vacío si es None.
+    """
+    if image_settings is None:
+        return []
+    resolution = image_settings[0]
+    args = []
+    for kind in ("Color", "Gray"):
+        args += [
+            f"-dDownsample{kind}Images=true", f"-d{kind}ImageDownsampleType=/Bicubic",
+            f"-d{kind}ImageResolution={resolution}", f"-d{kind}ImageDownsampleThreshold=1.0",
+            f"-dAutoFilter{kind}Images=false", f"-d{kind}ImageFilter=/DCTEncode",
+        ]
+    return args + [
+        "-dPassThroughJPEGImages=false", "-dDownsampleMonoImages=true",
+        f"-dMonoImageResolution={min(300, 2 * resolution)}",
+    ]
+
+
+def ghostscript_image_ps(image_settings):
+    """
+    PostScript que fija la calidad JPEG (QFactor) de image_settings; no hay un argumento de
+    línea de comandos para eso. Vacío si es None.
+    """
+    if image_settings is None:
+        return ""
+    params = f"<< /QFactor {image_settings[1]} /Blend 1 /HSamples [2 1 1 2] /VSamples [2 1 1 2] >>"
+    return f"<< /ColorImageDict {params} /GrayImageDict {params} >> setdistillerparams"
+
+
+def has_page_links(pdf_path):
+    """
+    Indica si el PDF tiene enlaces o destinos a sus propias páginas: anotaciones con /Dest o
+    acciones /GoTo, destinos con nombre (/Dests, /Names /Dests) o marcadores (/Outlines).
+    Se busca en el documento ya interpretado, así que también encuentra los que están en
+    streams de objetos comprimidos (ver optimize_pdf); si no se puede leer devuelve True.
+    """
+    try:
+        reader = PdfReader(pdf_path)
+        if reader.is_encrypted:
+            return True
+        root = reader.trailer["/Root"]
+        if "/Dests" in root or "/Outlines" in root:
+            return True
+        if "/Names" in root and "/Dests" in root["/Names"]:
+            return True
+        for page in reader.pages:
+            if "/Annots" not in page:
+                continue
+            for annotation in page["/Annots"]:
+                annotation = annotation.get_object()
+                if not isinstance(annotation, DictionaryObject):
+                    continue
+                action = annotation.get("/A", NullObject()).get_object()
+                if "/Dest" in annotation or (isinstance(action, DictionaryObject) and action.get("/S") == "/GoTo"):
+                    return True
+    except Exception:
+        return True
+    return False
+
+
+def ghostscript_executable():
+    """Ruta al ejecutable de Ghostscript incluido con la app. Se resuelve una sola vez."""
+    global _gs_executable
+    if _gs_executable is None:
+        if getattr(sys, 'frozen', False):
+            base_path = os.path.dirname(sys.executable)
+        else:
+            base_path = os.path.dirname(os.path.abspath(__file__))
+
+        # gs_executable = os.path.join(base_path,"DistribucionApp", "gs", "gs10.05.1", "bin", "gswin64c.exe")
+        _gs_executable = os.path.join(base_path, "gs", "gs10.05.1", "bin", "gswin64c.exe")
+
+        print("Ruta a Ghostscript:", _gs_executable)
+        print("¿Existe Ghostscript en esa ruta?", os.path.exists(_gs_executable))
+    return _gs_executable
+
+
+def get_ghostscript_worker():
+    """
+    Devuelve el GhostscriptWorker del proceso, creándolo la primera vez.
+    Devuelve None si la librería gsapi no está junto al ejecutable o no se puede cargar.
+    """
+    global _gs_worker, _gs_worker_unavailable
+    with _gs_worker_lock:
+        if _gs_worker is None and not _gs_worker_unavailable:
+            bin_dir = os.path.dirname(ghostscript_executable())
+            for library_name in GS_LIBRARY_NAMES:
+                library_path = os.path.join(bin_dir, library_name)
+                if not os.path.exists(library_path):
+                    continue
+                try:
+                    _gs_worker = GhostscriptWorker(library_path)
+                    atexit.register(_gs_worker.close)
+                    print(f"Usando la librería de Ghostscript: {library_path}")
+                except Exception as e:
+                    print(f"No se pudo cargar la librería de Ghostscript {library_path}: {e}")
+                break
+            if _gs_worker is None:
+                _gs_worker_unavailable = True
+    return _gs_worker
+
+
+def _run_ghostscript(input_path, output_path, pdf_setting, use_worker=True, image_settings=None):
+    """
+    Ejecuta Ghostscript (pdfwrite) sobre input_path. Lanza una excepción si falla.
+    Usa el intérprete persistente si está disponible (y use_worker es True);
+    si no, lanza el ejecutable en un subproceso como siempre.
+    image_settings: resolución y calidad de las imágenes (ver ghostscript_image_args).
+    """
+    worker = get_ghostscript_worker() if use_worker else None
+    if worker is not None:
+        try:
+            worker.compress(input_path, output_path, pdf_setting, image_settings)
+            return
+        except Exception as e:
+            print(f"Error en la librería de Ghostscript, se usa el ejecutable: {e}")
+
+    args = [
+        ghostscript_executable(),
+        "-sDEVICE=pdfwrite",
+        "-dCompatibilityLevel=1.4",
+        f"-dPDFSETTINGS={pdf_setting}",
+        *ghostscript_image_args(image_settings),
+        "-dNOPAUSE",
+        "-dQUIET",
+        "-dBATCH",
+        f"-sOutputFile={output_path}",
+    ]
+    if image_settings is not None:
+        args += ["-c", ghostscript_image_ps(image_settings), "-f"]
+    subprocess.run(args + [input_path], check=True)
+
+
+def _compress_chunk(chunk_pdf, pdf_setting, image_settings=None):
+    """
+    Comprime un tramo. Devuelve la ruta del tramo comprimido si es más chico que el
+    original, o la del original en caso contrario (o si Ghostscript falla).
+    """
+    compressed_chunk = chunk_pdf[:-len(".pdf")] + "_gs.pdf"
+    try:
+        # Subproceso: el intérprete persistente es uno solo y no permite trabajar en paralelo
+        _run_ghostscript(chunk_pdf, compressed_chunk, pdf_setting, use_worker=False, image_settings=image_settings)
+    except Exception as e:
+        print(f"Error al comprimir el tramo {chunk_pdf}: {e}")
+        return chunk_pdf
+    if os.path.exists(compressed_chunk) and os.path.getsize(compressed_chunk) < os.path.getsize(chunk_pdf):
+        return compressed_chunk
+    return chunk_pdf
+
+
+def compress_pdf_chunked(input_path, output_path, pdf_setting, chunk_pages, image_settings=None):
+    """
+    Comprime el PDF por tramos de chunk_pages páginas, con un proceso de Ghostscript
+    por tramo en paralelo (hasta GS_MAX_PROCESSES), y vuelve a unir los tramos en orden.
+    Cada tramo comprimido se usa solo si es más chico que el original.
+    Devuelve output_path si el resultado es más chico que input_path, o input_path si no.
+    """
+    chunk_dir = tempfile.mkdtemp(prefix="temp_gs_tramos_")
+    try:
+        reader = PdfReader(input_path)
+        total_pages = len(reader.pages)
+        chunks = []
+        for start in range(0, total_pages, chunk_pages):
+            chunk_pdf = os.path.join(chunk_dir, f"tramo_{start:06d}.pdf")
+            merger = StreamingPdfMerger(chunk_pdf)
+            try:
+                merger.append(input_path, pages=range(start, min(start + chunk_pages, total_pages)), reader=reader)
+            finally:
+                merger.close()
+            chunks.append(chunk_pdf)
+        del reader
+
+        workers = max(1, min(GS_MAX_PROCESSES or os.cpu_count() or 1, len(chunks)))
+        print(f"Comprimiendo {len(chunks)} tramos de hasta {chunk_pages} páginas con {workers} procesos de Ghostscript")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda chunk_pdf: _compress_chunk(chunk_pdf, pdf_setting, image_settings), chunks
+            ))
+
+        merger = StreamingPdfMerger(output_path)
+        try:
+            for chunk_pdf in results:
+                merger.append(chunk_pdf)
+        finally:
+            merger.close()
+        if merger.page_count != total_pages:
+            raise ValueError(f"se unieron {merger.page_count} de {total_pages} páginas")
+    except Exception as e:
+        print(f"Error al comprimir PDF por tramos: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return input_path
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    print(f"Archivo comprimido creado: {output_path}, tamaño: {os.path.getsize(output_path)} bytes")
+    if os.path.getsize(output_path) < os.path.getsize(input_path):
+        return output_path
+    os.remove(output_path)
+    return input_path
+
+
+def compress_pdf(input_path, output_path, compression_level="none", chunk_pages=None, image_settings=None):
+    """
+    Comprime el PDF usando Ghostscript según el nivel de compresión.
+    Los documentos de más de chunk_pages páginas (por defecto GS_CHUNK_PAGES, 0 para
+    desactivar) se comprimen por tramos en paralelo con compress_pdf_chunked, salvo que
+    tengan enlaces a sus propias páginas o marcadores (ver has_page_links): esos no
+    sobreviven al corte en tramos.
+    image_settings: resolución y calidad de las imágenes que reemplazan las del nivel
+    (ver ghostscript_image_args).
+    """
+    if compression_level == "none":
+        return input_path
+
+    if compression_level == "ebook":
+        pdf_setting = "/ebook"
+    elif compression_level == "screen":
+        pdf_setting = "/screen"
+    else:
+        pdf_setting = "/screen"
+
+    if chunk_pages is None:
+        chunk_pages = GS_CHUNK_PAGES
+    if chunk_pages:
+        try:
+            page_count = len(PdfReader(input_path).pages)
+        except Exception as e:
+            print(f"No se pudieron contar las páginas de {input_path}: {e}")
+            page_count = 0
+        if page_count > chunk_pages and has_page_links(input_path):
+            # Al separar los tramos se pierden los enlaces de un tramo a otro y los marcadores
+            print("El PDF tiene enlaces entre sus páginas, se comprime en una sola pasada")
+        elif page_count > chunk_pages:
+            return compress_pdf_chunked(input_path, output_path, pdf_setting, chunk_pages, image_settings)
+
+    try:
+        _run_ghostscript(input_path, output_path, pdf_setting, image_settings=image_settings)
+        if os.path.exists(output_path):
+            print(f"Archivo comprimido creado: {output_path}, tamaño: {os.path.getsize(output_path)} bytes")
+        else:
+            print(f"Archivo comprimido NO creado: {output_path}")
+        try:
+            if os.path.exists(output_path) and os.path.getsize(output_path) < os.path.getsize(input_path):
+                return output_path
+            else:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                return input_path
+        except Exception as e:
+            print(f"Error verificando tamaño archivo comprimido: {e}")
+            return input_path
+    except Exception as e:
+        print(f"Error al comprimir PDF: {e}")
+        return input_path
+
+
+def sample_page_indices(page_count, samples):
+    """Índices de samples páginas repartidas a lo largo del documento (todas si son menos)."""
+    if page_count <= samples:
+        return list(range(page_count))
+    return [int((index + 0.5) * page_count / samples) for index in range(samples)]
+
+
+def compress_to_size(input_path, output_path, max_bytes):
+    """
+    Comprime el PDF con la configuración de imágenes más suave de TARGET_LEVELS que lo deja
+    por debajo de max_bytes. Los niveles se prueban con búsqueda binaria sobre una muestra
+    de TARGET_SAMPLE_PAGES páginas, y el tamaño final se predice en proporción al de la
+    muestra; solo el nivel elegido se aplica al documento entero. Si el resultado todavía
+    supera max_bytes, la predicción se corrige con el tamaño real y se busca de nuevo entre
+    los niveles más fuertes, hasta TARGET_MAX_FULL_PASSES pasadas completas. Cada pasada
+    ejecuta Ghostscript como mucho log2(niveles) + 1 veces (redondeado hacia arriba) sobre la
+    muestra y una vez sobre el documento.
+    Devuelve output_path, o input_path si no se logró achicarlo (como compress_pdf).
+    """
+    input_size = os.path.getsize(input_path)
+    if input_size <= max_bytes:
+        return input_path
+    target = max_bytes * TARGET_SIZE_MARGIN
+    temp_dir = tempfile.mkdtemp(prefix="temp_pdfs_compilador_")
+    invocations = 0
+    try:
+        reader = PdfReader(input_path)
+        indices = sample_page_indices(len(reader.pages), TARGET_SAMPLE_PAGES)
+        if len(indices) < len(reader.pages):
+            sample_pdf = os.path.join(temp_dir, "muestra.pdf")
+            merger = StreamingPdfMerger(sample_pdf)
+            merger.append(input_path, pages=indices, reader=reader)
+            merger.close()
+        else:
+            sample_pdf = input_path
+        del reader
+        scale = input_size / os.path.getsize(sample_pdf)
+        predicted = {}
+
+        def predict(level):
+            nonlocal invocations
+            if level not in predicted:
+                sample_out = os.path.join(temp_dir, f"muestra_{level}.pdf")
+                _run_ghostscript(sample_pdf, sample_out, "/ebook", image_settings=TARGET_LEVELS[level])
+                invocations += 1
+                predicted[level] = os.path.getsize(sample_out) * scale
+                os.remove(sample_out)
+            return predicted[level]
+
+        def search(first, correction):
+            # Primer nivel (desde first) cuya predicción corregida entra en el objetivo
+            low, high = first, len(TARGET_LEVELS) - 1
+            while low < high:
+                middle = (low + high) // 2
+                if predict(middle) * correction <= target:
+                    high = middle
+                else:
+                    low = middle + 1
+            return low
+
+        level, correction, result = search(0, 1.0), 1.0, input_path
+        for full_pass in range(TARGET_MAX_FULL_PASSES):
+            print(f"Comprimiendo a {max_bytes} bytes como máximo: imágenes a {TARGET_LEVELS[level][0]} DPI, "
+                  f"QFactor {TARGET_LEVELS[level][1]} (tamaño previsto {int(predict(level) * correction)} bytes)")
+            result = compress_pdf(input_path, output_path, "ebook", image_settings=TARGET_LEVELS[level])
+            invocations += 1
+            size_bytes = os.path.getsize(result)
+            if size_bytes <= max_bytes or level == len(TARGET_LEVELS) - 1:
+                break
+            if full_pass + 1 < TARGET_MAX_FULL_PASSES:
+                correction = size_bytes / predict(level)
+                level = search(level + 1, correction)
+        print(f"Compresión a tamaño objetivo: {os.path.getsize(result)} bytes en {invocations} ejecuciones de Ghostscript")
+        if os.path.getsize(result) > max_bytes:
+            print(f"No se pudo bajar el PDF a {max_bytes} bytes; queda el resultado más chico obtenido")
+        return result
+    except Exception as e:
+        print(f"Error al comprimir PDF a tamaño objetivo: {e}")
+        return input_path
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def file_hash(path):
+    """Calcula el hash SHA-256 del contenido de un archivo, leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(filepath, kind, options=None):
+    """
+    Clave del caché para un archivo de entrada: hash del contenido más la versión
+    del conversor, el tipo de conversión y sus opciones.
+    """
+    options_text = json.dumps(options or {}, sort_keys=True)
+    key_text = f"{CONVERTER_VERSION}|{kind}|{options_text}|{file_hash(filepath)}"
+    return hashlib.sha256(key_text.encode("utf-8")).hexdigest()
+
+
+def cache_lookup(key):
+    """
+    Busca un PDF convertido en el caché. Devuelve su ruta o None.
+    Al encontrarlo actualiza su fecha de modificación (orden LRU para el desalojo).
+    """
+    cached_pdf = os.path.join(CACHE_DIR, key[:2], f"{key}.pdf")
+    try:
+        os.utime(cached_pdf)
+    except OSError:
+        return None
+    return cached_pdf
+
+
+def cache_store(key, pdf_path):
+    """
+    Guarda una copia de un PDF convertido en el caché (pdf_path puede ser una ruta o los bytes del PDF).
+    Se copia a un archivo temporal y se renombra para que otro proceso nunca vea una copia a medias.
+    """
+    cached_pdf = os.path.join(CACHE_DIR, key[:2], f"{key}.pdf")
+    try:
+        os.makedirs(os.path.dirname(cached_pdf), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cached_pdf), suffix=".tmp")
+        if isinstance(pdf_path, bytes):
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf_path)
+        else:
+            os.close(fd)
+            shutil.copyfile(pdf_path, tmp_path)
+        os.replace(tmp_path, cached_pdf)
+    except Exception as e:
+        print(f"No se pudo guardar en caché {cached_pdf}: {e}")
+
+
+def evict_cache(max_bytes=None):
+    """
+    Elimina las entradas menos usadas recientemente hasta que el caché ocupe como
+    máximo max_bytes (por defecto CACHE_MAX_BYTES).
+    """
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+    entries = []
+    total = 0
+    for folder, _, filenames in os.walk(CACHE_DIR):
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"No se pudo eliminar del caché {path}: {e}")
+            continue
+        total -= size
+        if total <= max_bytes:
+            break
+    print(f"Caché reducido a {total} bytes")
+
+
+def compression_level_for_size(size_bytes):
+    """Elige el nivel de compresión de Ghostscript según el tamaño (real o estimado) del PDF."""
+    if size_bytes < SIZE_LIMIT_NONE:
+        return "none"
+    elif size_bytes < SIZE_LIMIT_EBOOK:
+        return "ebook"
+    return "screen"
+
+
+def estimate_input(filepath):
+    """
+    Estima, sin convertir, cuánto aportará un archivo al PDF final.
+    Devuelve una tupla (tipo, bytes estimados); las imágenes solo se leen hasta la cabecera.
+    """
+    kind = INPUT_KINDS.get(os.path.splitext(filepath)[1].lower())
+    file_size = os.path.getsize(filepath)
+    if kind == "image":
+        from PIL import Image
+
+        with Image.open(filepath) as image:
+            return kind, estimated_output_bytes(kind, file_size, image.format, image.mode, image.width * image.height)
+    return kind, estimated_output_bytes(kind, file_size)
+
+
+def estimated_output_bytes(kind, file_size, image_format=None, image_mode=None, pixels=0):
+    """Bytes que aportará al PDF final un archivo del tipo indicado (ver estimate_input)."""
+    if kind == "pdf":
+        return file_size
+    elif kind == "image":
+        if image_format == "JPEG":
+            # Se copia sin volver a codificar (o se reduce con calidad similar): el tamaño casi no cambia
+            return file_size
+        return int(pixels * IMAGE_BYTES_PER_PIXEL.get(image_mode, 0.25))
+    elif kind == "txt":
+        # Texto plano más la estructura de cada página (~27 líneas por página)
+        return int(file_size * 1.2) + 2048
+    elif kind == "docx":
+        # Texto, tablas e imágenes; las imágenes ya vienen comprimidas en el zip
+        return 10 * 1024 + file_size
+    return 0
+
+
+def plan_compression(filepaths, scans=None, max_bytes=None):
+    """
+    Planifica la compresión antes de convertir, a partir del tamaño estimado de las entradas.
+    Los archivos idénticos se cuentan una sola vez. scans: análisis de scan_inputs, para no
+    volver a abrir los archivos que ya se analizaron.
+    Si el resultado va a superar SIZE_LIMIT_NONE, las imágenes se reducen al convertirlas
+    (como haría Ghostscript con /ebook o /screen) y Ghostscript solo se usa si lo que
+    queda sin reducir, principalmente PDFs ya existentes, sigue siendo demasiado grande.
+    Con max_bytes (tamaño máximo, ver compress_to_size) no se reduce nada al convertir: la
+    compresión se elige después de unir, según el tamaño real.
+    Devuelve un diccionario con el tamaño estimado, el nivel de compresión para
+    compress_pdf y las opciones de conversión de imágenes.
+    """
+    image_bytes = 0
+    other_bytes = 0
+    estimates = {scan["path"]: (scan["kind"], scan["estimated_bytes"]) for scan in scans or []}
+    # Los archivos repetidos se escriben una sola vez al unir (ver StreamingPdfMerger):
+    # solo se calcula el hash de los que comparten tamaño con otro
+    sizes = collections.Counter()
+    for filepath in filepaths:
+        try:
+            sizes[os.path.getsize(filepath)] += 1
+        except OSError:
+            pass
+    seen = set()
+    for filepath in filepaths:
+        try:
+            if sizes[os.path.getsize(filepath)] > 1:
+                digest = file_hash(filepath)
+                if digest in seen:
+                    continue
+                seen.add(digest)
+            kind, estimated = estimates.get(filepath) or estimate_input(filepath)
+        except Exception as e:
+            # El error real se informará en la etapa de conversión
+            print(f"No se pudo estimar el tamaño de {filepath}: {e}")
+            continue
+        if kind == "image":
+            image_bytes += estimated
+        else:
+            other_bytes += estimated
+
+    estimated_bytes = image_bytes + other_bytes
+    target_level = compression_level_for_size(estimated_bytes) if max_bytes is None else "none"
+    image_options = IMAGE_OPTIONS[target_level]
+    compression_level = "none"
+    if image_options:
+        estimated_bytes = other_bytes + int(image_bytes * IMAGE_SIZE_FACTOR[target_level])
+        # Las imágenes ya quedan reducidas como lo haría Ghostscript: solo vale la pena
+        # la segunda pasada si el resto del contenido pesa lo suficiente por sí mismo
+        if other_bytes >= SIZE_LIMIT_NONE:
+            compression_level = compression_level_for_size(estimated_bytes)
+
+    plan = {
+        "estimated_bytes": estimated_bytes,
+        "compression_level": compression_level,
+        "image_options": image_options,
+    }
+    print(f"Plan de compresión: {plan}")
+    return plan
+
+
+def scan_input(filepath):
+    """
+    Analiza un archivo sin convertirlo: valida el formato leyendo lo mínimo (encabezado y
+    final del PDF, cabecera de la imagen, índice y CRC del zip del DOCX) y cuenta páginas
+    y píxeles. Devuelve un diccionario con path, kind, bytes, pages, pixels,
+    estimated_bytes (ver estimated_output_bytes), passthrough (JPEG que se copia sin
+    decodificar) y error (None si el archivo se puede convertir).
+    """
+    scan = {
+        "path": filepath, "kind": None, "bytes": 0, "pages": 0, "pixels": 0, "estimated_bytes": 0,
+        "passthrough": False, "error": None,
+    }
+    try:
+        if not os.path.isfile(filepath):
+            raise ValueError("no es un archivo")
+        scan["bytes"] = os.path.getsize(filepath)
+        ext = os.path.splitext(filepath)[1].lower()
+        scan["kind"] = INPUT_KINDS.get(ext)
+        if scan["kind"] is None:
+            raise ValueError(f"extensión no soportada: {ext or '(sin extensión)'}")
+        if scan["bytes"] == 0:
+            raise ValueError("el archivo está vacío")
+        image_format = image_mode = None
+        if scan["kind"] == "pdf":
+            scan["pages"] = _scan_pdf(filepath, scan["bytes"])
+        elif scan["kind"] == "image":
+            from PIL import Image
+
+            try:
+                with Image.open(filepath) as image:
+                    image_format, image_mode = image.format, image.mode
+                    scan["pixels"] = image.width * image.height
+            except OSError as e:
+                raise ValueError(f"no es una imagen válida ({e})")
+            scan["pages"] = 1
+            scan["passthrough"] = image_format == "JPEG" and image_mode in JPEG_PASSTHROUGH_MODES
+        elif scan["kind"] == "txt":
+            scan["pages"] = _scan_txt(filepath)
+        else:
+            scan["pages"] = _scan_docx(filepath)
+        scan["estimated_bytes"] = estimated_output_bytes(
+            scan["kind"], scan["bytes"], image_format, image_mode, scan["pixels"]
+        )
+    except Exception as e:
+        scan["error"] = str(e) or type(e).__name__
+    return scan
+
+
+def _scan_pdf(filepath, file_size):
+    """Valida el encabezado y el final de un PDF y devuelve su cantidad de páginas."""
+    with open(filepath, "rb") as f:
+        if b"%PDF-" not in f.read(1024):
+            raise ValueError("no es un PDF (falta el encabezado %PDF-)")
+        f.seek(max(0, file_size - SCAN_TRAILER_BYTES))
+        tail = f.read()
+        if b"%%EOF" not in tail or b"startxref" not in tail:
+            # PyPDF2 busca la marca en todo el archivo: puede haber basura después del final
+            print(f"{filepath}: el final del PDF no está en los últimos {SCAN_TRAILER_BYTES} bytes")
+        # Con el archivo abierto PyPDF2 lee solo la tabla xref y los objetos que se piden
+        try:
+            reader = PdfReader(f)
+        except PdfReadError as e:
+            raise ValueError(f"PDF dañado ({e})")
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise ValueError("el PDF está protegido con contraseña")
+        count = reader.trailer["/Root"]["/Pages"].get("/Count")
+        pages = count if isinstance(count, int) else len(reader.pages)
+    if pages <= 0:
+        raise ValueError("el PDF no tiene páginas")
+    return pages
+
+
+def _scan_txt(filepath):
+    """Páginas aproximadas de un texto, según sus renglones (sin contar los cortes de líneas largas)."""
+    lines = 0
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            lines += chunk.count(b"\n")
+    lines_per_page = int(
+        (TEXT_PAGE_HEIGHT_MM - TEXT_MARGIN_MM - TEXT_BOTTOM_MARGIN_MM) / TEXT_LINE_HEIGHT_MM
+    )
+    return max(1, -(-(lines + 1) // lines_per_page))
+
+
+def _scan_docx(filepath):
+    """
+    Verifica el zip de un DOCX (estructura y CRC de cada parte) y devuelve las páginas que
+    guardó Word en docProps/app.xml, o 1 si no las guardó.
+    """
+    try:
+        archive = zipfile.ZipFile(filepath)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"el DOCX no es un zip válido ({e})")
+    with archive:
+        names = set(archive.namelist())
+        if "word/document.xml" not in names:
+            raise ValueError("no es un documento de Word (falta word/document.xml)")
+        damaged = archive.testzip()
+        if damaged is not None:
+            raise ValueError(f"el zip está dañado: {damaged}")
+        if "docProps/app.xml" in names:
+            match = re.search(rb"<Pages>(\d+)</Pages>", archive.read("docProps/app.xml"))
+            if match and int(match.group(1)) > 0:
+                return int(match.group(1))
+    return 1
+
+
+def conversion_cost(scan, image_options=None):
+    """Segundos aproximados de convertir un archivo analizado con scan_input (ver CONVERSION_COST)."""
+    kind = scan["kind"]
+    if kind == "image" and scan["passthrough"] and not image_options:
+        kind = "jpeg"
+    fixed, per_megabyte, per_megapixel = CONVERSION_COST[kind]
+    return fixed + per_megabyte * scan["bytes"] / (1024 * 1024) + per_megapixel * scan["pixels"] / 1e6
+
+
+def scan_inputs(filepaths, progress=None, cancel_event=None, metrics=None):
+    """
+    Etapa de análisis: valida todas las entradas con scan_input en varios hilos (casi todo el
+    trabajo es leer encabezados) antes de convertir nada, para descartar los archivos inválidos
+    en milisegundos. Devuelve el plan del trabajo: "inputs" (análisis de los archivos válidos, en
+    el orden de filepaths), "rejected" (los descartados, con el motivo en "error") y los totales
+    "bytes", "pages", "pixels" y "estimated_seconds" (ver conversion_cost).
+    metrics: PipelineMetrics donde se registra el análisis de cada archivo.
+    """
+    filepaths = list(filepaths)
+    total = len(filepaths)
+
+    def measured_scan(filepath):
+        with measure_stage(metrics, "analizando", filepath) as record:
+            scan = scan_input(filepath)
+            record["bytes_in"] = scan["bytes"]
+            if scan["error"]:
+                record["status"] = "error"
+        return scan
+
+    scans = []
+    report_progress(progress, cancel_event, "analizando", 0, total)
+    with ThreadPoolExecutor(max_workers=max(1, min(SCAN_MAX_THREADS, total))) as executor:
+        for scan in executor.map(measured_scan, filepaths):
+            scans.append(scan)
+            report_progress(progress, cancel_event, "analizando", len(scans), total, scan["path"])
+
+    inputs = [scan for scan in scans if scan["error"] is None]
+    rejected = [scan for scan in scans if scan["error"] is not None]
+    for scan in rejected:
+        print(f"Descartado {scan['path']}: {scan['error']}")
+    job_plan = {
+        "inputs": inputs,
+        "rejected": rejected,
+        "bytes": sum(scan["bytes"] for scan in inputs),
+        "pages": sum(scan["pages"] for scan in inputs),
+        "pixels": sum(scan["pixels"] for scan in inputs),
+        "estimated_seconds": round(sum(conversion_cost(scan) for scan in inputs), 3),
+    }
+    print(
+        f"Análisis previo: {len(inputs)} archivos válidos, {len(rejected)} descartados, "
+        f"{job_plan['pages']} páginas, {job_plan['pixels'] / 1e6:.1f} megapíxeles, "
+        f"conversión estimada en {job_plan['estimated_seconds']} s"
+    )
+    return job_plan
+
+
+def convert_to_pdf(filepath, temp_dir, index=0, use_cache=True, image_options=None, metrics=None):
+    """
+    Convierte un archivo de entrada a un PDF intermedio.
+    Devuelve el PDF intermedio: sus bytes, o una ruta (la del propio archivo si ya es PDF, la
+    del caché, o un archivo en temp_dir si pasó de SPOOL_MAX_BYTES), o None si el archivo se salta.
+    Si use_cache es True, reutiliza la conversión guardada en el caché cuando el contenido
+    no cambió, y guarda en él las conversiones nuevas.
+    image_options: argumentos extra para image_to_pdf (ver plan_compression).
+    metrics: PipelineMetrics donde se registra la conversión (status "cache" si se reutilizó).
+    Se ejecuta dentro de los procesos de la etapa de conversión.
+    """
+    name, ext = os.path.splitext(os.path.basename(filepath))
+    ext = ext.lower()
+    # El índice evita choques de nombres entre procesos (ej. foto.jpg y foto.png)
+    prefix = f"{index:05d}_{name}"
+
+    kind = INPUT_KINDS.get(ext)
+    if kind is None:
+        print(f"Extensión no soportada: {ext}, archivo: {filepath}")
+        return None
+
+    with measure_stage(metrics, "convirtiendo", filepath, os.path.getsize(filepath)) as record:
+        temp_pdf = _convert_file(filepath, kind, temp_dir, prefix, use_cache, image_options, record)
+        record["bytes_out"] = source_size(temp_pdf)
+    return temp_pdf
+
+
+def _convert_file(filepath, kind, temp_dir, prefix, use_cache, image_options, record):
+    """Conversión de convert_to_pdf según el tipo de archivo; marca record si se usó el caché."""
+    if kind == "pdf":
+        # Los PDFs no se copian: StreamingPdfMerger los limpia al leerlos durante la unión
+        return filepath
+
+    options = image_options if kind == "image" else None
+    key = cache_key(filepath, kind, options) if use_cache else None
+    if key:
+        cached_pdf = cache_lookup(key)
+        if cached_pdf:
+            print(f"Usando PDF en caché: {filepath} -> {cached_pdf}")
+            record["status"] = "cache"
+            return cached_pdf
+
+    # El resultado queda en memoria salvo que sea grande (ver SpooledPdf)
+    output = SpooledPdf(os.path.join(temp_dir, f"{prefix}_temp.pdf"))
+    if kind == "image":
+        print(f"Convirtiendo imagen a PDF: {filepath}")
+        image_to_pdf(filepath, output, **(image_options or {}))
+    elif kind == "txt":
+        print(f"Convirtiendo txt a PDF: {filepath}")
+        txt_to_pdf(filepath, output)
+    else:
+        print(f"Convirtiendo docx a PDF: {filepath}")
+        docx_to_pdf(filepath, output)
+    temp_pdf = output.getvalue()
+
+    if key:
+        cache_store(key, temp_pdf)
+    return temp_pdf
+
+
+class CompilationCancelled(Exception):
+    """Se lanza cuando el usuario cancela la compilación en curso."""
+
+
+def check_cancelled(cancel_event):
+    """Lanza CompilationCancelled si se pidió cancelar (cancel_event es un threading.Event)."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise CompilationCancelled("Compilación cancelada por el usuario.")
+
+
+def progress_percent(stage, current, total):
+    """Porcentaje del total que representa el avance de una etapa (ver PROGRESS_STAGES)."""
+    start, width = PROGRESS_STAGES[stage]
+    fraction = current / total if total else 1.0
+    return start + width * fraction
+
+
+def report_progress(progress, cancel_event, stage, current, total, detail=""):
+    """
+    Informa el avance de una etapa ("analizando", "convirtiendo", "uniendo", "optimizando",
+    "comprimiendo") llamando a progress(stage, current, total, detail), y verifica si se pidió
+    cancelar.
+    """
+    check_cancelled(cancel_event)
+    if progress is not None:
+        progress(stage, current, total, detail)
+
+
+def peak_rss_bytes():
+    """Memoria residente pico del proceso actual, o None si no se puede medir."""
+    try:
+        # En Linux ru_maxrss se hereda a través de exec: VmHWM es solo de este proceso
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS informa bytes; el resto, KB
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PipelineMetrics:
+    """
+    Mediciones de las etapas de una compilación ("analizando", "convirtiendo" y "uniendo" por archivo,
+    "optimizando" y "comprimiendo" por trabajo, y "total"): tiempo real, tiempo de CPU del hilo
+    que ejecutó la etapa, memoria pico y bytes de entrada y salida.
+    La memoria pico es la máxima del proceso donde corrió la etapa hasta que terminó (las
+    conversiones se miden dentro de los procesos del pool, ver convert_group_measured).
+    Varios trabajos pueden compartir la lista de registros (ver for_job).
+    """
+
+    def __init__(self, job=None, records=None):
+        self.job = job
+        self.records = records if records is not None else []
+
+    def for_job(self, job):
+        """Mediciones de otro trabajo que se guardan en la misma lista de registros."""
+        return PipelineMetrics(job, self.records)
+
+    @contextlib.contextmanager
+    def stage(self, stage, file=None, bytes_in=None):
+        """
+        Mide el bloque como una etapa. Devuelve el registro para completar "bytes_out"
+        (u otros datos) dentro del bloque. Si el bloque lanza una excepción el registro
+        queda con status "error" (o "cancelled"), y la excepción sigue su curso.
+        """
+        record = {
+            "job": self.job,
+            "stage": stage,
+            "file": file,
+            "status": "ok",
+            "started_at": round(time.time(), 3),
+            "bytes_in": bytes_in,
+            "bytes_out": None,
+        }
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield record
+        except BaseException as e:
+            record["status"] = "cancelled" if isinstance(e, CompilationCancelled) else "error"
+            raise
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall, 6)
+            record["cpu_seconds"] = round(time.thread_time() - cpu, 6)
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            self.records.append(record)
+
+    def add(self, records):
+        """Agrega registros medidos en otro proceso, como parte de este trabajo."""
+        for record in records:
+            record["job"] = self.job
+            self.records.append(record)
+
+    def totals(self):
+        """Totales de este trabajo por etapa: cantidad, tiempos y bytes sumados y memoria pico máxima."""
+        totals = {}
+        for record in self.records:
+            if record["job"] != self.job:
+                continue
+            total = totals.setdefault(record["stage"], {
+                "count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                "bytes_in": 0, "bytes_out": 0, "peak_rss_bytes": None,
+            })
+            total["count"] += 1
+            total["wall_seconds"] = round(total["wall_seconds"] + record["wall_seconds"], 6)
+            total["cpu_seconds"] = round(total["cpu_seconds"] + record["cpu_seconds"], 6)
+            total["bytes_in"] += record["bytes_in"] or 0
+            total["bytes_out"] += record["bytes_out"] or 0
+            if record["peak_rss_bytes"] is not None:
+                total["peak_rss_bytes"] = max(total["peak_rss_bytes"] or 0, record["peak_rss_bytes"])
+        return totals
+
+
+def measure_stage(metrics, stage, file=None, bytes_in=None):
+    """metrics.stage(...), o un bloque que no mide nada si metrics es None."""
+    if metrics is None:
+        return contextlib.nullcontext({})
+    return metrics.stage(stage, file, bytes_in)
+
+
+def write_metrics(records, path):
+    """
+    Exporta las mediciones. Si path termina en .prom se escribe (reemplazando el archivo) en
+    formato de texto de Prometheus, con los totales por trabajo y etapa; si no, se agrega
+    una línea JSON por registro, con el detalle por archivo.
+    """
+    if not path.lower().endswith(".prom"):
+        with open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+
+    def label(value):
+        text = str(value)
+        return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    totals = {}
+    for job in dict.fromkeys(record["job"] for record in records):
+        for stage, total in PipelineMetrics(job, records).totals().items():
+            totals[(job, stage)] = total
+    metrics = [
+        ("count", "compilador_stage_runs_total", "counter", "Ejecuciones de la etapa"),
+        ("wall_seconds", "compilador_stage_seconds_total", "counter", "Tiempo real de la etapa"),
+        ("cpu_seconds", "compilador_stage_cpu_seconds_total", "counter", "Tiempo de CPU de la etapa"),
+        ("bytes_in", "compilador_stage_input_bytes_total", "counter", "Bytes de entrada de la etapa"),
+        ("bytes_out", "compilador_stage_output_bytes_total", "counter", "Bytes de salida de la etapa"),
+        ("peak_rss_bytes", "compilador_stage_peak_rss_bytes", "gauge", "Memoria residente pico de la etapa"),
+    ]
+    lines = []
+    for key, name, kind, help_text in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (job, stage), total in totals.items():
+            if total[key] is not None:
+                lines.append(f'{name}{{job="{label(job)}",stage="{label(stage)}"}} {total[key]}')
+    # Se escribe aparte y se reemplaza, para que un recolector nunca lea el archivo a medias
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temp_path, path)
+
+
+def is_image(filepath):
+    """Indica si el archivo se convierte como imagen, según su extensión."""
+    return INPUT_KINDS.get(os.path.splitext(filepath)[1].lower()) == "image"
+
+
+def group_conversions(filepaths, workers, cached=None):
+    """
+    Agrupa las imágenes consecutivas en lotes que se convierten a un único PDF, de hasta
+    IMAGE_BATCH_SIZE imágenes y sin pasar de una parte por proceso, para no perder paralelismo.
+    El resto de los archivos va de a uno, y también las imágenes que ya están en el caché
+    (los índices de cached, ver cached_images), que cortan los lotes: así los lotes dependen
+    solo de las imágenes que hay que convertir. Devuelve una lista de listas de índices de filepaths.
+    """
+    cached = cached or {}
+    groups = []
+    run = []
+    for index, filepath in enumerate(filepaths + [None]):
+        if filepath is not None and is_image(filepath) and index not in cached:
+            run.append(index)
+            continue
+        if run:
+            batch_size = max(1, min(IMAGE_BATCH_SIZE, -(-len(run) // workers)))
+            groups.extend(run[start:start + batch_size] for start in range(0, len(run), batch_size))
+            run = []
+        if filepath is not None:
+            groups.append([index])
+    return groups
+
+
+def cached_images(filepaths, image_options=None, workers=1, metrics=None):
+    """
+    Busca en el caché cada imagen de filepaths por separado (los hashes se calculan en workers
+    hilos). Devuelve {índice: (clave, PDF del caché o None)}; la clave es None si no se pudo
+    leer la imagen (el error se informa al convertirla). Como cada imagen tiene su propia
+    entrada, agregar una imagen a la carpeta no invalida las demás.
+    metrics: PipelineMetrics donde se registra cada búsqueda (status "cache" o "cache_miss").
+    """
+    def lookup(filepath):
+        try:
+            with measure_stage(metrics, "convirtiendo", filepath, os.path.getsize(filepath)) as record:
+                key = cache_key(filepath, "image", image_options)
+                cached_pdf = cache_lookup(key)
+                if cached_pdf:
+                    record["status"] = "cache"
+                    record["bytes_out"] = source_size(cached_pdf)
+                else:
+                    # Este registro queda como el costo de buscar en el caché; la conversión tiene el suyo
+                    record["status"] = "cache_miss"
+                    record["bytes_in"] = None
+        except OSError:
+            return None, None
+        if cached_pdf:
+            print(f"Usando PDF en caché: {filepath} -> {cached_pdf}")
+        return key, cached_pdf
+
+    indices = [index for index, filepath in enumerate(filepaths) if is_image(filepath)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as threads:
+        return dict(zip(indices, threads.map(lambda index: lookup(filepaths[index]), indices)))
+
+
+def convert_image_batch(filepaths, temp_dir, index=0, keys=None, image_options=None, metrics=None):
+    """
+    Convierte varias imágenes consecutivas a un único PDF intermedio (ver images_to_pdf).
+    Devuelve (PDF intermedio, páginas de cada imagen); el PDF son sus bytes o una ruta, como
+    en convert_to_pdf. keys: claves del caché de cada imagen (ver cached_images); cada imagen
+    convertida se guarda en el caché por separado, en un PDF con su página, para que se pueda
+    reutilizar aunque la próxima vez los lotes se armen distinto.
+    metrics: PipelineMetrics donde se registra cada imagen.
+    Se ejecuta dentro de los procesos de la etapa de conversión.
+    """
+    name = os.path.splitext(os.path.basename(filepaths[0]))[0]
+    output = SpooledPdf(os.path.join(temp_dir, f"{index:05d}_{name}_lote_temp.pdf"))
+    print(f"Convirtiendo {len(filepaths)} imágenes a PDF: {filepaths[0]} ...")
+    page_counts = images_to_pdf(filepaths, output, metrics=metrics, **(image_options or {}))
+    temp_pdf = output.getvalue()
+    if not keys:
+        return temp_pdf, page_counts
+
+    reader = pdf_reader(temp_pdf) if len(filepaths) > 1 else None
+    first_page = 0
+    for position, (filepath, key, pages) in enumerate(zip(filepaths, keys, page_counts)):
+        if key and pages:
+            if reader is None:
+                cache_store(key, temp_pdf)
+            else:
+                single = SpooledPdf(os.path.join(temp_dir, f"{index:05d}_{position}_{name}_cache_temp.pdf"))
+                writer = StreamingPdfMerger(single)
+                try:
+                    writer.append(filepath, pages=range(first_page, first_page + pages), reader=reader)
+                finally:
+                    writer.close()
+                cache_store(key, single.getvalue())
+        first_page += pages
+    return temp_pdf, page_counts
+
+
+def convert_group(filepaths, temp_dir, index=0, use_cache=True, image_options=None, metrics=None, keys=None):
+    """
+    Convierte un grupo de group_conversions: un archivo suelto o un lote de imágenes.
+    keys: claves del caché de las imágenes del grupo, ya buscadas sin éxito (ver cached_images);
+    sin keys, un archivo suelto se busca y se guarda en el caché con convert_to_pdf.
+    Devuelve una lista de tuplas (archivo original, PDF intermedio, páginas), donde páginas
+    es None si el archivo ocupa todo el PDF, o el rango de páginas que le corresponde.
+    """
+    if len(filepaths) == 1 and keys is None:
+        temp_pdf = convert_to_pdf(filepaths[0], temp_dir, index, use_cache, image_options, metrics)
+        return [(filepaths[0], temp_pdf, None)] if temp_pdf else []
+
+    temp_pdf, page_counts = convert_image_batch(filepaths, temp_dir, index, keys, image_options, metrics)
+    entries = []
+    first_page = 0
+    for filepath, pages in zip(filepaths, page_counts):
+        if pages:
+            entries.append((filepath, temp_pdf, range(first_page, first_page + pages)))
+        first_page += pages
+    return entries
+
+
+def convert_group_measured(filepaths, temp_dir, index=0, use_cache=True, image_options=None, keys=None):
+    """
+    convert_group para los procesos del pool cuando se piden métricas: devuelve
+    (entradas, registros de PipelineMetrics medidos en el proceso).
+    """
+    metrics = PipelineMetrics()
+    entries = convert_group(filepaths, temp_dir, index, use_cache, image_options, metrics, keys)
+    return entries, metrics.records
+
+
+def spill_converted(entries, temp_dir, index):
+    """
+    Escribe en temp_dir los PDFs intermedios de entries que están en memoria (los archivos
+    de un lote comparten el mismo). Devuelve las entradas con la ruta en lugar de los bytes.
+    """
+    paths = {}
+    spilled = []
+    for filepath, source, pages in entries:
+        if isinstance(source, bytes):
+            if id(source) not in paths:
+                paths[id(source)] = os.path.join(temp_dir, f"{index:05d}_{len(paths)}_memoria.pdf")
+                with open(paths[id(source)], "wb") as f:
+                    f.write(source)
+            source = paths[id(source)]
+        spilled.append((filepath, source, pages))
+    return spilled
+
+
+def convert_inputs(filepaths, temp_dir, workers=None, use_cache=True, image_options=None,
+                   progress=None, cancel_event=None, metrics=None, costs=None, executor=None):
+    """
+    Etapa de conversión: convierte los archivos a PDFs intermedios usando un pool de procesos.
+    Las imágenes consecutivas se convierten por lotes a un mismo PDF (ver group_conversions);
+    las que están en el caché se buscan antes, una por una, y no pasan por el pool.
+    Devuelve una lista de tuplas (archivo original, PDF intermedio, páginas) en el mismo orden
+    que filepaths; páginas es None o el rango del PDF intermedio que le corresponde al archivo.
+    Los PDFs intermedios son bytes o rutas (ver convert_to_pdf); cuando los que están en memoria
+    suman más de SPOOL_TOTAL_MAX_BYTES, los siguientes se escriben en temp_dir.
+    Los archivos que fallan se informan y se saltan, igual que antes.
+    Los PDFs intermedios pueden estar en el caché: no se deben modificar ni borrar.
+    metrics: PipelineMetrics donde se registra la conversión de cada archivo.
+    costs: costo estimado de cada archivo (ver conversion_cost); el pool empieza por los grupos
+    más caros para que los chicos rellenen los huecos del final.
+    executor: pool de procesos compartido con otros trabajos (ver CompileServer). Se usa en
+    lugar de crear uno y el trabajo tiene como máximo workers grupos esperando en él, para que
+    los grupos de los demás trabajos se intercalen con los suyos en vez de esperar a que termine.
+    """
+    filepaths = list(filepaths)
+    if workers is None:
+        workers = MAX_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, len(filepaths)))
+    total = len(filepaths)
+    cached = cached_images(filepaths, image_options, workers, metrics) if use_cache else {}
+    hits = {i: cached_pdf for i, (_, cached_pdf) in cached.items() if cached_pdf}
+    groups = group_conversions(filepaths, workers, hits)
+
+    def group_keys(group):
+        # Las imágenes que no están en el caché se guardan en él con las claves ya calculadas
+        return [cached[i][0] for i in group] if group[0] in cached else None
+
+    converted = []
+    done = 0
+    memory_bytes = 0
+
+    def add_entries(entries, index):
+        nonlocal memory_bytes
+        size = sum(len(source) for source in {id(e[1]): e[1] for e in entries}.values() if isinstance(source, bytes))
+        if memory_bytes + size > SPOOL_TOTAL_MAX_BYTES:
+            entries = spill_converted(entries, temp_dir, index)
+        else:
+            memory_bytes += size
+        converted.extend(entries)
+
+    if (workers == 1 and executor is None) or all(group[0] in hits for group in groups):
+        # Sin pool: evitamos el costo de levantar procesos para un solo archivo o si todo está en el caché
+        for group in groups:
+            group_paths = [filepaths[i] for i in group]
+            report_progress(progress, cancel_event, "convirtiendo", done, total, group_paths[0])
+            try:
+                if group[0] in hits:
+                    add_entries([(group_paths[0], hits[group[0]], None)], group[0])
+                else:
+                    add_entries(convert_group(
+                        group_paths, temp_dir, group[0], use_cache, image_options, metrics, group_keys(group)
+                    ), group[0])
+            except Exception as e:
+                print(f"Error procesando {', '.join(group_paths)}: {e}. Saltando este archivo.")
+            done += len(group)
+        report_progress(progress, cancel_event, "convirtiendo", total, total)
+        return converted
+
+    print(f"Convirtiendo {len(filepaths)} archivos con {workers} procesos")
+    shared = executor is not None
+    with contextlib.nullcontext(executor) if shared else ProcessPoolExecutor(max_workers=workers) as executor:
+        function = convert_group if metrics is None else convert_group_measured
+        order = [g for g, group in enumerate(groups) if group[0] not in hits]
+        if costs:
+            order = sorted(order, key=lambda g: -sum(costs.get(filepaths[i], 0) for i in groups[g]))
+        pending = iter(order)
+        futures = [None] * len(groups)
+
+        def submit(needed):
+            # Con un pool propio se envía todo de entrada; con uno compartido, hasta llenar la
+            # ventana y siempre al menos el grupo que se necesita a continuación
+            while futures[needed] is None or not shared or sum(
+                1 for future in futures if future is not None and not future.done()
+            ) < workers:
+                g = next(pending, None)
+                if g is None:
+                    return
+                futures[g] = executor.submit(
+                    function, [filepaths[i] for i in groups[g]], temp_dir, groups[g][0], use_cache, image_options,
+                    group_keys(groups[g])
+                )
+
+        try:
+            # Recorremos los resultados en el orden original para conservar el orden del merge
+            for g, group in enumerate(groups):
+                group_paths = [filepaths[i] for i in group]
+                report_progress(progress, cancel_event, "convirtiendo", done, total, group_paths[0])
+                if group[0] in hits:
+                    add_entries([(group_paths[0], hits[group[0]], None)], group[0])
+                    done += 1
+                    continue
+                submit(g)
+                future = futures[g]
+                # Se espera de a poco para poder atender una cancelación mientras tanto
+                while not wait([future], timeout=0.2).done:
+                    check_cancelled(cancel_event)
+                    submit(g)
+                done += len(group)
+                try:
+                    entries = future.result()
+                    if metrics is not None:
+                        entries, records = entries
+                        metrics.add(records)
+                    add_entries(entries, group[0])
+                except Exception as e:
+                    print(f"Error procesando {', '.join(group_paths)}: {e}. Saltando este archivo.")
+        except CompilationCancelled:
+            # Los archivos que ya se están convirtiendo terminan; el resto no empieza
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            raise
+    report_progress(progress, cancel_event, "convirtiendo", total, total)
+    return converted
+
+
+def parse_page_ranges(text):
+    """
+    Interpreta una selección de páginas como "1-3,5,8-": numeradas desde 1 y en el orden
+    indicado ("8-" va de la 8 a la última, "-3" de la primera a la 3 y "5-3" de la 5 a la 3).
+    Devuelve una lista de tramos (desde, hasta), con None en los extremos abiertos, o None si
+    el texto está vacío o es "todas". Lanza ValueError si el texto no es válido.
+    """
+    text = str(text or "").replace(" ", "").lower()
+    if text in ("", "todas"):
+        return None
+    ranges = []
+    for part in text.split(","):
+        first, dash, last = part.partition("-")
+        try:
+            first = int(first) if first else None
+            last = int(last) if last else None
+        except ValueError:
+            raise ValueError(f"páginas inválidas: {part!r}")
+        if not dash:
+            if first is None:
+                raise ValueError(f"páginas inválidas: {text!r}")
+            last = first
+        if 0 in (first, last):
+            raise ValueError("las páginas se numeran desde 1")
+        ranges.append((first, last))
+    return ranges
+
+
+def parse_rotation(value):
+    """Rotación en grados (0, 90, 180 o 270, en sentido horario); vacía es 0. Lanza ValueError."""
+    try:
+        rotation = int(str(value or 0).strip())
+    except ValueError:
+        rotation = None
+    if rotation is None or rotation % 90:
+        raise ValueError(f"rotación inválida: {value!r} (se admiten 0, 90, 180 y 270)")
+    return rotation % 360
+
+
+def selection_entry(path, pages=None, rotation=None):
+    """
+    Elemento de una selección: las páginas (ver parse_page_ranges) y la rotación de un archivo.
+    Los trabajos de archivos (compile_pdfs_from_files) aceptan estos elementos en lugar de rutas.
+    """
+    return {"archivo": path, "paginas": parse_page_ranges(pages), "rotacion": parse_rotation(rotation)}
+
+
+def selection_path(item):
+    """Ruta de un elemento de la lista de archivos de un trabajo (ruta o selection_entry)."""
+    return item["archivo"] if isinstance(item, dict) else item
+
+
+def select_pages(ranges, count, label=None):
+    """
+    Índices (desde 0) de las páginas de ranges en un documento de count páginas. Las que no
+    existen se saltan, avisando con label si se indica.
+    """
+    indices = []
+    missing = 0
+    for first, last in ranges:
+        if first is None or last is None:
+            # Los tramos abiertos se recortan al documento y no se invierten
+            first, last = first or 1, count if last is None else last
+            numbers = range(first, last + 1)
+        else:
+            numbers = range(first, last + 1) if first <= last else range(first, last - 1, -1)
+        for number in numbers:
+            if 1 <= number <= count:
+                indices.append(number - 1)
+            else:
+                missing += 1
+    if missing and label:
+        print(f"{label}: se ignoran {missing} páginas elegidas que no existen (tiene {count})")
+    return indices
+
+
+def estimate_selection(scans, selection):
+    """
+    Análisis de scan_inputs con el tamaño estimado de los PDFs reducido a la proporción de
+    páginas que se eligen de cada uno (ver plan_compression).
+    """
+    chosen = {}
+    for item in selection:
+        chosen.setdefault(item["archivo"], []).append(item["paginas"])
+    result = []
+    for scan in scans:
+        ranges = chosen.get(scan["path"])
+        if scan["kind"] == "pdf" and ranges and None not in ranges and scan["pages"]:
+            kept = set()
+            for item_ranges in ranges:
+                kept.update(select_pages(item_ranges, scan["pages"]))
+            scan = dict(scan, estimated_bytes=scan["estimated_bytes"] * len(kept) // scan["pages"])
+        result.append(scan)
+    return result
+
+
+def merge_converted(converted, output_pdf, progress=None, cancel_event=None, page_counts=None, metrics=None,
+                    selection=None):
+    """
+    Une los PDFs convertidos (rutas o bytes, ver convert_inputs) en output_pdf, en orden, con
+    StreamingPdfMerger; output_pdf puede ser una ruta o un SpooledPdf, o un VolumePdfMerger
+    para repartir el resultado en volúmenes.
+    Devuelve la cantidad de páginas del resultado. Si se pasa page_counts (diccionario),
+    se completa con las páginas que aportó cada archivo original.
+    metrics: PipelineMetrics donde se registra lo que agrega cada archivo (incluye la limpieza
+    de metadatos, que se hace al copiar).
+    selection: lista de selection_entry que reemplaza el orden de converted; de cada una se
+    unen solo las páginas elegidas, con su rotación. Un archivo puede aparecer varias veces.
+    Los PDFs de los que se eligen páginas se leen desde el archivo abierto, sin cargarlos
+    enteros: solo se leen los objetos de las páginas que se copian.
+    """
+    steps = [(filepath, temp_pdf, pages, None, 0) for filepath, temp_pdf, pages in converted]
+    if selection is not None:
+        sources = {filepath: (temp_pdf, pages) for filepath, temp_pdf, pages in converted}
+        steps = [
+            (item["archivo"], *sources[item["archivo"]], item["paginas"], item["rotacion"])
+            for item in selection if item["archivo"] in sources
+        ]
+    merger = output_pdf if isinstance(output_pdf, VolumePdfMerger) else StreamingPdfMerger(output_pdf)
+    reader, reader_source, reader_file = None, None, None
+    try:
+        for index, (filepath, temp_pdf, pages, ranges, rotation) in enumerate(steps):
+            report_progress(progress, cancel_event, "uniendo", index, len(steps), filepath)
+            try:
+                # De un lote solo se cuenta el PDF intermedio entero en el primer archivo
+                bytes_in = source_size(temp_pdf) if temp_pdf is not reader_source else None
+                with measure_stage(metrics, "uniendo", filepath, bytes_in) as record:
+                    start = merger.bytes_written
+                    if temp_pdf is not reader_source:
+                        # Los archivos de un lote comparten el PDF intermedio: se lee una sola vez
+                        reader_source, reader = temp_pdf, None
+                        if reader_file is not None:
+                            reader_file.close()
+                            reader_file = None
+                        try:
+                            if ranges is not None and not isinstance(temp_pdf, bytes):
+                                reader_file = open(temp_pdf, "rb")
+                                reader = PdfReader(reader_file)
+                            else:
+                                reader = pdf_reader(temp_pdf)
+                        except PdfReadError as e:
+                            print(f"Error leyendo el PDF {filepath}: {e}. Saltando este archivo.")
+                    if reader is not None and ranges is not None:
+                        available = list(pages) if pages is not None else range(len(reader.pages))
+                        pages = [available[i] for i in select_pages(ranges, len(available), filepath)]
+                    added = (
+                        merger.append(filepath, pages=pages, reader=reader, rotation=rotation)
+                        if reader is not None and pages != [] else 0
+                    )
+                    record["bytes_out"] = merger.bytes_written - start
+                if not added and pages != []:
+                    print(f"Saltando PDF corrupto: {filepath}")
+                if page_counts is not None:
+                    page_counts[filepath] = page_counts.get(filepath, 0) + added
+            except Exception as e:
+                print(f"Error procesando {filepath}: {e}. Saltando este archivo.")
+    finally:
+        if reader_file is not None:
+            reader_file.close()
+        merger.close()
+    if merger.duplicate_bytes:
+        print(f"Objetos repetidos omitidos al unir: {merger.duplicate_bytes // 1024} KB")
+    report_progress(progress, cancel_event, "uniendo", len(steps), len(steps))
+    return merger.page_count
+
+
+def source_record_path(output_pdf):
+    """Ruta del registro de fuentes de un PDF unido: el mismo nombre con extensión .json."""
+    return os.path.splitext(output_pdf)[0] + ".json"
+
+
+def source_entry(filepath, pages, previous=None):
+    """
+    Datos de un archivo de entrada para el registro de fuentes.
+    Si tamaño y fecha coinciden con previous se reutiliza su hash en lugar de releer el archivo.
+    """
+    stat = os.stat(filepath)
+    if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+        digest = previous["sha256"]
+    else:
+        digest = file_hash(filepath)
+    return {
+        "name": os.path.basename(filepath),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest,
+        "pages": pages,
+    }
+
+
+def load_source_record(output_pdf):
+    """
+    Lee el registro de fuentes de output_pdf. Devuelve None si no existe, está dañado
+    o no corresponde al PDF actual (el PDF cambió de tamaño o de fecha desde que se escribió).
+    """
+    try:
+        with open(source_record_path(output_pdf), "r", encoding="utf-8") as f:
+            record = json.load(f)
+        stat = os.stat(output_pdf)
+    except (OSError, ValueError):
+        return None
+    output = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if record.get("version") != SOURCE_RECORD_VERSION or record.get("output") != output:
+        return None
+    return record
+
+
+def save_source_record(output_pdf, sources, compression_level, dead_pages=0):
+    """
+    Guarda qué archivos (en orden, con sus páginas) forman output_pdf.
+    Se escribe en un temporal y se renombra, igual que el caché. El temporal se nombra como
+    los archivos parciales (ver partial_path) para que FolderWatcher no lo tome como un cambio.
+    """
+    stat = os.stat(output_pdf)
+    record = {
+        "version": SOURCE_RECORD_VERSION,
+        "output": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        "compression_level": compression_level,
+        "dead_pages": dead_pages,
+        "sources": sources,
+    }
+    record_path = source_record_path(output_pdf)
+    try:
+        folder, name = os.path.split(os.path.abspath(record_path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{name}.", suffix=PARTIAL_SUFFIX)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=1)
+        # mkstemp crea el archivo solo para el usuario; el registro queda con los permisos del PDF
+        shutil.copymode(output_pdf, tmp_path)
+        os.replace(tmp_path, record_path)
+    except Exception as e:
+        print(f"No se pudo guardar el registro de fuentes {record_path}: {e}")
+
+
+def update_pdfs_in_directory(filepaths, output_pdf, record, workers=None, use_cache=True,
+                             progress=None, cancel_event=None, metrics=None, scans=None, executor=None,
+                             max_bytes=None):
+    """
+    Actualiza output_pdf de forma incremental: convierte solo los archivos nuevos o modificados
+    y los inserta en su posición (orden alfabético), conservando las páginas ya escritas de los
+    que no cambiaron. El PDF se modifica con una actualización incremental (se agrega al final).
+    scans: análisis de scan_inputs de filepaths, para planificar sin volver a abrirlos.
+    executor: pool de procesos compartido (ver convert_inputs).
+    max_bytes: tamaño máximo (por defecto TARGET_MAX_BYTES); si la actualización lo supera
+    se reconstruye el PDF para elegir de nuevo la compresión.
+    Devuelve la ruta del PDF, o None si conviene reconstruirlo desde cero.
+    """
+    if max_bytes is None:
+        max_bytes = TARGET_MAX_BYTES
+    previous = {entry["name"]: entry for entry in record["sources"]}
+    offsets = {}
+    start = 0
+    for entry in record["sources"]:
+        offsets[entry["name"]] = start
+        start += entry["pages"]
+
+    plan = plan_compression(filepaths, scans, max_bytes)
+    compression_level = record["compression_level"]
+    if COMPRESSION_LEVELS.index(plan["compression_level"]) > COMPRESSION_LEVELS.index(compression_level):
+        print("El resultado necesita más compresión que la anterior, se reconstruye el PDF completo")
+        return None
+
+    reused, changed = {}, []
+    for filepath in filepaths:
+        old = previous.get(os.path.basename(filepath))
+        if old is not None:
+            entry = source_entry(filepath, old["pages"], old)
+            if entry["sha256"] == old["sha256"]:
+                reused[filepath] = entry
+                continue
+        changed.append(filepath)
+    dropped_pages = sum(
+        entry["pages"] for name, entry in previous.items()
+        if name not in {os.path.basename(filepath) for filepath in reused}
+    )
+    if not changed and not dropped_pages:
+        print(f"Sin cambios desde la última compilación: {output_pdf}")
+        # Se actualizan las fechas de los archivos que se tocaron sin cambiar su contenido
+        save_source_record(output_pdf, [reused[f] for f in filepaths], compression_level, record["dead_pages"])
+        return output_pdf
+    print(f"Actualización incremental: {len(changed)} archivos nuevos o modificados, "
+          f"{len(reused)} sin cambios")
+
+    temp_dir = tempfile.mkdtemp(prefix="temp_pdfs_compilador_")
+    try:
+        new_pdf = None
+        page_counts = {}
+        if changed:
+            # Los archivos nuevos se unen y comprimen aparte, con el mismo nivel que el resto
+            converted = convert_inputs(
+                changed, temp_dir, workers=workers, use_cache=use_cache, image_options=plan["image_options"],
+                progress=progress, cancel_event=cancel_event, metrics=metrics,
+                costs={scan["path"]: conversion_cost(scan, plan["image_options"]) for scan in scans or []},
+                executor=executor
+            )
+            new_pdf = os.path.join(temp_dir, "nuevos.pdf")
+            # Sin compresión no hace falta un archivo para Ghostscript: la parte nueva puede quedar en memoria
+            output = SpooledPdf(new_pdf) if compression_level == "none" else new_pdf
+            if merge_converted(converted, output, progress, cancel_event, page_counts=page_counts, metrics=metrics):
+                if compression_level == "none":
+                    new_pdf = output.getvalue()
+                report_progress(progress, cancel_event, "comprimiendo", 0, 1, compression_level)
+                with measure_stage(metrics, "comprimiendo", None, source_size(new_pdf)) as stage_record:
+                    new_pdf = compress_pdf(
+                        new_pdf, os.path.join(temp_dir, "nuevos_comprimido.pdf"), compression_level
+                    )
+                    stage_record["bytes_out"] = source_size(new_pdf)
+                report_progress(progress, cancel_event, "comprimiendo", 1, 1, compression_level)
+            else:
+                new_pdf = None
+
+        dead_pages = record["dead_pages"] + dropped_pages
+        live_pages = sum(entry["pages"] for entry in reused.values()) + sum(page_counts.values())
+        if live_pages == 0 or dead_pages > INCREMENTAL_MAX_DEAD_RATIO * live_pages:
+            print("Demasiadas páginas reemplazadas, se reconstruye el PDF completo")
+            return None
+
+        try:
+            merger = IncrementalPdfMerger(output_pdf)
+        except (ValueError, PdfReadError) as e:
+            print(f"No se puede actualizar {output_pdf} de forma incremental: {e}")
+            return None
+        if len(merger.existing_page_ids) != start:
+            merger.abort()
+            print("El registro de fuentes no coincide con las páginas del PDF")
+            return None
+
+        sources = []
+        new_reader = pdf_reader(new_pdf) if new_pdf else None
+        new_offset = 0
+        try:
+            for index, filepath in enumerate(filepaths):
+                report_progress(progress, cancel_event, "uniendo", index, len(filepaths), filepath)
+                if filepath in reused:
+                    entry = reused[filepath]
+                    merger.keep_pages(range(offsets[entry["name"]], offsets[entry["name"]] + entry["pages"]))
+                else:
+                    pages = page_counts.get(filepath, 0)
+                    if pages:
+                        with measure_stage(metrics, "uniendo", filepath) as stage_record:
+                            start = merger.bytes_written
+                            merger.append(filepath, pages=range(new_offset, new_offset + pages), reader=new_reader)
+                            stage_record["bytes_out"] = merger.bytes_written - start
+                        new_offset += pages
+                    entry = source_entry(filepath, pages)
+                sources.append(entry)
+        except BaseException:
+            # El PDF queda exactamente como antes de empezar
+            merger.abort()
+            raise
+        merger.close()
+        report_progress(progress, None, "uniendo", len(filepaths), len(filepaths))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    save_source_record(output_pdf, sources, compression_level, dead_pages)
+    print(f"Tamaño archivo final: {os.path.getsize(output_pdf)} bytes")
+    if max_bytes is not None and os.path.getsize(output_pdf) > max_bytes:
+        print("El PDF actualizado supera el tamaño máximo, se reconstruye el PDF completo")
+        return None
+    return output_pdf
+
+
+def partial_path(output_pdf):
+    """
+    Ruta única junto a output_pdf (oculta, con PARTIAL_SUFFIX) donde se escribe el resultado
+    antes de reemplazar output_pdf con os.replace: en la misma carpeta el reemplazo es atómico.
+    """
+    folder, name = os.path.split(os.path.abspath(output_pdf))
+    return os.path.join(folder, f".{name}.{os.urandom(4).hex()}{PARTIAL_SUFFIX}")
+
+
+def volume_path(output_pdf, number):
+    """Ruta del volumen number (desde 1) de output_pdf: <nombre>_<número>.pdf."""
+    base, extension = os.path.splitext(output_pdf)
+    return f"{base}_{number}{extension}"
+
+
+def output_file_names(output_pdf):
+    """
+    Nombres de los archivos que escribe en su carpeta la compilación de output_pdf: el PDF,
+    su registro de fuentes y los volúmenes (ver volume_path) que haya.
+    """
+    base, extension = os.path.splitext(os.path.basename(output_pdf))
+    volume_pattern = re.compile(re.escape(base) + r"_\d+" + re.escape(extension), re.IGNORECASE)
+    names = {os.path.basename(output_pdf), os.path.basename(source_record_path(output_pdf))}
+    try:
+        names.update(
+            name for name in os.listdir(os.path.dirname(os.path.abspath(output_pdf))) if volume_pattern.fullmatch(name)
+        )
+    except OSError:
+        pass
+    return names
+
+
+def build_pdf(filepaths, scans, output_pdf, workers=None, use_cache=True, progress=None, cancel_event=None,
+              metrics=None, page_counts=None, executor=None, selection=None, max_bytes=None, volume_bytes=None,
+              volumes=None, optimize=None, object_streams=True):
+    """
+    Convierte, une y comprime filepaths (ya analizados con scan_inputs) y escribe el resultado
+    directamente en output_pdf. Todo se escribe en archivos parciales junto al destino, que
+    reemplazan a output_pdf de una sola vez al final: si algo falla o se cancela, output_pdf
+    queda como estaba y no quedan archivos a medias. Los PDFs intermedios pasan en memoria
+    (ver SpooledPdf) y la carpeta temporal solo recibe los grandes.
+    Devuelve el nivel de compresión usado. page_counts: ver merge_converted.
+    executor: pool de procesos compartido (ver convert_inputs).
+    selection: páginas, rotación y orden de lo que se une (ver merge_converted); filepaths son
+    los archivos distintos que aparecen en ella, y cada uno se convierte una sola vez.
+    max_bytes: tamaño máximo del resultado (por defecto TARGET_MAX_BYTES); en lugar de los
+    umbrales fijos, se comprime con compress_to_size solo lo necesario para no superarlo.
+    volume_bytes: en lugar de output_pdf se escriben volúmenes de como máximo volume_bytes
+    cada uno (ver VolumePdfMerger y volume_path), y se borran los de más que hubiera de una
+    compilación anterior. Cada volumen se comprime por separado y después, si entran en menos,
+    se vuelven a repartir (ver repack_volumes). volumes: lista que se completa con las rutas de
+    los volúmenes escritos.
+    optimize: optimiza sin pérdida lo unido antes de comprimirlo (por defecto OPTIMIZE_PDF, ver
+    optimize_pdf); si eso lo deja por debajo de SIZE_LIMIT_NONE no se usa Ghostscript.
+    object_streams: ver optimize_pdf; sin ellos el resultado se puede actualizar con
+    IncrementalPdfMerger.
+    """
+    if max_bytes is None:
+        max_bytes = TARGET_MAX_BYTES
+    if optimize is None:
+        optimize = OPTIMIZE_PDF
+    temp_dir = tempfile.mkdtemp(prefix="temp_pdfs_compilador_")
+    partials = []
+    try:
+        if selection is not None:
+            # Se planifica la compresión con lo que se va a unir, no con los PDFs enteros
+            scans = estimate_selection(scans, selection)
+        plan = plan_compression(filepaths, scans, max_bytes)
+        converted = convert_inputs(
+            filepaths, temp_dir, workers=workers, use_cache=use_cache, image_options=plan["image_options"],
+            progress=progress, cancel_event=cancel_event, metrics=metrics,
+            costs={scan["path"]: conversion_cost(scan, plan["image_options"]) for scan in scans}, executor=executor
+        )
+
+        print(f"Archivo PDF final: {output_pdf}")
+        if volume_bytes:
+            def volume_partial(number):
+                partials.append(partial_path(volume_path(output_pdf, number)))
+                return partials[-1]
+
+            merged = VolumePdfMerger(volume_partial, volume_bytes)
+        else:
+            partials.append(partial_path(output_pdf))
+            merged = partials[0]
+        page_count = merge_converted(
+            converted, merged, progress=progress, cancel_event=cancel_event, page_counts=page_counts,
+            metrics=metrics, selection=selection
+        )
+        if page_count == 0:
+            raise ValueError("No se encontraron archivos PDF válidos para compilar.")
+        merged_pdfs = list(partials)
+        destinations = [output_pdf]
+        if volume_bytes:
+            destinations = [volume_path(output_pdf, number) for number in range(1, len(merged_pdfs) + 1)]
+
+        if use_cache:
+            # Se desaloja después del merge para no borrar PDFs del caché que todavía se están leyendo
+            evict_cache()
+
+        sizes = [os.path.getsize(merged_pdf) for merged_pdf in merged_pdfs]
+        size_bytes = sum(sizes)
+        print(f"Tamaño archivo final: {size_bytes} bytes")
+        if volume_bytes:
+            print(f"Repartido en {len(merged_pdfs)} volúmenes: {', '.join(map(str, sizes))} bytes")
+
+        merged_bytes = size_bytes
+        if optimize:
+            for index, merged_pdf in enumerate(merged_pdfs):
+                report_progress(progress, cancel_event, "optimizando", index, len(merged_pdfs))
+                partials.append(partial_path(destinations[index]))
+                with measure_stage(metrics, "optimizando", None, sizes[index]) as stage_record:
+                    merged_pdfs[index] = optimize_pdf(merged_pdf, partials[-1], object_streams=object_streams)
+                    stage_record["bytes_out"] = os.path.getsize(merged_pdfs[index])
+            if progress is not None:
+                progress("optimizando", len(merged_pdfs), len(merged_pdfs), "")
+            sizes = [os.path.getsize(merged_pdf) for merged_pdf in merged_pdfs]
+            size_bytes = sum(sizes)
+
+        # El nivel se decidió antes de convertir; las imágenes ya se redujeron si hacía falta
+        # (si la estimación quedó corta, se usa el nivel que corresponde al tamaño real)
+        compression_level = plan["compression_level"]
+        actual_level = compression_level_for_size(size_bytes)
+        if max_bytes is not None:
+            compression_level = "none" if max(sizes) <= max_bytes else "ebook"
+        elif COMPRESSION_LEVELS.index(actual_level) > COMPRESSION_LEVELS.index(compression_level):
+            print("La estimación de tamaño quedó corta, se usa el tamaño real")
+            compression_level = actual_level
+        compress = compression_level != "none"
+        if compress and max_bytes is None and size_bytes < SIZE_LIMIT_NONE <= merged_bytes:
+            # Se devuelve igual el nivel planificado: con ese nivel se convirtieron las imágenes y
+            # con ese se comprimen los archivos que se agreguen en una actualización incremental
+            print("Después de optimizarlo el PDF ya es chico, no se comprime con Ghostscript")
+            compress = False
+
+        final_pdfs = list(merged_pdfs)
+        for index, merged_pdf in enumerate(merged_pdfs):
+            report_progress(progress, cancel_event, "comprimiendo", index, len(merged_pdfs), compression_level)
+            if compress:
+                partials.append(partial_path(destinations[index]))
+                with measure_stage(metrics, "comprimiendo", None, sizes[index]) as stage_record:
+                    if max_bytes is not None:
+                        final_pdfs[index] = compress_to_size(merged_pdf, partials[-1], max_bytes)
+                    else:
+                        final_pdfs[index] = compress_pdf(merged_pdf, partials[-1], compression_level=compression_level)
+                    stage_record["bytes_out"] = os.path.getsize(final_pdfs[index])
+        if progress is not None:
+            progress("comprimiendo", len(merged_pdfs), len(merged_pdfs), compression_level)
+
+        if volume_bytes and len(final_pdfs) > 1:
+            repacked = repack_volumes(final_pdfs, merged.units, volume_bytes, volume_partial)
+            if repacked:
+                print(f"Después de comprimir, los volúmenes pasan de {len(final_pdfs)} a {len(repacked)}")
+                final_pdfs = repacked
+                destinations = [volume_path(output_pdf, number) for number in range(1, len(final_pdfs) + 1)]
+
+        for final_pdf, destination in zip(final_pdfs, destinations):
+            os.replace(final_pdf, destination)
+        if volume_bytes:
+            number = len(destinations) + 1
+            while os.path.exists(volume_path(output_pdf, number)):
+                os.remove(volume_path(output_pdf, number))
+                number += 1
+            if volumes is not None:
+                volumes.extend(destinations)
+    finally:
+        for path in partials:
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return compression_level
+
+
+def compile_pdfs_in_directory(directory, workers=None, use_cache=True, progress=None, cancel_event=None,
+                              incremental=False, metrics=None, output_pdf=None, executor=None, max_bytes=None,
+                              volume_bytes=None):
+    """
+    Compila y une PDFs a partir de todos los archivos en un directorio (ver build_pdf).
+    output_pdf: destino del PDF final, por defecto <carpeta>_UNIDO.pdf dentro del directorio;
+    se escribe directamente ahí y se reemplaza de forma atómica.
+    workers: cantidad de procesos para convertir archivos (None = MAX_WORKERS).
+    use_cache: reutiliza las conversiones guardadas en CACHE_DIR de ejecuciones anteriores.
+    progress / cancel_event: ver report_progress. Si se cancela se lanza CompilationCancelled
+    y no quedan archivos a medias.
+    incremental: si output_pdf ya existe y tiene registro de fuentes, solo se agregan
+    los archivos nuevos o modificados (ver update_pdfs_in_directory). El registro se escribe
+    junto al PDF también cuando se compila desde cero.
+    metrics: PipelineMetrics donde se registran las etapas (ver PipelineMetrics).
+    executor: pool de procesos compartido con otros trabajos (ver convert_inputs).
+    max_bytes: tamaño máximo del PDF final (ver build_pdf).
+    volume_bytes: reparte el resultado en volúmenes <carpeta>_UNIDO_1.pdf, _2... de como máximo
+    ese tamaño (ver build_pdf); se compilan siempre desde cero y se devuelve la lista de rutas.
+    Con incremental el PDF se optimiza sin streams de objetos, para poder actualizarlo después.
+    """
+    dir_name = os.path.basename(os.path.normpath(directory))
+    default_pdf = os.path.join(directory, f"{dir_name}_UNIDO.pdf")
+    if output_pdf is None:
+        output_pdf = default_pdf
+
+    # El resultado de una compilación anterior (su registro y sus volúmenes) no se vuelve a
+    # unir, ni los archivos parciales de una compilación interrumpida
+    excluded = output_file_names(default_pdf) | output_file_names(output_pdf)
+    filepaths = [
+        os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+        if filename not in excluded and not filename.endswith(PARTIAL_SUFFIX)
+    ]
+    # Los archivos inválidos (y las subcarpetas) se descartan antes de convertir nada
+    job_plan = scan_inputs(filepaths, progress=progress, cancel_event=cancel_event, metrics=metrics)
+    filepaths = [scan["path"] for scan in job_plan["inputs"]]
+    if not filepaths:
+        raise ValueError("No se encontraron archivos PDF válidos para compilar.")
+
+    if incremental and volume_bytes:
+        print("Los volúmenes no se actualizan de forma incremental, se compila desde cero")
+    elif incremental:
+        record = load_source_record(output_pdf)
+        if record is None:
+            print("No hay un registro de fuentes válido, se compila desde cero")
+        else:
+            updated_pdf = update_pdfs_in_directory(
+                filepaths, output_pdf, record, workers=workers, use_cache=use_cache,
+                progress=progress, cancel_event=cancel_event, metrics=metrics, scans=job_plan["inputs"],
+                executor=executor, max_bytes=max_bytes
+            )
+            if updated_pdf:
+                return updated_pdf
+
+    page_counts = {}
+    volumes = []
+    compression_level = build_pdf(
+        filepaths, job_plan["inputs"], output_pdf, workers=workers, use_cache=use_cache, progress=progress,
+        cancel_event=cancel_event, metrics=metrics, page_counts=page_counts, executor=executor, max_bytes=max_bytes,
+        volume_bytes=volume_bytes, volumes=volumes, object_streams=not incremental
+    )
+    if volume_bytes:
+        return volumes
+
+    if incremental:
+        sources = [source_entry(filepath, page_counts.get(filepath, 0)) for filepath in filepaths]
+        save_source_record(output_pdf, sources, compression_level)
+    return output_pdf
+
+
+def compile_pdfs_from_files(files, workers=None, use_cache=True, progress=None, cancel_event=None, metrics=None,
+                            output_pdf=None, executor=None, max_bytes=None, volume_bytes=None):
+    """
+    Compila y une PDFs a partir de una lista de archivos específicos (ver build_pdf).
+    files: rutas, o elementos de selection_entry para unir solo algunas páginas de un archivo,
+    rotadas; un mismo archivo puede aparecer varias veces y se convierte una sola vez.
+    output_pdf: destino del PDF final; se escribe directamente ahí y se reemplaza de forma atómica.
+    workers: cantidad de procesos para convertir archivos (None = MAX_WORKERS).
+    use_cache: reutiliza las conversiones guardadas en CACHE_DIR de ejecuciones anteriores.
+    progress / cancel_event: ver report_progress. Si se cancela se lanza CompilationCancelled
+    y no quedan archivos a medias.
+    metrics: PipelineMetrics donde se registran las etapas (ver PipelineMetrics).
+    executor: pool de procesos compartido con otros trabajos (ver convert_inputs).
+    max_bytes: tamaño máximo del PDF final (ver build_pdf).
+    volume_bytes: reparte el resultado en volúmenes de como máximo ese tamaño (ver build_pdf);
+    en ese caso en lugar de la ruta del PDF final se devuelve la lista de volúmenes.
+    Devuelve (ruta del PDF final, carpeta temporal). Sin output_pdf el resultado queda en una
+    carpeta temporal nueva que quien llama debe eliminar después de usarlo; con output_pdf
+    la carpeta es None.
+    """
+    selection = None
+    if any(isinstance(item, dict) for item in files):
+        selection = [item if isinstance(item, dict) else selection_entry(item) for item in files]
+        files = list(dict.fromkeys(item["archivo"] for item in selection))
+    # Los archivos inválidos se descartan antes de convertir nada
+    job_plan = scan_inputs(files, progress=progress, cancel_event=cancel_event, metrics=metrics)
+    files = [scan["path"] for scan in job_plan["inputs"]]
+    if not files:
+        raise ValueError("No se encontraron archivos PDF válidos para compilar.")
+    if selection is not None:
+        valid = set(files)
+        selection = [item for item in selection if item["archivo"] in valid]
+
+    temp_dir = None
+    if output_pdf is None:
+        temp_dir = tempfile.mkdtemp(prefix="temp_pdfs_compilador_")
+        print(f"Carpeta temporal creada para el resultado: {temp_dir}")
+        output_pdf = os.path.join(temp_dir, "temp_output.pdf")
+    try:
+        volumes = []
+        build_pdf(
+            files, job_plan["inputs"], output_pdf, workers=workers, use_cache=use_cache, progress=progress,
+            cancel_event=cancel_event, metrics=metrics, executor=executor, selection=selection,
+            max_bytes=max_bytes, volume_bytes=volume_bytes, volumes=volumes
+        )
+    except BaseException:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return (volumes if volume_bytes else output_pdf), temp_dir
+
+
+def select_files():
+    """
+    Abre un diálogo para seleccionar múltiples archivos y guarda la lista globalmente.
+    Muestra en el Entry la cantidad de archivos seleccionados.
+    """
+    global selected_files, selected_mode
+    selected_files = filedialog.askopenfilenames(
+        title="Selecciona los archivos a compilar",
+        filetypes=[
+            ("Todos los archivos", "*.*"),
+            ("Archivos PDF", "*.pdf"),
+            ("Archivos de texto", "*.txt"),
+            ("Archivos Word", "*.docx"),
+            ("Imágenes", "*.png;*.jpg;*.jpeg")
+        ]
+    )
+    if selected_files:
+        entry_dir.delete(0, tk.END)
+        entry_dir.insert(0, f"{len(selected_files)} archivos seleccionados")
+        selected_mode = "files"
+
+
+def compile_to_downloads(mode, input_value, files, progress=None, cancel_event=None, metrics=None):
+    """
+    Ejecuta la compilación según el modo (carpeta o archivos) y escribe el PDF final
+    directamente en la carpeta Descargas con nombre adecuado. Devuelve la ruta final.
+    No usa Tk: se ejecuta en el hilo de trabajo de la interfaz.
+    """
+    downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
+    if mode == "folder":
+        dir_name = os.path.basename(os.path.normpath(input_value))
+        output_pdf_dest = os.path.join(downloads_path, f"{dir_name}_UNIDO.pdf")
+        compile_pdfs_in_directory(
+            input_value, progress=progress, cancel_event=cancel_event, metrics=metrics, output_pdf=output_pdf_dest
+        )
+    else:
+        base_name = "Documentos_UNIDOS"
+        i = 1
+        while True:
+            candidate = os.path.join(downloads_path, f"{base_name}_{i}.pdf")
+            if not os.path.exists(candidate):
+                output_pdf_dest = candidate
+                break
+            i += 1
+        compile_pdfs_from_files(
+            files, progress=progress, cancel_event=cancel_event, metrics=metrics, output_pdf=output_pdf_dest
+        )
+    return output_pdf_dest
+
+
+def run_compilation():
+    """
+    Valida la selección y lanza la compilación en un hilo de trabajo para no bloquear la ventana.
+    El hilo informa el avance por progress_queue; poll_progress lo muestra desde el hilo de Tk.
+    """
+    global compile_thread, cancel_event
+    input_value = entry_dir.get()
+    if not input_value:
+        messagebox.showerror("Error", "Por favor, selecciona una carpeta o archivos válidos.")
+        return
+    if selected_mode == "files" and not selected_files:
+        messagebox.showerror("Error", "No hay archivos seleccionados.")
+        return
+    if selected_mode not in ("folder", "files"):
+        messagebox.showerror("Error", "Modo de selección desconocido.")
+        return
+
+    cancel_event = threading.Event()
+    mode, files = selected_mode, list(selected_files)
+
+    def worker():
+        def progress(stage, current, total, detail):
+            progress_queue.put(("progress", stage, current, total, detail))
+        metrics = PipelineMetrics(job=input_value) if METRICS_PATH else None
+        try:
+            with measure_stage(metrics, "total"):
+                output_pdf = compile_to_downloads(mode, input_value, files, progress, cancel_event, metrics)
+        except CompilationCancelled:
+            progress_queue.put(("cancelled",))
+        except Exception as e:
+            progress_queue.put(("error", e))
+        else:
+            progress_queue.put(("done", output_pdf))
+        if metrics is not None:
+            try:
+                write_metrics(metrics.records, METRICS_PATH)
+            except OSError as e:
+                print(f"No se pudieron guardar las métricas en {METRICS_PATH}: {e}")
+
+    btn_compile.config(state=tk.DISABLED)
+    btn_cancel.config(state=tk.NORMAL)
+    progress_bar.config(value=0)
+    status_var.set("Iniciando...")
+    compile_thread = threading.Thread(target=worker, daemon=True)
+    compile_thread.start()
+    root.after(PROGRESS_POLL_MS, poll_progress)
+
+
+def cancel_compilation():
+    """Pide al hilo de trabajo que se detenga; el trabajo en curso se descarta."""
+    if cancel_event is not None:
+        cancel_event.set()
+        btn_cancel.config(state=tk.DISABLED)
+        status_var.set("Cancelando...")
+
+
+def poll_progress():
+    """Procesa los eventos del hilo de trabajo y actualiza la barra de progreso."""
+    finished = None
+    while True:
+        try:
+            event = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+        if event[0] == "progress":
+            _, stage, current, total, detail = event
+            # Cada etapa ocupa un tramo de la barra, en el orden en que se ejecutan
+            progress_bar.config(value=progress_percent(stage, current, total))
+            text = f"{stage.capitalize()} ({current}/{total})"
+            if detail:
+                text += f": {os.path.basename(str(detail))}"
+            status_var.set(text)
+        else:
+            finished = event
+
+    if finished is None:
+        root.after(PROGRESS_POLL_MS, poll_progress)
+        return
+
+    btn_compile.config(state=tk.NORMAL)
+    btn_cancel.config(state=tk.DISABLED)
+    if finished[0] == "done":
+        output_pdf = finished[1]
+        progress_bar.config(value=100)
+        status_var.set("Listo")
+        messagebox.showinfo("Éxito", f"PDF generado:\n{output_pdf}")
+        try:
+            os.startfile(output_pdf)
+        except Exception as e:
+            print(f"No se pudo abrir el archivo: {e}")
+    elif finished[0] == "cancelled":
+        progress_bar.config(value=0)
+        status_var.set("Compilación cancelada")
+    else:
+        status_var.set("Error")
+        messagebox.showerror("Error", f"Ocurrió un error:\n{finished[1]}")
+
+
+def select_directory():
+    """
+    Abre un diálogo para seleccionar una carpeta y actualiza el Entry y modo.
+    """
+    global selected_mode
+    folder_selected = filedialog.askdirectory()
+    if folder_selected:
+        entry_dir.delete(0, tk.END)
+        entry_dir.insert(0, folder_selected)
+        selected_mode = "folder"
+
+
+def run_gui():
+    """Construye la ventana principal y ejecuta el loop de Tk."""
+    global root, entry_dir, btn_compile, btn_cancel, progress_bar, status_var, tk, filedialog, messagebox, ttk
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+
+    root = tk.Tk()
+    root.title("Compilador de PDFs")
+    root.geometry("600x210")
+    root.resizable(False, False)
+
+    lbl = tk.Label(root, text="Selecciona el directorio con archivos a compilar:")
+    lbl.pack(pady=10)
+
+    frame = tk.Frame(root)
+    frame.pack(pady=5, padx=10, fill="x")
+
+    entry_dir = tk.Entry(frame, width=50)
+    entry_dir.pack(side=tk.LEFT, fill="x", expand=True)
+
+    btn_browse_folder = tk.Button(frame, text="Seleccionar Carpeta", command=select_directory)
+    btn_browse_folder.pack(side=tk.LEFT, padx=5)
+
+    btn_browse_files = tk.Button(frame, text="Seleccionar Archivos", command=select_files)
+    btn_browse_files.pack(side=tk.LEFT, padx=5)
+
+    buttons = tk.Frame(root)
+    buttons.pack(pady=10)
+
+    btn_compile = tk.Button(buttons, text="Compilar PDFs", command=run_compilation, width=20)
+    btn_compile.pack(side=tk.LEFT, padx=5)
+
+    btn_cancel = tk.Button(buttons, text="Cancelar", command=cancel_compilation, width=12, state=tk.DISABLED)
+    btn_cancel.pack(side=tk.LEFT, padx=5)
+
+    progress_bar = ttk.Progressbar(root, mode="determinate", maximum=100)
+    progress_bar.pack(padx=10, fill="x")
+
+    status_var = tk.StringVar(value="")
+    tk.Label(root, textvariable=status_var, anchor="w").pack(padx=10, pady=5, fill="x")
+
+    if STARTUP_PROBE:
+        root.after(1, root.destroy)
+    root.mainloop()
+
+
+def parse_size_limit(value):
+    """
+    Tamaño máximo en bytes a partir de un valor en MB (número o texto, con punto o coma
+    decimal), como el de "tamano_maximo" en los trabajos. None si no hay valor.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        megabytes = float(str(value).replace(",", "."))
+    except ValueError:
+        megabytes = 0
+    if not megabytes > 0:
+        raise ValueError(f"Tamaño máximo inválido: {value}")
+    return int(megabytes * 1024 * 1024)
+
+
+def load_manifest(manifest_path):
+    """
+    Lee un manifiesto de trabajos por lotes. Puede ser un archivo de texto con una carpeta
+    por línea, o un JSON con una lista cuyos elementos son una carpeta (texto),
+    {"carpeta": ...} o {"archivos": [...], "salida": ...} (los archivos, como en manifest_file),
+    con "tamano_maximo" (ver compress_to_size) y "volumen_maximo" (ver run_job) opcionales en MB.
+    Devuelve la lista de trabajos como diccionarios.
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    if manifest_path.lower().endswith(".json"):
+        entries = json.loads(content)
+    else:
+        entries = [line.strip() for line in content.splitlines() if line.strip() and not line.startswith("#")]
+
+    jobs = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"carpeta": entry}
+        job = {}
+        if "carpeta" in entry:
+            job["carpeta"] = os.path.join(base_dir, entry["carpeta"])
+        elif "archivos" in entry:
+            job["archivos"] = [manifest_file(item, base_dir) for item in entry["archivos"]]
+        else:
+            raise ValueError(f"Trabajo inválido en el manifiesto: {entry}")
+        if entry.get("salida"):
+            job["salida"] = os.path.join(base_dir, entry["salida"])
+        for key in ("tamano_maximo", "volumen_maximo"):
+            if entry.get(key):
+                parse_size_limit(entry[key])
+                job[key] = entry[key]
+        jobs.append(job)
+    return jobs
+
+
+def manifest_file(entry, base_dir):
+    """
+    Archivo de un manifiesto: una ruta (relativa a base_dir) o un objeto {"archivo": ...,
+    "paginas": "1-3,5", "rotacion": 90}. Devuelve la ruta, o un selection_entry si elige
+    páginas o rota. Lanza ValueError si el elemento no es válido.
+    """
+    if isinstance(entry, str):
+        return os.path.join(base_dir, entry)
+    if not isinstance(entry, dict) or not entry.get("archivo"):
+        raise ValueError(f"Archivo inválido en el manifiesto: {entry}")
+    path = os.path.join(base_dir, entry["archivo"])
+    try:
+        item = selection_entry(path, entry.get("paginas"), entry.get("rotacion"))
+    except ValueError as e:
+        raise ValueError(f"{entry['archivo']}: {e}")
+    return item if item["paginas"] is not None or item["rotacion"] else path
+
+
+def load_selection(manifest_path):
+    """
+    Lee un manifiesto de selección: qué páginas de qué archivos se unen, con qué rotación y en
+    qué orden. Puede ser un JSON con una lista (o {"archivos": [...]}) de elementos como los de
+    manifest_file, o un CSV con encabezado y las columnas archivo, paginas y rotacion (separadas
+    por coma o punto y coma, como las guarda Excel). Las rutas relativas son relativas al
+    manifiesto. Devuelve la lista de archivos para compile_pdfs_from_files.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    if manifest_path.lower().endswith(".csv"):
+        with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            entries = [
+                {
+                    key.strip().lower().replace("á", "a").replace("ó", "o"): (value or "").strip()
+                    for key, value in row.items() if key
+                }
+                for row in csv.DictReader(f, dialect=dialect)
+            ]
+        # Las filas vacías (o sin archivo) se saltan
+        entries = [entry for entry in entries if entry.get("archivo")]
+    else:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries.get("archivos", [])
+    files = [manifest_file(entry, base_dir) for entry in entries]
+    if not files:
+        raise ValueError(f"El manifiesto {manifest_path} no tiene archivos")
+    return files
+
+
+def run_job(job, workers=None, use_cache=True, incremental=False, metrics=None, progress=None, cancel_event=None,
+            executor=None):
+    """
+    Ejecuta un trabajo por lotes (una carpeta o una lista de archivos) y devuelve
+    un diccionario con el resultado, tiempos y tamaños para el resumen, incluidos
+    los totales de cada etapa ("stages", ver PipelineMetrics.totals).
+    metrics: PipelineMetrics donde se agregan los registros de este trabajo.
+    progress / cancel_event: ver report_progress; un trabajo cancelado termina con estado "cancelled".
+    executor: pool de procesos compartido con otros trabajos (ver convert_inputs).
+    El PDF no supera job["tamano_maximo"] MB, si se indica (ver compress_to_size). Con
+    job["volumen_maximo"] (MB) el resultado se reparte en volúmenes de como máximo ese tamaño
+    (ver build_pdf) y "output" es la lista de volúmenes.
+    """
+    start = time.perf_counter()
+    inputs = [job["carpeta"]] if "carpeta" in job else list(dict.fromkeys(map(selection_path, job["archivos"])))
+    label = job.get("carpeta") or job.get("salida") or inputs[0]
+    metrics = metrics.for_job(label) if metrics is not None else PipelineMetrics(label)
+    result = {
+        "input": job.get("carpeta") or job["archivos"],
+        "output": None,
+        "status": "ok",
+        "error": None,
+        "seconds": None,
+        "input_bytes": 0,
+        "output_bytes": None,
+        "pages": None,
+    }
+    try:
+        with metrics.stage("total") as total_record:
+            for path in inputs:
+                if os.path.isdir(path):
+                    # No se cuenta el resultado de una compilación anterior, su registro ni sus volúmenes
+                    previous_outputs = output_file_names(
+                        os.path.join(path, f"{os.path.basename(os.path.normpath(path))}_UNIDO.pdf")
+                    )
+                    result["input_bytes"] += sum(
+                        os.path.getsize(os.path.join(path, filename)) for filename in os.listdir(path)
+                        if os.path.isfile(os.path.join(path, filename)) and filename not in previous_outputs
+                    )
+                else:
+                    result["input_bytes"] += os.path.getsize(path)
+            total_record["bytes_in"] = result["input_bytes"]
+
+            max_bytes = parse_size_limit(job.get("tamano_maximo"))
+            volume_bytes = parse_size_limit(job.get("volumen_maximo"))
+            if "carpeta" in job:
+                output_pdf = compile_pdfs_in_directory(
+                    job["carpeta"], workers=workers, use_cache=use_cache, progress=progress,
+                    cancel_event=cancel_event, incremental=incremental, metrics=metrics,
+                    output_pdf=job.get("salida"), executor=executor, max_bytes=max_bytes, volume_bytes=volume_bytes
+                )
+            else:
+                output_pdf, _ = compile_pdfs_from_files(
+                    job["archivos"], workers=workers, use_cache=use_cache, progress=progress,
+                    cancel_event=cancel_event, metrics=metrics,
+                    output_pdf=job.get("salida") or os.path.abspath("Documentos_UNIDOS.pdf"), executor=executor,
+                    max_bytes=max_bytes, volume_bytes=volume_bytes
+                )
+
+            result["output"] = output_pdf
+            outputs = output_pdf if volume_bytes else [output_pdf]
+            result["output_bytes"] = total_record["bytes_out"] = sum(map(os.path.getsize, outputs))
+            result["pages"] = sum(len(PdfReader(path).pages) for path in outputs)
+    except CompilationCancelled as e:
+        print(f"Trabajo cancelado: {result['input']}")
+        result["status"] = "cancelled"
+        result["error"] = str(e)
+    except Exception as e:
+        print(f"Error en el trabajo {result['input']}: {e}")
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result["stages"] = metrics.totals()
+    return result
+
+
+def run_batch(jobs, max_jobs=2, workers=None, use_cache=True, incremental=False, metrics=None):
+    """
+    Procesa varios trabajos a la vez, como máximo max_jobs simultáneos.
+    Cada trabajo usa además su propio pool de conversión (workers procesos).
+    Devuelve los resultados en el mismo orden que jobs.
+    metrics: PipelineMetrics donde se juntan los registros de todos los trabajos.
+    """
+    max_jobs = max(1, min(max_jobs, len(jobs) or 1))
+    with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        return list(executor.map(
+            lambda job: run_job(
+                job, workers=workers, use_cache=use_cache, incremental=incremental, metrics=metrics
+            ),
+            jobs
+        ))
+
+
+class FolderWatcher:
+    """
+    Vigila las carpetas de casos (subcarpetas directas de root) y recompila cada una con
+    run_job en modo incremental cuando sus archivos dejan de cambiar durante debounce segundos.
+    Revisa las carpetas cada interval segundos comparando nombre, tamaño y fecha de sus
+    archivos, sin dependencias externas ni notificaciones del sistema (que no funcionan bien
+    en carpetas de red). Como máximo max_jobs carpetas se compilan a la vez; las que esperan
+    se ordenan con una cola de prioridad: primero las que todavía no tienen PDF unido y
+    después las que cambiaron hace más tiempo.
+    Si una carpeta cambia mientras se compila, se vuelve a compilar al terminar.
+    metrics_path: archivo donde se agregan las métricas de cada compilación (ver write_metrics).
+    max_size: tamaño máximo de cada PDF en MB (ver compress_to_size).
+    """
+
+    def __init__(self, root, max_jobs=2, workers=None, use_cache=True, debounce=None, interval=None,
+                 metrics_path=None, max_size=None):
+        self.root = root
+        self.max_jobs = max(1, max_jobs)
+        self.workers = workers
+        self.use_cache = use_cache
+        self.debounce = WATCH_DEBOUNCE_SECONDS if debounce is None else debounce
+        self.interval = WATCH_POLL_SECONDS if interval is None else interval
+        self.metrics_path = metrics_path
+        self.max_size = max_size
+        # Por carpeta: última foto de sus archivos, cuándo cambió, desde cuándo espera, y la
+        # foto de la última compilación
+        self._snapshots = {}
+        self._changed_at = {}
+        self._pending_since = {}
+        self._compiled = {}
+        self._running = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_jobs)
+        self.results = []
+
+    @staticmethod
+    def output_names(folder):
+        """Archivos que escribe la compilación de folder, que no cuentan como cambios."""
+        return output_file_names(os.path.join(folder, f"{os.path.basename(os.path.normpath(folder))}_UNIDO.pdf"))
+
+    def snapshot(self, folder):
+        """Nombre, tamaño y fecha de modificación de los archivos de entrada de folder."""
+        excluded = self.output_names(folder)
+        files = {}
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name in excluded or entry.name.endswith(PARTIAL_SUFFIX) or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+        return files
+
+    def _up_to_date(self, folder, files):
+        """Al empezar, una carpeta está al día si su PDF unido es posterior a todos sus archivos."""
+        output_pdf = os.path.join(folder, f"{os.path.basename(os.path.normpath(folder))}_UNIDO.pdf")
+        try:
+            output_mtime = os.stat(output_pdf).st_mtime_ns
+        except OSError:
+            return False
+        return all(mtime <= output_mtime for _, mtime in files.values())
+
+    def poll(self, now=None):
+        """
+        Revisa las carpetas y devuelve la cola de prioridad (lista heapq de tuplas
+        (sin PDF unido, desde cuándo espera, carpeta)) de las que están listas para compilar.
+        """
+        now = time.monotonic() if now is None else now
+        try:
+            folders = sorted(entry.path for entry in os.scandir(self.root) if entry.is_dir())
+        except OSError as e:
+            print(f"No se puede leer {self.root}: {e}")
+            return []
+        for folder in set(self._snapshots) - set(folders):
+            # Carpeta borrada o renombrada
+            for state in (self._snapshots, self._changed_at, self._pending_since, self._compiled):
+                state.pop(folder, None)
+
+        ready = []
+        for folder in folders:
+            files = self.snapshot(folder)
+            if files is None:
+                continue
+            if folder not in self._snapshots:
+                self._snapshots[folder] = files
+                self._changed_at[folder] = now
+                if files and self._up_to_date(folder, files):
+                    self._compiled[folder] = files
+            elif files != self._snapshots[folder]:
+                self._snapshots[folder] = files
+                self._changed_at[folder] = now
+            if not files or files == self._compiled.get(folder):
+                self._pending_since.pop(folder, None)
+                continue
+            pending_since = self._pending_since.setdefault(folder, self._changed_at[folder])
+            if folder in self._running or now - self._changed_at[folder] < self.debounce:
+                continue
+            has_output = os.path.exists(
+                os.path.join(folder, f"{os.path.basename(os.path.normpath(folder))}_UNIDO.pdf")
+            )
+            ready.append((has_output, pending_since, folder))
+        heapq.heapify(ready)
+        return ready
+
+    def _compile(self, folder):
+        metrics = PipelineMetrics()
+        result = run_job(
+            {"carpeta": folder, "tamano_maximo": self.max_size}, workers=self.workers, use_cache=self.use_cache,
+            incremental=True, metrics=metrics
+        )
+        if self.metrics_path:
+            write_metrics(metrics.records, self.metrics_path)
+        return result
+
+    def dispatch(self, ready):
+        """Empieza a compilar las carpetas de la cola de prioridad mientras haya lugar en el pool."""
+        while ready and len(self._running) < self.max_jobs:
+            _, _, folder = heapq.heappop(ready)
+            files = self._snapshots[folder]
+            print(f"Compilando {folder} ({len(files)} archivos)")
+            self._running[folder] = (self._executor.submit(self._compile, folder), files)
+
+    def collect(self):
+        """Registra las compilaciones que terminaron."""
+        for folder, (future, files) in list(self._running.items()):
+            if not future.done():
+                continue
+            del self._running[folder]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"input": folder, "status": "error", "error": str(e)}
+            # Aunque falle no se reintenta hasta que la carpeta vuelva a cambiar
+            self._compiled[folder] = files
+            self.results.append(result)
+            if result["status"] == "ok":
+                print(f"Listo {result['output']} ({result['pages']} páginas, {result['seconds']} s)")
+            else:
+                print(f"Error compilando {folder}: {result['error']}")
+
+    def run(self, stop_event=None):
+        """
+        Vigila hasta que se active stop_event (threading.Event) o se interrumpa con Ctrl+C;
+        al salir espera a que terminen las compilaciones en curso.
+        """
+        stop_event = stop_event or threading.Event()
+        print(f"Vigilando {self.root} (revisión cada {self.interval:g} s, espera de {self.debounce:g} s)")
+        try:
+            while not stop_event.is_set():
+                self.collect()
+                self.dispatch(self.poll())
+                stop_event.wait(self.interval)
+        except KeyboardInterrupt:
+            print("Deteniendo la vigilancia; esperando las compilaciones en curso")
+        finally:
+            self._executor.shutdown(wait=True)
+            self.collect()
+        return self.results
+
+
+class FairJobQueue:
+    """
+    Cola de trabajos con turnos por usuario: el próximo trabajo es el del usuario que hace más
+    tiempo que no recibe uno (primero los que todavía no recibieron ninguno), y entre los de un
+    mismo usuario, el más antiguo. Quien encola muchos trabajos no hace esperar a los demás más
+    de un trabajo suyo por turno.
+    """
+
+    def __init__(self):
+        self._queues = {}
+        self._arrivals = 0
+        # Número de despacho del último trabajo de cada usuario
+        self._last_served = {}
+        self._served = 0
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self._queues.values())
+
+    def __iter__(self):
+        """Trabajos en el orden en que se van a despachar si no llegan otros."""
+        queues = {user: collections.deque(jobs) for user, jobs in self._queues.items()}
+        last_served = dict(self._last_served)
+        for served in itertools.count(self._served):
+            if not queues:
+                return
+            user = self._next_user(queues, last_served)
+            _, job = queues[user].popleft()
+            if not queues[user]:
+                del queues[user]
+            last_served[user] = served
+            yield job
+
+    @staticmethod
+    def _next_user(queues, last_served):
+        return min(queues, key=lambda user: (last_served.get(user, -1), queues[user][0][0]))
+
+    def put(self, user, job):
+        self._queues.setdefault(user, collections.deque()).append((self._arrivals, job))
+        self._arrivals += 1
+
+    def pop(self):
+        """Saca el próximo trabajo."""
+        user = self._next_user(self._queues, self._last_served)
+        _, job = self._queues[user].popleft()
+        if not self._queues[user]:
+            del self._queues[user]
+        self._last_served[user] = self._served
+        self._served += 1
+        return job
+
+    def remove(self, user, job):
+        """Quita un trabajo de la cola; devuelve False si ya no estaba."""
+        jobs = self._queues.get(user, ())
+        for entry in jobs:
+            if entry[1] is job:
+                jobs.remove(entry)
+                if not jobs:
+                    del self._queues[user]
+                return True
+        return False
+
+    def position(self, job):
+        """Cantidad de trabajos que se despachan antes que job (None si no está en la cola)."""
+        for position, queued in enumerate(self):
+            if queued is job:
+                return position
+        return None
+
+
+class RequestError(Exception):
+    """Pedido inválido al servicio; status es el código HTTP de la respuesta."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CompileServer:
+    """
+    Servicio HTTP local que compila para varios usuarios en una sola máquina, en lugar de que
+    cada uno abra el ejecutable y compitan por los núcleos. Usa solo la biblioteca estándar
+    (asyncio). Los trabajos se encolan con turnos por usuario (FairJobQueue) y como máximo
+    max_jobs se compilan a la vez, con run_job en un hilo cada uno; todos convierten en un único
+    pool de workers procesos y comprimen con el intérprete de Ghostscript del proceso, que se
+    cargan al arrancar. Así el rendimiento no depende de cuánta gente esté compilando.
+
+    API (las respuestas son JSON salvo el PDF):
+      POST /trabajos               JSON {"carpeta": ...} o {"archivos": [...]} con rutas de esta
+                                   máquina (ver _check_paths), o multipart/form-data con los
+                                   archivos a unir (en ese
+                                   orden), que se escriben a disco a medida que llegan. El
+                                   tamaño máximo del PDF en MB va en "tamano_maximo" o en el
+                                   encabezado X-Tamano-Maximo (por defecto, el del servicio).
+      GET /trabajos                estado de los trabajos del usuario
+      GET /trabajos/<id>           estado, posición en la cola y avance de un trabajo
+      GET /trabajos/<id>/pdf       espera a que termine y envía el PDF en pedazos
+      DELETE /trabajos/<id>        cancela el trabajo (en cola o compilando)
+      GET /estado                  trabajos en cola y compilando
+    Cada usuario (ver _user) solo ve, descarga y cancela sus propios trabajos; los de otro
+    responden 404, como los que no existen. El resultado de cada trabajo se guarda en una
+    carpeta temporal del servicio durante SERVER_RESULT_TTL_SECONDS; los PDFs de las carpetas
+    compiladas no se escriben en ellas.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, max_jobs=2, workers=None, use_cache=True,
+                 metrics_path=None, max_size=None, root=None):
+        self.host = host
+        self.port = port
+        self.max_jobs = max(1, max_jobs)
+        self.workers = max(1, workers or MAX_WORKERS or os.cpu_count() or 1)
+        self.use_cache = use_cache
+        self.metrics_path = metrics_path
+        self.max_size = max_size
+        # Carpeta bajo la que se aceptan rutas de clientes de la red (ver _check_paths)
+        self.root = os.path.realpath(root) if root else None
+        self.jobs = {}
+        self._queue = FairJobQueue()
+        self._running = 0
+        self._pool = None
+        self._threads = None
+        self._work_dir = None
+
+    def run(self):
+        """Atiende pedidos hasta que se interrumpa con Ctrl+C."""
+        import asyncio
+
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("Servicio detenido")
+
+    async def serve(self):
+        import asyncio
+
+        self._work_dir = tempfile.mkdtemp(prefix="servicio_compilador_")
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._threads = ThreadPoolExecutor(max_workers=self.max_jobs)
+        try:
+            # Se levantan los procesos del pool y Ghostscript antes de aceptar trabajos
+            await asyncio.gather(*[
+                asyncio.wrap_future(self._pool.submit(os.getpid)) for _ in range(self.workers)
+            ])
+            await asyncio.to_thread(self._warm_ghostscript)
+            server = await asyncio.start_server(self._handle, self.host, self.port)
+            print(f"Servicio en http://{self.host}:{self.port} ({self.max_jobs} trabajos simultáneos, "
+                  f"{self.workers} procesos)")
+            async with server:
+                await server.serve_forever()
+        finally:
+            for job in self.jobs.values():
+                job["cancel_event"].set()
+            self._threads.shutdown(wait=True)
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+
+    @staticmethod
+    def _warm_ghostscript():
+        worker = get_ghostscript_worker()
+        if worker is None:
+            return
+        try:
+            worker.warm_up(SERVER_WARM_PDF_SETTING)
+        except Exception as e:
+            print(f"No se pudo inicializar Ghostscript: {e}")
+
+    def submit(self, user, spec, job_dir):
+        """Encola un trabajo de run_job (spec) y devuelve su estado."""
+        import asyncio
+
+        self._expire()
+        job_id = os.path.basename(job_dir)
+        name = os.path.basename(os.path.normpath(spec["carpeta"])) if "carpeta" in spec else "Documentos"
+        job = {
+            "id": job_id,
+            "user": user,
+            "status": "queued",
+            "name": f"{name}_UNIDO.pdf",
+            "spec": dict(
+                {"tamano_maximo": self.max_size}, **spec, salida=os.path.join(job_dir, f"{name}_UNIDO.pdf")
+            ),
+            "dir": job_dir,
+            "created": time.time(),
+            "finished": None,
+            "progress": None,
+            "result": None,
+            "cancel_event": threading.Event(),
+            "done": asyncio.Event(),
+        }
+        self.jobs[job_id] = job
+        self._queue.put(user, job)
+        print(f"Trabajo {job_id} de {user} en cola ({len(self._queue)} esperando)")
+        self._start_jobs()
+        return self.describe(job)
+
+    def cancel(self, job):
+        if job["status"] == "queued" and self._queue.remove(job["user"], job):
+            self._finish(job, "cancelled")
+        job["cancel_event"].set()
+
+    def describe(self, job):
+        """Estado de un trabajo para las respuestas de la API."""
+        description = {
+            "id": job["id"],
+            "user": job["user"],
+            "status": job["status"],
+            "position": self._queue.position(job) if job["status"] == "queued" else None,
+            "progress": None,
+            "pdf": f"/trabajos/{job['id']}/pdf" if job["status"] == "ok" else None,
+        }
+        if job["progress"]:
+            stage, current, total, detail = job["progress"]
+            description["progress"] = {
+                "stage": stage, "current": current, "total": total,
+                "percent": round(progress_percent(stage, current, total), 1), "detail": os.path.basename(str(detail)),
+            }
+        if job["result"]:
+            description.update(
+                {key: job["result"][key] for key in ("error", "seconds", "input_bytes", "output_bytes", "pages")}
+            )
+        return description
+
+    def _start_jobs(self):
+        import asyncio
+
+        while self._queue and self._running < self.max_jobs:
+            job = self._queue.pop()
+            self._running += 1
+            job["status"] = "running"
+            asyncio.get_running_loop().create_task(self._execute(job))
+
+    async def _execute(self, job):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._threads, self._compile, job)
+            if result["status"] == "error":
+                await loop.run_in_executor(self._threads, self._check_pool)
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        finally:
+            self._running -= 1
+        job["result"] = result
+        self._finish(job, result["status"])
+        print(f"Trabajo {job['id']} terminado: {result['status']}")
+        self._start_jobs()
+
+    def _compile(self, job):
+        def progress(stage, current, total, detail):
+            job["progress"] = (stage, current, total, detail)
+
+        metrics = PipelineMetrics()
+        result = run_job(
+            job["spec"], workers=self.workers, use_cache=self.use_cache, metrics=metrics, progress=progress,
+            cancel_event=job["cancel_event"], executor=self._pool
+        )
+        if self.metrics_path:
+            write_metrics(metrics.records, self.metrics_path)
+        return result
+
+    def _check_pool(self):
+        """Si murió un proceso del pool (que queda inutilizable), lo reemplaza por uno nuevo."""
+        try:
+            self._pool.submit(os.getpid).result()
+        except BrokenProcessPool:
+            print("Un proceso de conversión terminó de forma inesperada, se reinicia el pool")
+            self._pool.shutdown(wait=False)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def _finish(self, job, status):
+        job["status"] = status
+        job["finished"] = time.time()
+        job["done"].set()
+
+    def _expire(self):
+        """Descarta los trabajos terminados hace más de SERVER_RESULT_TTL_SECONDS."""
+        limit = time.time() - SERVER_RESULT_TTL_SECONDS
+        for job_id, job in list(self.jobs.items()):
+            if job["finished"] is not None and job["finished"] < limit:
+                shutil.rmtree(job["dir"], ignore_errors=True)
+                del self.jobs[job_id]
+
+    async def _handle(self, reader, writer):
+        """Atiende una conexión: un pedido y su respuesta (sin keep-alive)."""
+        try:
+            method, path, headers = await self._read_request(reader)
+            user = self._user(headers, writer)
+            await self._route(method, path, headers, reader, user, writer)
+        except RequestError as e:
+            await self._respond(writer, e.status, {"error": str(e)})
+        except (ConnectionError, EOFError):
+            pass
+        except Exception as e:
+            print(f"Error atendiendo un pedido: {e}")
+            await self._respond(writer, 500, {"error": str(e)})
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _is_local(writer):
+        """Indica si el pedido viene de esta misma máquina (una dirección de loopback)."""
+        import ipaddress
+
+        address = str(writer.get_extra_info("peername", ("?",))[0])
+        try:
+            return ipaddress.ip_address(address.split("%")[0]).is_loopback
+        except ValueError:
+            return False
+
+    def _user(self, headers, writer):
+        """
+        Usuario del pedido, para los turnos de la cola y para ver sus trabajos: el encabezado
+        X-Usuario si el pedido viene de esta misma máquina, y si no la IP del cliente. X-Usuario
+        lo elige el cliente, así que solo se le cree en la máquina del servicio (donde corre,
+        por ejemplo, el programa que reparte los pedidos); desde la red cualquiera podría
+        mandar el nombre de otro para pasar antes en la cola o ver sus trabajos.
+        """
+        if self._is_local(writer) and headers.get("x-usuario"):
+            return headers["x-usuario"]
+        return str(writer.get_extra_info("peername", ("?",))[0])
+
+    def _check_paths(self, spec, local):
+        """
+        Resuelve las rutas de un trabajo con rutas y verifica que el cliente pueda pedirlas.
+        El PDF que se descarga tiene el contenido de los archivos, así que una ruta cualquiera
+        dejaría leer cualquier archivo al que tiene acceso el servicio: desde esta máquina se
+        acepta cualquier ruta, y desde la red solo las que están dentro de root (relativas a
+        root, o absolutas dentro de ella, sin salir por enlaces simbólicos). Sin root, los
+        clientes de la red solo pueden subir los archivos.
+        """
+        if local:
+            return spec
+        if self.root is None:
+            raise RequestError(403, "Desde otra máquina hay que subir los archivos (multipart/form-data)")
+
+        def resolve(path):
+            resolved = os.path.realpath(os.path.join(self.root, path))
+            if os.path.commonpath([resolved, self.root]) != self.root:
+                raise RequestError(403, f"La ruta {path} está fuera de la carpeta del servicio")
+            return resolved
+
+        if "carpeta" in spec:
+            return {"carpeta": resolve(spec["carpeta"])}
+        return {"archivos": [
+            dict(item, archivo=resolve(item["archivo"])) if isinstance(item, dict) else resolve(item)
+            for item in spec["archivos"]
+        ]}
+
+    async def _read_request(self, reader):
+        """Lee la línea del pedido y los encabezados; el cuerpo queda en reader."""
+        import asyncio
+
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) != 3:
+                raise EOFError()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            if length > SERVER_MAX_UPLOAD_BYTES:
+                raise RequestError(413, f"El pedido supera {SERVER_MAX_UPLOAD_BYTES} bytes")
+        except asyncio.IncompleteReadError:
+            raise EOFError()
+        except ValueError:
+            raise RequestError(400, "Pedido HTTP inválido")
+        method, target, _ = request_line
+        return method.upper(), target.split("?", 1)[0].rstrip("/"), headers
+
+    async def _route(self, method, path, headers, reader, user, writer):
+        parts = path.strip("/").split("/")
+        if parts == ["estado"] and method == "GET":
+            await self._respond(writer, 200, {
+                "queued": len(self._queue), "running": self._running, "max_jobs": self.max_jobs,
+                "workers": self.workers,
+            })
+        elif parts == ["trabajos"] and method == "POST":
+            description = await self._create_job(headers, reader, user, self._is_local(writer))
+            await self._respond(writer, 202, description, {"Location": f"/trabajos/{description['id']}"})
+        elif parts == ["trabajos"] and method == "GET":
+            await self._respond(writer, 200, [
+                self.describe(job) for job in self.jobs.values() if job["user"] == user
+            ])
+        elif len(parts) in (2, 3) and parts[0] == "trabajos":
+            job = self.jobs.get(parts[1])
+            if job is None or job["user"] != user:
+                raise RequestError(404, f"No existe el trabajo {parts[1]}")
+            if len(parts) == 3 and parts[2] == "pdf" and method == "GET":
+                await job["done"].wait()
+                if job["status"] != "ok":
+                    raise RequestError(409, f"El trabajo terminó con estado {job['status']}")
+                await self._send_pdf(writer, job)
+            elif len(parts) == 2 and method == "GET":
+                await self._respond(writer, 200, self.describe(job))
+            elif len(parts) == 2 and method == "DELETE":
+                self.cancel(job)
+                await self._respond(writer, 200, self.describe(job))
+            else:
+                raise RequestError(405, "Método no permitido")
+        else:
+            raise RequestError(404, f"No existe {path}")
+
+    async def _create_job(self, headers, reader, user, local=True):
+        length = int(headers.get("content-length") or 0)
+        job_dir = tempfile.mkdtemp(prefix="", dir=self._work_dir)
+        try:
+            content_type = headers.get("content-type", "")
+            if content_type.startswith("multipart/form-data"):
+                files = await self._receive_uploads(reader, length, content_type, job_dir)
+                if not files:
+                    raise RequestError(400, "El pedido no tiene archivos")
+                spec = {"archivos": files}
+                request = {"tamano_maximo": headers.get("x-tamano-maximo")}
+            else:
+                if length > SERVER_MAX_JSON_BYTES:
+                    raise RequestError(413, f"El pedido JSON supera {SERVER_MAX_JSON_BYTES} bytes")
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    raise RequestError(400, "El cuerpo tiene que ser JSON o multipart/form-data")
+                if isinstance(request, dict) and isinstance(request.get("carpeta"), str):
+                    spec = self._check_paths({"carpeta": request["carpeta"]}, local)
+                    if not os.path.isdir(spec["carpeta"]):
+                        raise RequestError(400, f"No existe la carpeta {request['carpeta']}")
+                elif isinstance(request, dict) and isinstance(request.get("archivos"), list) and request["archivos"]:
+                    try:
+                        spec = {"archivos": [manifest_file(entry, "") for entry in request["archivos"]]}
+                    except ValueError as e:
+                        raise RequestError(400, str(e))
+                    spec = self._check_paths(spec, local)
+                else:
+                    raise RequestError(400, 'Se espera {"carpeta": ...} o {"archivos": [...]}')
+                request.setdefault("tamano_maximo", headers.get("x-tamano-maximo"))
+            try:
+                if parse_size_limit(request["tamano_maximo"]) is not None:
+                    spec["tamano_maximo"] = request["tamano_maximo"]
+            except ValueError as e:
+                raise RequestError(400, str(e))
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        return self.submit(user, spec, job_dir)
+
+    @staticmethod
+    async def _receive_uploads(reader, length, content_type, job_dir):
+        """
+        Guarda en job_dir, numerados en orden, los archivos de un cuerpo multipart/form-data de
+        length bytes a medida que llegan: en memoria queda como mucho un pedazo del cuerpo.
+        """
+        import asyncio
+        from email import policy
+        from email.parser import BytesParser
+
+        boundary = BytesParser(policy=policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n"
+        ).get_boundary()
+        if not boundary:
+            raise RequestError(400, "Cuerpo multipart/form-data inválido")
+        delimiter = b"\r\n--" + boundary.encode("latin-1")
+        # El primer delimitador no lleva el salto de línea delante; se agrega para buscarlos igual
+        buffer = bytearray(b"\r\n")
+        remaining = length
+
+        async def fill():
+            nonlocal remaining
+            if remaining <= 0:
+                raise RequestError(400, "Cuerpo multipart/form-data incompleto")
+            chunk = await reader.read(min(remaining, SERVER_CHUNK_BYTES))
+            if not chunk:
+                raise EOFError()
+            remaining -= len(chunk)
+            buffer.extend(chunk)
+
+        async def copy_part(f):
+            """Pasa a f (o descarta) el contenido de la parte, hasta el próximo delimitador."""
+            while True:
+                index = buffer.find(delimiter)
+                if index >= 0:
+                    break
+                # Se guarda el final por si el delimitador quedó partido entre dos pedazos
+                keep = len(buffer) - len(delimiter) + 1
+                if keep > 0:
+                    if f is not None:
+                        await asyncio.to_thread(f.write, bytes(buffer[:keep]))
+                    del buffer[:keep]
+                await fill()
+            if f is not None:
+                await asyncio.to_thread(f.write, bytes(buffer[:index]))
+            del buffer[:index + len(delimiter)]
+
+        # Lo anterior al primer delimitador (el preámbulo) se descarta
+        await copy_part(None)
+        upload_dir = os.path.join(job_dir, "archivos")
+        os.makedirs(upload_dir)
+        files = []
+        while True:
+            while len(buffer) < 2:
+                await fill()
+            if buffer.startswith(b"--"):
+                return files
+            while True:
+                end = buffer.find(b"\r\n\r\n")
+                if end >= 0:
+                    break
+                if len(buffer) > SERVER_CHUNK_BYTES:
+                    raise RequestError(400, "Cuerpo multipart/form-data inválido")
+                await fill()
+            if not buffer.startswith(b"\r\n"):
+                raise RequestError(400, "Cuerpo multipart/form-data inválido")
+            part = BytesParser(policy=policy.HTTP).parsebytes(bytes(buffer[2:end + 4]))
+            del buffer[:end + 4]
+            filename = part.get_filename()
+            if not filename:
+                await copy_part(None)
+                continue
+            # Los navegadores en Windows pueden mandar la ruta completa
+            name = os.path.basename(filename.replace("\\", "/"))
+            path = os.path.join(upload_dir, f"{len(files):04d}_{name}")
+            with open(path, "wb") as f:
+                await copy_part(f)
+            files.append(path)
+
+    async def _respond(self, writer, status, content, extra_headers=None):
+        from http import HTTPStatus
+
+        body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body))}
+        headers.update(extra_headers or {})
+        writer.write(self._head(status, HTTPStatus(status).phrase, headers) + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _send_pdf(self, writer, job):
+        """Envía el PDF del trabajo de a SERVER_CHUNK_BYTES, sin cargarlo entero en memoria."""
+        import asyncio
+        from urllib.parse import quote
+
+        output_pdf = job["result"]["output"]
+        # El nombre va en ASCII y, completo, codificado en UTF-8 (RFC 6266)
+        ascii_name = job["name"].encode("ascii", "replace").decode("ascii").replace('"', "_")
+        with open(output_pdf, "rb") as f:
+            writer.write(self._head(200, "OK", {
+                "Content-Type": "application/pdf",
+                "Content-Length": str(os.fstat(f.fileno()).st_size),
+                "Content-Disposition": f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(job["name"])}',
+            }))
+            while True:
+                chunk = await asyncio.to_thread(f.read, SERVER_CHUNK_BYTES)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+    @staticmethod
+    def _head(status, reason, headers):
+        lines = [f"HTTP/1.1 {status} {reason}"] + [f"{name}: {value}" for name, value in headers.items()]
+        lines.append("Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def diagnostics_to_stderr():
+    """
+    Redirige la salida estándar a stderr a nivel de descriptor, así que también la de los
+    procesos del pool y la de Ghostscript, y devuelve un archivo abierto sobre la salida
+    estándar original. Sin consola (el ejecutable de la ventana) devuelve sys.stdout.
+    """
+    try:
+        sys.stdout.flush()
+        original = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    except (AttributeError, OSError, ValueError):
+        return sys.stdout
+    if os.name == "nt":
+        # Los procesos hijos y las DLL toman la salida del handle estándar, no del descriptor
+        import msvcrt
+
+        ctypes.windll.kernel32.SetStdHandle(STD_OUTPUT_HANDLE, msvcrt.get_osfhandle(sys.stdout.fileno()))
+    return original
+
+
+def main(argv=None):
+    """
+    Punto de entrada. Sin argumentos abre la ventana; con carpetas o --manifiesto
+    compila por lotes sin interfaz gráfica y escribe un resumen JSON; con --vigilar
+    recompila las carpetas de casos a medida que cambian (ver FolderWatcher); con --servir
+    atiende trabajos de varios usuarios por HTTP (ver CompileServer).
+    """
+    parser = argparse.ArgumentParser(
+        prog="app_compilador",
+        description="Compila los documentos de cada carpeta en un único PDF (sin argumentos abre la ventana)."
+    )
+    parser.add_argument("carpetas", nargs="*", help="carpetas a compilar (se genera <carpeta>_UNIDO.pdf en cada una)")
+    parser.add_argument("--manifiesto", help="archivo con una carpeta por línea, o JSON con la lista de trabajos")
+    parser.add_argument(
+        "--seleccion", metavar="MANIFIESTO",
+        help="JSON o CSV con los archivos a unir, sus páginas y su rotación, en orden (genera <manifiesto>_UNIDO.pdf)"
+    )
+    parser.add_argument("--trabajos", type=int, default=2, help="cantidad de trabajos simultáneos (por defecto 2)")
+    parser.add_argument(
+        "--procesos", type=int,
+        help="procesos de conversión por trabajo, o en total con --servir (por defecto todos los núcleos)"
+    )
+    parser.add_argument("--sin-cache", action="store_true", help="no usar el caché de conversiones")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="actualizar <carpeta>_UNIDO.pdf agregando solo los archivos nuevos o modificados"
+    )
+    parser.add_argument("--resumen", help="ruta del resumen JSON (por defecto se imprime en la salida estándar)")
+    parser.add_argument(
+        "--metricas",
+        help="agrega a este archivo las mediciones de cada etapa y archivo en JSON, una por línea "
+             "(o con extensión .prom, los totales por trabajo y etapa en formato de Prometheus)"
+    )
+    parser.add_argument(
+        "--vigilar", metavar="RAIZ",
+        help="vigilar las subcarpetas de RAIZ y recompilar cada una cuando cambian sus archivos"
+    )
+    parser.add_argument(
+        "--servir", metavar="[HOST:]PUERTO",
+        help=f"atender trabajos por HTTP en esta dirección (por defecto solo esta máquina, {SERVER_HOST})"
+    )
+    parser.add_argument(
+        "--raiz-rutas", metavar="CARPETA",
+        help="con --servir, aceptar rutas de clientes de otras máquinas dentro de CARPETA "
+             "(por defecto solo pueden subir los archivos)"
+    )
+    parser.add_argument(
+        "--tamano-maximo", type=float, metavar="MB",
+        help="comprimir cada PDF lo justo para que no supere este tamaño en MB (en lugar de los umbrales fijos)"
+    )
+    parser.add_argument(
+        "--volumenes", type=float, metavar="MB",
+        help="repartir cada resultado en volúmenes <carpeta>_UNIDO_1.pdf, _2... de como máximo este tamaño en MB"
+    )
+    parser.add_argument(
+        "--espera", type=float, default=WATCH_DEBOUNCE_SECONDS,
+        help=f"segundos sin cambios antes de compilar una carpeta vigilada (por defecto {WATCH_DEBOUNCE_SECONDS:g})"
+    )
+    args = parser.parse_args(argv)
+    if args.tamano_maximo is not None and not args.tamano_maximo > 0:
+        parser.error("--tamano-maximo tiene que ser mayor que cero")
+    if args.volumenes is not None and not args.volumenes > 0:
+        parser.error("--volumenes tiene que ser mayor que cero")
+
+    if args.vigilar:
+        # Los trabajos simultáneos se reparten los núcleos para no saturar la máquina
+        workers = args.procesos or max(1, (os.cpu_count() or 1) // max(1, args.trabajos))
+        watcher = FolderWatcher(
+            args.vigilar, max_jobs=args.trabajos, workers=workers, use_cache=not args.sin_cache,
+            debounce=args.espera, metrics_path=args.metricas, max_size=args.tamano_maximo
+        )
+        watcher.run()
+        return 0
+
+    if args.servir:
+        host, _, port = args.servir.rpartition(":")
+        server = CompileServer(
+            host or SERVER_HOST, int(port), max_jobs=args.trabajos, workers=args.procesos,
+            use_cache=not args.sin_cache, metrics_path=args.metricas, max_size=args.tamano_maximo,
+            root=args.raiz_rutas
+        )
+        server.run()
+        return 0
+
+    if not args.carpetas and not args.manifiesto and not args.seleccion:
+        run_gui()
+        return 0
+
+    # El avance va a stderr, para que en la salida estándar quede solo el resumen
+    summary_output = diagnostics_to_stderr()
+
+    jobs = [{"carpeta": folder} for folder in args.carpetas]
+    if args.manifiesto:
+        jobs.extend(load_manifest(args.manifiesto))
+    if args.seleccion:
+        jobs.append({
+            "archivos": load_selection(args.seleccion),
+            "salida": os.path.splitext(os.path.abspath(args.seleccion))[0] + "_UNIDO.pdf",
+        })
+    for job in jobs:
+        if args.tamano_maximo:
+            job.setdefault("tamano_maximo", args.tamano_maximo)
+        if args.volumenes:
+            job.setdefault("volumen_maximo", args.volumenes)
+
+    start = time.perf_counter()
+    metrics = PipelineMetrics()
+    results = run_batch(
+        jobs, max_jobs=args.trabajos, workers=args.procesos, use_cache=not args.sin_cache,
+        incremental=args.incremental, metrics=metrics
+    )
+    if args.metricas:
+        write_metrics(metrics.records, args.metricas)
+        print(f"Métricas escritas en {args.metricas}")
+    summary = {
+        "jobs": results,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "failed": sum(1 for result in results if result["status"] != "ok"),
+    }
+    summary_text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.resumen:
+        with open(args.resumen, "w", encoding="utf-8") as f:
+            f.write(summary_text)
+        print(f"Resumen escrito en {args.resumen}")
+    else:
+        summary_output.write(summary_text + "\n")
+        summary_output.flush()
+    return 1 if summary["failed"] else 0
 
-btn_compile = tk.Button(root, text="Compilar PDFs", command=run_compilation, width=20)
-btn_compile.pack(pady=15)
 
-root.mainloop()
+if __name__ == "__main__":
+    # Necesario para que el pool de procesos funcione en el ejecutable de PyInstaller;
+    # el guard evita que los procesos hijos vuelvan a crear la ventana al importar el módulo.
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,5 +1,31 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Empaquetado pensado para que la ventana aparezca rápido:
+#   - carpeta (onedir) en lugar de un único .exe: el ejecutable de un solo archivo se
+#     descomprime entero en una carpeta temporal cada vez que se abre;
+#   - sin UPX: descomprimir cada DLL al cargarla cuesta más de lo que se ahorra en disco,
+#     y los antivirus suelen revisar más a fondo los binarios comprimidos con UPX;
+#   - sin los paquetes que la aplicación no usa (FPDF solo lo usan los benchmarks).
+# La carpeta tiene dos ejecutables: app_compilador.exe, sin consola, para la ventana, y
+# app_compilador_cli.exe, con consola, para la línea de comandos (sin consola Windows no
+# muestra nada de lo que se imprime, ni el resumen).
+# Al terminar se mide el arranque del ejecutable con benchmarks/benchmark_arranque.py.
+import os
+import subprocess
+import sys
 
+EXCLUDES = [
+    'fpdf',
+    'numpy',
+    'matplotlib',
+    'IPython',
+    'pytest',
+    'PyQt5',
+    'PySide6',
+    'tkinter.test',
+    'lib2to3',
+    'pydoc_data',
+    'xmlrpc',
+]
 
 a = Analysis(
     ['app_compilador.py'],
@@ -10,7 +36,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=EXCLUDES,
     noarchive=False,
     optimize=0,
 )
@@ -19,16 +45,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='app_compilador',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +59,36 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+exe_cli = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='app_compilador_cli',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    exe_cli,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='app_compilador',
+)
+
+executable = os.path.join(DISTPATH, 'app_compilador', 'app_compilador' + ('.exe' if sys.platform == 'win32' else ''))
+subprocess.run(
+    [sys.executable, os.path.join(SPECPATH, 'benchmarks', 'benchmark_arranque.py'), '--ejecutable', executable],
+    check=False,
+)
@@ -0,0 +1,89 @@
+"""
+Benchmark de arranque: cuánto tarda el compilador en estar listo para usarse.
+
+Mide, cada una en un proceso nuevo:
+  - importar app_compilador con el Python actual (lo que pagan la ventana y la línea de
+    comandos antes de hacer nada);
+  - abrir la ventana desde el script y cerrarla apenas se dibuja (COMPILADOR_MEDIR_ARRANQUE);
+  - con --ejecutable, lo mismo con el ejecutable de PyInstaller, más "--help", que no
+    crea la ventana.
+
+La primera repetición se informa aparte ("en frío": el sistema todavía no tiene los
+archivos en caché, y el antivirus de Windows revisa el ejecutable) y del resto se informa
+la mediana. app_compilador.spec corre este script al terminar de empaquetar.
+
+Uso:
+    python benchmarks/benchmark_arranque.py [--repeticiones 5] [--ejecutable dist/app_compilador/app_compilador.exe]
+        [--sin-ventana]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPO_DIR, "app_compilador.py")
+# Si la ventana no se cierra sola en este tiempo, la medición se descarta
+WINDOW_TIMEOUT_SECONDS = 60
+
+
+def timed_run(command, env=None):
+    """Segundos que tarda command en terminar, o None si falla."""
+    start = time.perf_counter()
+    try:
+        subprocess.run(
+            command, env=env, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+            timeout=WINDOW_TIMEOUT_SECONDS
+        )
+    except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return None
+    return time.perf_counter() - start
+
+
+def has_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def measurements(args):
+    """Lista de (nombre, comando, entorno) a medir."""
+    probe_env = dict(os.environ, COMPILADOR_MEDIR_ARRANQUE="1")
+    result = [("importar", [sys.executable, "-c", "import app_compilador"], None)]
+    window = not args.sin_ventana and has_display()
+    if window:
+        result.append(("ventana (script)", [sys.executable, SCRIPT], probe_env))
+    if args.ejecutable:
+        result.append(("--help (ejecutable)", [args.ejecutable, "--help"], None))
+        if window:
+            result.append(("ventana (ejecutable)", [args.ejecutable], probe_env))
+    if not window:
+        print("Sin pantalla disponible: no se mide la ventana")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--ejecutable", help="ejecutable generado por PyInstaller")
+    parser.add_argument("--sin-ventana", action="store_true", help="no abrir la ventana")
+    args = parser.parse_args()
+    if args.ejecutable and not os.path.exists(args.ejecutable):
+        parser.error(f"No existe el ejecutable {args.ejecutable}")
+
+    failed = False
+    selected = measurements(args)
+    print(f"{'medición':<22} {'ms en frío':>10} {'ms mediana':>10}")
+    for name, command, env in selected:
+        runs = [timed_run(command, env) for _ in range(max(1, args.repeticiones))]
+        if None in runs:
+            print(f"{name:<22} {'falló':>10}")
+            failed = True
+            continue
+        warm = runs[1:] or runs
+        print(f"{name:<22} {runs[0] * 1000:>10.0f} {statistics.median(warm) * 1000:>10.0f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
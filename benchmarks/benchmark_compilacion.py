@@ -0,0 +1,251 @@
+"""
+Benchmark de punta a punta: compila un corpus sintético (ver corpus.py) con
+compile_pdfs_in_directory ("carpeta") y compile_pdfs_from_files ("archivos") y mide
+tiempo total, rendimiento (MB, archivos y páginas por segundo), tiempos por etapa,
+percentiles de latencia por archivo, memoria pico y tamaño del PDF final.
+
+Cada repetición corre en un proceso nuevo y sin caché de conversiones. Las etapas se
+miden con PipelineMetrics, así que incluyen la conversión en el pool, la unión, la
+optimización sin pérdida y Ghostscript. El resultado se puede guardar en JSON (con el commit, la máquina y la
+firma del corpus) y comparar con el de otro commit para detectar regresiones.
+
+Uso:
+    python benchmarks/benchmark_compilacion.py [--perfil chico|mediano|grande] [--repeticiones 3]
+        [--procesos N] [--modos carpeta,archivos] [--corpus DIR] [--salida resultado.json]
+        [--comparar anterior.json] [--tolerancia 10]
+
+Con --comparar, el proceso termina con código 1 si alguna medición empeoró más que la
+tolerancia (en %), para usarlo en integración continua.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader  # noqa: E402
+
+import app_compilador  # noqa: E402
+from comun import megabytes, run_isolated  # noqa: E402
+from corpus import PROFILES, make_corpus  # noqa: E402
+
+RESULTS_VERSION = 1
+STAGES = ["analizando", "convirtiendo", "uniendo", "optimizando", "comprimiendo"]
+# Mediciones que se comparan entre commits (en todas, menos es mejor)
+COMPARED = ["seconds_p50", "peak_rss_bytes", "output_bytes"] + [f"{stage}_seconds" for stage in STAGES]
+
+
+def percentile(values, fraction):
+    """Percentil por rango más cercano; None si no hay valores."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))]
+
+
+def compile_once(mode, corpus_dir, workers):
+    """Una compilación completa en el modo indicado; devuelve tiempos, tamaños y registros."""
+    metrics = app_compilador.PipelineMetrics(mode)
+    with metrics.stage("total") as total_record:
+        if mode == "carpeta":
+            output_pdf = app_compilador.compile_pdfs_in_directory(corpus_dir, workers=workers, use_cache=False,
+                                                                  metrics=metrics)
+            temp_dir = None
+        else:
+            files = [os.path.join(corpus_dir, filename) for filename in sorted(os.listdir(corpus_dir))]
+            output_pdf, temp_dir = app_compilador.compile_pdfs_from_files(files, workers=workers, use_cache=False,
+                                                                          metrics=metrics)
+    try:
+        output_bytes = os.path.getsize(output_pdf)
+        pages = len(PdfReader(output_pdf).pages)
+    finally:
+        os.remove(output_pdf)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return {
+        "total_seconds": total_record["wall_seconds"],
+        "output_bytes": output_bytes,
+        "pages": pages,
+        "records": metrics.records,
+    }
+
+
+def summarize(runs, corpus):
+    """Resume las repeticiones de un modo."""
+    totals = [run["total_seconds"] for run in runs]
+    median = percentile(totals, 0.5)
+    records = [record for run in runs for record in run["records"]]
+    # Memoria pico: la del proceso principal o la del proceso de conversión que más usó
+    peaks = [run["peak_rss"] or 0 for run in runs] + [record["peak_rss_bytes"] or 0 for record in records]
+    summary = {
+        "runs": len(runs),
+        "seconds_p50": median,
+        "seconds_p90": percentile(totals, 0.9),
+        "seconds_min": min(totals),
+        "mb_per_second": round(corpus["bytes"] / (1024 * 1024) / median, 3),
+        "files_per_second": round(corpus["files"] / median, 3),
+        "pages_per_second": round(runs[0]["pages"] / median, 3),
+        "pages": runs[0]["pages"],
+        "peak_rss_bytes": max(peaks) or None,
+        "output_bytes": runs[0]["output_bytes"],
+    }
+    for stage in STAGES:
+        stage_records = [record for record in records if record["stage"] == stage and record["status"] != "cache_miss"]
+        # Tiempo de la etapa en cada repetición (la mediana entre repeticiones)
+        per_run = [
+            sum(record["wall_seconds"] for record in run["records"] if record["stage"] == stage) for run in runs
+        ]
+        latencies = [record["wall_seconds"] for record in stage_records if record["file"] is not None]
+        summary[f"{stage}_seconds"] = round(percentile(per_run, 0.5), 6)
+        summary[f"{stage}_latency_p50"] = percentile(latencies, 0.5)
+        summary[f"{stage}_latency_p90"] = percentile(latencies, 0.9)
+        summary[f"{stage}_latency_p99"] = percentile(latencies, 0.99)
+    # Los archivos más lentos de convertir, para saber cuáles dominan
+    slowest = {}
+    for record in records:
+        if record["stage"] == "convirtiendo" and record["file"] is not None:
+            slowest[record["file"]] = max(slowest.get(record["file"], 0), record["wall_seconds"])
+    summary["slowest_conversions"] = [
+        {"file": os.path.basename(path), "seconds": seconds}
+        for path, seconds in sorted(slowest.items(), key=lambda item: -item[1])[:5]
+    ]
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Imprime la diferencia con otro resultado y devuelve la lista de regresiones."""
+    if baseline["corpus"]["signature"] != results["corpus"]["signature"]:
+        print("Atención: el corpus de la comparación es distinto, las cifras no son comparables")
+    if baseline.get("workers") != results.get("workers"):
+        print("Atención: la comparación usó otra cantidad de procesos")
+    print(f"\nComparación con {baseline.get('commit')} (tolerancia {tolerance:g}%)")
+    regressions = []
+    for mode, summary in results["modes"].items():
+        previous = baseline["modes"].get(mode)
+        if not previous:
+            continue
+        for key in COMPARED:
+            before, after = previous.get(key), summary.get(key)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            flag = "  REGRESIÓN" if change > tolerance else ""
+            print(f"  {mode:<9} {key:<24} {before:>14.6g} -> {after:<14.6g} {change:+7.1f}%{flag}")
+            if flag:
+                regressions.append((mode, key, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--perfil", choices=sorted(PROFILES), default="chico")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--paginas-pdf", type=int, default=5, help="páginas promedio de cada PDF")
+    parser.add_argument("--dpi-escaneos", type=int, default=200)
+    parser.add_argument("--kb-txt", type=int, default=50, help="tamaño promedio de cada TXT")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--procesos", type=int, help="procesos de conversión (por defecto todos los núcleos)")
+    parser.add_argument("--modos", default="carpeta,archivos")
+    parser.add_argument("--corpus", help="carpeta donde generar el corpus (se reutiliza si ya existe)")
+    parser.add_argument("--salida", help="guardar los resultados en este JSON")
+    parser.add_argument("--comparar", help="JSON de una medición anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=10.0, help="empeoramiento tolerado en %% (por defecto 10)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = args.corpus or os.path.join(temp_dir, "corpus")
+        # La descripción se guarda al lado del corpus: adentro se compilaría como una entrada más
+        description_path = os.path.join(corpus_dir, "..", os.path.basename(corpus_dir) + "_corpus.json")
+        requested = {
+            "profile": args.perfil, "seed": args.semilla, "pdf_pages": args.paginas_pdf,
+            "scan_dpi": args.dpi_escaneos, "txt_kilobytes": args.kb_txt,
+        }
+        corpus = None
+        if args.corpus and os.path.isdir(corpus_dir) and os.path.exists(description_path):
+            with open(description_path, encoding="utf-8") as f:
+                corpus = json.load(f)
+            if any(corpus["parameters"].get(key) != value for key, value in requested.items()):
+                print(f"El corpus de {corpus_dir} se generó con otros parámetros, se vuelve a generar")
+                shutil.rmtree(corpus_dir)
+                corpus = None
+            else:
+                print(f"Reutilizando el corpus de {corpus_dir}")
+        if corpus is None:
+            corpus = make_corpus(
+                corpus_dir, args.perfil, args.semilla, pdf_pages=args.paginas_pdf, scan_dpi=args.dpi_escaneos,
+                txt_kilobytes=args.kb_txt
+            )
+            if args.corpus:
+                with open(description_path, "w", encoding="utf-8") as f:
+                    json.dump(corpus, f, indent=2)
+        kinds = ", ".join(f"{kind} {entry['files']}" for kind, entry in corpus["by_kind"].items())
+        print(f"Corpus {corpus['signature']}: {corpus['files']} archivos, {megabytes(corpus['bytes'])} MB ({kinds})")
+
+        results = {
+            "version": RESULTS_VERSION,
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workers": args.procesos,
+            "corpus": corpus,
+            "modes": {},
+        }
+        print(
+            f"{'modo':<9} {'seg p50':>8} {'seg p90':>8} {'MB/seg':>7} {'pág/seg':>8} {'MB pico':>8} "
+            f"{'KB PDF':>8}  {'convertir':>9} {'unir':>6} {'optimizar':>9} {'comprimir':>9}"
+        )
+        for mode in args.modos.split(","):
+            runs = []
+            for _ in range(args.repeticiones):
+                run = run_isolated(compile_once, mode, corpus_dir, args.procesos)
+                runs.append(run)
+            summary = summarize(runs, corpus)
+            results["modes"][mode] = summary
+            print(
+                f"{mode:<9} {summary['seconds_p50']:>8.2f} {summary['seconds_p90']:>8.2f} "
+                f"{summary['mb_per_second']:>7.1f} {summary['pages_per_second']:>8.1f} "
+                f"{megabytes(summary['peak_rss_bytes']):>8} {summary['output_bytes'] // 1024:>8}  "
+                f"{summary['convirtiendo_seconds']:>9.2f} {summary['uniendo_seconds']:>6.2f} "
+                f"{summary['optimizando_seconds']:>9.2f} {summary['comprimiendo_seconds']:>9.2f}"
+            )
+        for mode, summary in results["modes"].items():
+            print(f"\nLatencia por archivo ({mode}), seg p50 / p90 / p99:")
+            for stage in ("convirtiendo", "uniendo"):
+                values = [summary[f"{stage}_latency_{p}"] for p in ("p50", "p90", "p99")]
+                print(f"  {stage:<13} " + " / ".join(f"{value:.4f}" if value is not None else "-" for value in values))
+            print("  más lentos: " + ", ".join(
+                f"{entry['file']} ({entry['seconds']:.2f})" for entry in summary["slowest_conversions"]
+            ))
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerancia):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Benchmark de docx_to_pdf: páginas por segundo y memoria pico sobre una tanda de formularios.
+
+Genera formularios DOCX sintéticos (encabezado, logo, párrafos y una tabla) y los convierte
+todos en un mismo proceso, como lo hace cada proceso del pool de conversión. Compara la
+conversión anterior (FPDF, solo el texto de los párrafos) con docx_to_pdf. Cada medición
+corre en un proceso nuevo.
+
+Uso:
+    python benchmarks/benchmark_docx.py [--formularios 200] [--repeticiones 3] [--sin-anterior]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document  # noqa: E402
+from docx.shared import Mm  # noqa: E402
+from fpdf import FPDF  # noqa: E402
+from PIL import Image  # noqa: E402
+from PyPDF2 import PdfReader  # noqa: E402
+
+import app_compilador  # noqa: E402
+from comun import megabytes, run_isolated  # noqa: E402
+
+WORDS = ["solicitud", "expediente", "número", "trámite", "señor", "dirección", "fecha", "firma", "área", "de"]
+
+
+def previous_docx_to_pdf(docx_path, pdf_path):
+    """La conversión anterior: un multi_cell de FPDF por párrafo, sin tablas, imágenes ni encabezado."""
+    doc = Document(docx_path)
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("Arial", size=12)
+    for para in doc.paragraphs:
+        pdf.multi_cell(0, 10, para.text)
+    pdf.output(pdf_path)
+
+
+def make_forms(folder, count):
+    """Formularios con el mismo logo y encabezado, y texto y tablas distintos en cada uno."""
+    rng = random.Random(0)
+    logo_path = os.path.join(folder, "logo.png")
+    Image.new("RGBA", (400, 160), (30, 60, 120, 200)).save(logo_path)
+    paths = []
+    for number in range(count):
+        doc = Document()
+        header = doc.sections[0].header
+        header.is_linked_to_previous = False
+        header.paragraphs[0].text = f"Mesa de entradas - Formulario {number}"
+        doc.add_picture(logo_path, width=Mm(50))
+        for _ in range(rng.randint(5, 25)):
+            doc.add_paragraph(" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 80))))
+        table = doc.add_table(rows=rng.randint(5, 30), cols=4)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8)))
+        path = os.path.join(folder, f"formulario_{number:04d}.docx")
+        doc.save(path)
+        paths.append(path)
+    return paths
+
+
+def convert(function_name, docx_paths):
+    function = previous_docx_to_pdf if function_name == "anterior" else app_compilador.docx_to_pdf
+    pages = 0
+    output_bytes = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for index, docx_path in enumerate(docx_paths):
+            pdf_path = os.path.join(temp_dir, f"{index}.pdf")
+            function(docx_path, pdf_path)
+            pages += len(PdfReader(pdf_path).pages)
+            output_bytes += os.path.getsize(pdf_path)
+    return {"pages": pages, "output_bytes": output_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formularios", type=int, default=200)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sin-anterior", action="store_true", help="medir solo la conversión actual")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        docx_paths = make_forms(folder, args.formularios)
+        print(f"{args.formularios} formularios")
+        print(
+            f"{'conversión':<10} {'seg':>7} {'páginas':>8} {'pág/seg':>8} "
+            f"{'MB pico':>8} {'MB extra':>9} {'KB PDF':>8}"
+        )
+        names = ["actual"] if args.sin_anterior else ["anterior", "actual"]
+        for function_name in names:
+            runs = [run_isolated(convert, function_name, docx_paths) for _ in range(args.repeticiones)]
+            best = min(runs, key=lambda run: run["seconds"])
+            peak = max((run["peak_rss"] or 0) for run in runs) or None
+            extra = max((run["extra_rss"] or 0) for run in runs) or None
+            # El tiempo incluye contar las páginas con PyPDF2, igual para las dos conversiones
+            print(
+                f"{function_name:<10} {best['seconds']:>7.2f} {best['pages']:>8} "
+                f"{best['pages'] / best['seconds']:>8.1f} {megabytes(peak):>8} {megabytes(extra):>9} "
+                f"{best['output_bytes'] // 1024:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark de image_to_pdf: tiempo y memoria pico por imagen.
+
+Compara la conversión anterior (decodificar la imagen completa y guardarla con Pillow)
+con image_to_pdf sobre escaneos sintéticos grandes. Cada medición corre en un proceso
+nuevo para que la memoria pico de una no afecte a la siguiente.
+
+Uso:
+    python benchmarks/benchmark_imagenes.py [--repeticiones 3] [--carpeta DIR]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+import app_compilador  # noqa: E402
+from comun import megabytes, run_isolated  # noqa: E402
+
+# Escaneos sintéticos: nombre, tamaño en píxeles y formato
+SCANS = [
+    ("a4_600dpi.jpg", (4960, 7016), "JPEG"),
+    ("a3_600dpi.jpg", (7016, 9921), "JPEG"),
+    ("a4_300dpi.png", (2480, 3508), "PNG"),
+]
+OPTIONS = {
+    "none": app_compilador.IMAGE_OPTIONS["none"],
+    "screen": app_compilador.IMAGE_OPTIONS["screen"],
+}
+
+
+def previous_image_to_pdf(image_path, pdf_path, max_dpi=None, quality=None):
+    """La conversión anterior: decodifica la imagen completa y la guarda con Pillow."""
+    image = Image.open(image_path)
+    if image.mode == "RGBA":
+        image = image.convert("RGB")
+    resolution = app_compilador.IMAGE_DPI
+    if max_dpi and max_dpi < resolution:
+        size = (
+            max(1, round(image.width * max_dpi / resolution)),
+            max(1, round(image.height * max_dpi / resolution)),
+        )
+        image = image.resize(size, Image.LANCZOS)
+        resolution = float(max_dpi)
+    save_options = {"resolution": resolution}
+    if quality:
+        save_options["quality"] = quality
+    image.save(pdf_path, "PDF", **save_options)
+
+
+def make_scan(path, size, image_format):
+    """Genera una imagen con degradé y ruido, que se comprime como un escaneo real."""
+    width, height = size
+    gray = Image.radial_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    image = Image.merge("RGB", (gray, noise, Image.linear_gradient("L").resize(size)))
+    if image_format == "JPEG":
+        image.save(path, "JPEG", quality=90)
+    else:
+        image.save(path, "PNG")
+
+
+def convert(function_name, image_path, options):
+    """Convierte una imagen (en el proceso de la medición) y devuelve el tamaño del PDF."""
+    function = previous_image_to_pdf if function_name == "anterior" else app_compilador.image_to_pdf
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "salida.pdf")
+        function(image_path, pdf_path, **options)
+        return {"output_bytes": os.path.getsize(pdf_path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--carpeta", help="carpeta para las imágenes sintéticas (por defecto una temporal)")
+    args = parser.parse_args()
+
+    folder = args.carpeta or tempfile.mkdtemp(prefix="benchmark_imagenes_")
+    os.makedirs(folder, exist_ok=True)
+    print(f"{'imagen':<16} {'opciones':<8} {'conversión':<10} {'seg':>7} {'MB pico':>8} {'MB extra':>9} {'KB PDF':>8}")
+    for name, size, image_format in SCANS:
+        image_path = os.path.join(folder, name)
+        if not os.path.exists(image_path):
+            make_scan(image_path, size, image_format)
+        for option_name, options in OPTIONS.items():
+            for function_name in ("anterior", "actual"):
+                runs = [run_isolated(convert, function_name, image_path, options) for _ in range(args.repeticiones)]
+                best = min(runs, key=lambda run: run["seconds"])
+                peak = max((run["peak_rss"] or 0) for run in runs) or None
+                extra = max((run["extra_rss"] or 0) for run in runs) or None
+                print(
+                    f"{name:<16} {option_name:<8} {function_name:<10} {best['seconds']:>7.2f} "
+                    f"{megabytes(peak):>8} {megabytes(extra):>9} {best['output_bytes'] // 1024:>8}"
+                )
+
+
+if __name__ == "__main__":
+    main()
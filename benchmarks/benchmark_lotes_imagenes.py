@@ -0,0 +1,78 @@
+"""
+Benchmark de la conversión por lotes de imágenes consecutivas.
+
+Compila una carpeta sintética de fotos con compile_pdfs_in_directory convirtiendo cada
+imagen a su propio PDF (IMAGE_BATCH_SIZE = 1, como antes) y por lotes, y compara
+el tiempo total y el tamaño del PDF final. No usa el caché.
+
+Uso:
+    python benchmarks/benchmark_lotes_imagenes.py [--fotos 500] [--ancho 320] [--procesos N] [--repeticiones 3]
+
+Con fotos chicas el plan no reduce las imágenes y domina el costo fijo por archivo;
+con fotos grandes (--ancho 1600) domina la recompresión de cada imagen.
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+import app_compilador  # noqa: E402
+
+
+def make_photos(folder, count, size):
+    """Fotos con ruido (la mitad JPEG, la mitad PNG) con nombres ordenados."""
+    base = Image.merge("RGB", (
+        Image.radial_gradient("L").resize(size),
+        Image.effect_noise(size, 30),
+        Image.linear_gradient("L").resize(size),
+    ))
+    for index in range(count):
+        image = base.rotate(index % 360)
+        if index % 2:
+            image.save(os.path.join(folder, f"foto_{index:05d}.jpg"), "JPEG", quality=85)
+        else:
+            image.save(os.path.join(folder, f"foto_{index:05d}.png"), "PNG")
+
+
+def compile_once(source, batch_size, workers):
+    """Compila una copia de la carpeta y devuelve (segundos, bytes del PDF final)."""
+    app_compilador.IMAGE_BATCH_SIZE = batch_size
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = os.path.join(temp_dir, "fotos")
+        shutil.copytree(source, folder)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            output_pdf = app_compilador.compile_pdfs_in_directory(folder, workers=workers, use_cache=False)
+        seconds = time.perf_counter() - start
+        return seconds, os.path.getsize(output_pdf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fotos", type=int, default=500)
+    parser.add_argument("--ancho", type=int, default=320, help="ancho en píxeles de cada foto (alto = 3/4)")
+    parser.add_argument("--procesos", type=int, help="procesos de conversión (por defecto todos los núcleos)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as source:
+        make_photos(source, args.fotos, (args.ancho, args.ancho * 3 // 4))
+        batched = app_compilador.IMAGE_BATCH_SIZE
+        print(f"{args.fotos} fotos de {args.ancho} px de ancho")
+        print(f"{'modo':<12} {'seg (mejor)':>12} {'seg (mediana)':>14} {'KB PDF':>9}")
+        for name, batch_size in (("de a una", 1), ("por lotes", batched)):
+            runs = [compile_once(source, batch_size, args.procesos) for _ in range(args.repeticiones)]
+            times = sorted(seconds for seconds, _ in runs)
+            print(f"{name:<12} {times[0]:>12.2f} {times[len(times) // 2]:>14.2f} {runs[0][1] // 1024:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark de la optimización sin pérdida (optimize_pdf) por tipo de entrada.
+
+Para cada tipo del corpus sintético (ver corpus.py) se genera una carpeta solo con ese
+tipo y se compila con compile_pdfs_in_directory dos veces, sin y con OPTIMIZE_PDF. Se
+informa el tamaño de lo unido y de lo optimizado, lo que tardó optimizar, si hizo falta
+Ghostscript, y el tamaño final y el tiempo total de cada compilación.
+
+Cada compilación corre en un proceso nuevo y sin caché de conversiones.
+
+Uso:
+    python benchmarks/benchmark_optimizacion.py [--perfil chico|mediano|grande] [--repeticiones 1]
+        [--procesos N] [--tipos pdfs,escaneos,docx,txt]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_compilador  # noqa: E402
+from comun import run_isolated  # noqa: E402
+from corpus import PROFILES, make_corpus  # noqa: E402
+
+KINDS = ["pdfs", "escaneos", "docx", "txt"]
+
+
+def compile_once(corpus_dir, optimize, workers):
+    """Compila corpus_dir con o sin optimización; devuelve tamaños y tiempos por etapa."""
+    app_compilador.OPTIMIZE_PDF = optimize
+    metrics = app_compilador.PipelineMetrics()
+    with metrics.stage("total") as total_record:
+        output_pdf = app_compilador.compile_pdfs_in_directory(corpus_dir, workers=workers, use_cache=False,
+                                                              metrics=metrics)
+    try:
+        output_bytes = os.path.getsize(output_pdf)
+    finally:
+        os.remove(output_pdf)
+    totals = metrics.totals()
+    optimized = totals.get("optimizando", {})
+    return {
+        "total_seconds": total_record["wall_seconds"],
+        "output_bytes": output_bytes,
+        "merged_bytes": optimized.get("bytes_in"),
+        "optimized_bytes": optimized.get("bytes_out"),
+        "optimize_seconds": optimized.get("wall_seconds", 0),
+        "compress_seconds": totals.get("comprimiendo", {}).get("wall_seconds", 0),
+        "ghostscript": "comprimiendo" in totals,
+    }
+
+
+def kilobytes(value):
+    return "-" if value is None else f"{value // 1024}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--perfil", choices=sorted(PROFILES), default="chico")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--procesos", type=int, help="procesos de conversión (por defecto todos los núcleos)")
+    parser.add_argument("--tipos", default=",".join(KINDS), help=f"tipos de entrada a medir ({', '.join(KINDS)})")
+    args = parser.parse_args()
+    kinds = args.tipos.split(",")
+    if set(kinds) - set(KINDS):
+        parser.error(f"Tipos desconocidos: {', '.join(sorted(set(kinds) - set(KINDS)))}")
+
+    print(
+        f"{'tipo':<9} {'optimizar':<9} {'KB unido':>9} {'KB optim.':>9} {'seg optim.':>10} "
+        f"{'Ghostscript':>11} {'KB final':>9} {'seg total':>9}"
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for kind in kinds:
+            corpus_dir = os.path.join(temp_dir, kind)
+            make_corpus(corpus_dir, args.perfil, args.semilla, counts={
+                other: count if other == kind else 0 for other, count in PROFILES[args.perfil].items()
+            })
+            for optimize in (False, True):
+                runs = [
+                    run_isolated(compile_once, corpus_dir, optimize, args.procesos)
+                    for _ in range(max(1, args.repeticiones))
+                ]
+                run = runs[0]
+                print(
+                    f"{kind:<9} {'sí' if optimize else 'no':<9} {kilobytes(run['merged_bytes']):>9} "
+                    f"{kilobytes(run['optimized_bytes']):>9} "
+                    f"{statistics.median(r['optimize_seconds'] for r in runs):>10.3f} "
+                    f"{'sí' if run['ghostscript'] else 'no':>11} {kilobytes(run['output_bytes']):>9} "
+                    f"{statistics.median(r['total_seconds'] for r in runs):>9.2f}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Benchmark de txt_to_pdf: líneas por segundo y memoria pico.
+
+Compara la conversión anterior (FPDF.multi_cell por línea, con todo el documento en
+memoria) con txt_to_pdf sobre archivos de texto sintéticos tipo log de varios tamaños, e
+informa cuántas veces más rápida es la actual en cada uno: FPDF se vuelve más lento por
+línea a medida que crece el documento, así que la diferencia depende del tamaño. Cada
+medición corre en un proceso nuevo.
+
+Uso:
+    python benchmarks/benchmark_texto.py [--megabytes 1 2 5] [--repeticiones 3] [--sin-anterior]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fpdf import FPDF  # noqa: E402
+
+import app_compilador  # noqa: E402
+from comun import megabytes, run_isolated  # noqa: E402
+
+WORDS = ["INFO", "WARN", "ERROR", "usuario", "expediente", "conexión", "(id=42)", "tiempo", "ms", "ok"]
+
+
+def previous_txt_to_pdf(text_path, pdf_path):
+    """La conversión anterior: un multi_cell de FPDF por línea."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("Arial", size=12)
+    with open(text_path, "r", encoding="utf-8") as f:
+        for line in f:
+            pdf.multi_cell(0, 10, line)
+    pdf.output(pdf_path)
+
+
+def make_log(path, size_bytes):
+    """Líneas tipo log de largo variable: la mayoría entran en un renglón, algunas ocupan varios."""
+    rng = random.Random(0)
+    written = 0
+    lines = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < size_bytes:
+            count = rng.choice([3, 6, 10, 14, 40])
+            line = f"2024-01-01 12:00:{lines % 60:02d} " + " ".join(rng.choice(WORDS) for _ in range(count)) + "\n"
+            f.write(line)
+            written += len(line.encode("utf-8"))
+            lines += 1
+    return lines
+
+
+def convert(function_name, text_path):
+    function = previous_txt_to_pdf if function_name == "anterior" else app_compilador.txt_to_pdf
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "salida.pdf")
+        function(text_path, pdf_path)
+        return {"output_bytes": os.path.getsize(pdf_path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 2, 5])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sin-anterior", action="store_true", help="medir solo la conversión actual")
+    args = parser.parse_args()
+
+    names = ["actual"] if args.sin_anterior else ["anterior", "actual"]
+    print(f"{'MB':>4} {'líneas':>7} {'conversión':<10} {'seg':>7} {'líneas/seg':>11} {'MB pico':>8} {'MB extra':>9} "
+          f"{'KB PDF':>8} {'veces':>6}")
+    for size in args.megabytes:
+        with tempfile.TemporaryDirectory() as folder:
+            text_path = os.path.join(folder, "log.txt")
+            lines = make_log(text_path, int(size * 1024 * 1024))
+            seconds = {}
+            for function_name in names:
+                runs = [run_isolated(convert, function_name, text_path) for _ in range(args.repeticiones)]
+                best = min(runs, key=lambda run: run["seconds"])
+                seconds[function_name] = best["seconds"]
+                peak = max((run["peak_rss"] or 0) for run in runs) or None
+                extra = max((run["extra_rss"] or 0) for run in runs) or None
+                # Cuántas veces más rápida que la conversión anterior
+                ratio = f"{seconds['anterior'] / best['seconds']:.1f}" if "anterior" in seconds else "-"
+                print(
+                    f"{size:>4g} {lines:>7} {function_name:<10} {best['seconds']:>7.2f} {lines / best['seconds']:>11.0f} "
+                    f"{megabytes(peak):>8} {megabytes(extra):>9} {best['output_bytes'] // 1024:>8} {ratio:>6}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Utilidades compartidas por los benchmarks: ejecución de una medición en un proceso
+nuevo, con la memoria pico que mide app_compilador.peak_rss_bytes.
+"""
+import multiprocessing
+import time
+
+from app_compilador import peak_rss_bytes
+
+
+def _measure(function, args, results):
+    baseline = peak_rss_bytes()
+    start = time.perf_counter()
+    extra = function(*args) or {}
+    seconds = time.perf_counter() - start
+    peak = peak_rss_bytes()
+    results.put(dict(
+        extra,
+        seconds=seconds,
+        peak_rss=peak,
+        extra_rss=peak - baseline if peak is not None and baseline is not None else None,
+    ))
+
+
+def run_isolated(function, *args):
+    """
+    Ejecuta function(*args) en un proceso nuevo y devuelve su tiempo ("seconds"), memoria
+    pico ("peak_rss", y "extra_rss" por encima de la del proceso antes de empezar) y lo que
+    devuelva function (un diccionario). function tiene que estar definida a nivel de módulo.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(function, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def megabytes(value):
+    return "-" if value is None else f"{value / (1024 * 1024):.0f}"
@@ -0,0 +1,207 @@
+"""
+Generador de carpetas sintéticas para los benchmarks: PDFs con membrete, escaneos grandes
+(JPEG y PNG), formularios DOCX y archivos de texto, en un orden parecido al de un expediente
+real (los escaneos vienen en tandas seguidas).
+
+Todo se genera con una semilla fija y sin usar app_compilador, así que la misma
+configuración produce el mismo corpus en cualquier commit. La firma (ver corpus_signature)
+permite comprobar que dos mediciones usaron el mismo corpus.
+
+Uso directo, para inspeccionarlo:
+    python benchmarks/corpus.py CARPETA [--perfil chico|mediano|grande]
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import tempfile
+
+from docx import Document
+from docx.shared import Mm
+from fpdf import FPDF
+from PIL import Image, ImageDraw
+
+# Cambiar cuando cambie lo que se genera, para que las firmas de corpus viejos no coincidan
+CORPUS_VERSION = 1
+
+# Cantidad de archivos de cada tipo; los tamaños se ajustan con las opciones de make_corpus
+PROFILES = {
+    "chico": {"pdfs": 4, "escaneos": 12, "docx": 4, "txt": 4},
+    "mediano": {"pdfs": 15, "escaneos": 60, "docx": 15, "txt": 15},
+    "grande": {"pdfs": 40, "escaneos": 200, "docx": 40, "txt": 40},
+}
+
+WORDS = [
+    "expediente", "solicitud", "resolución", "artículo", "señor", "dirección", "número", "trámite",
+    "fecha", "firma", "área", "de", "la", "el", "en", "por", "con", "para", "según", "consta",
+]
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_letterhead(path):
+    """Membrete que comparten los PDFs y los DOCX, como en documentos de una misma oficina."""
+    image = Image.new("RGB", (600, 150), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((10, 10, 140, 140), fill=(30, 60, 120))
+    for row in range(4):
+        draw.rectangle((170, 25 + row * 30, 560 - row * 60, 40 + row * 30), fill=(60, 60, 60))
+    image.save(path, "JPEG", quality=85)
+
+
+def make_pdf(path, rng, pages, letterhead):
+    """PDF de texto con membrete en cada página, escrito con FPDF."""
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    for _ in range(pages):
+        pdf.add_page()
+        pdf.image(letterhead, x=10, y=8, w=60)
+        pdf.set_y(30)
+        pdf.set_font("Arial", size=11)
+        for _ in range(rng.randint(8, 14)):
+            pdf.multi_cell(0, 6, sentence(rng, rng.randint(20, 60)))
+    pdf.output(path)
+
+
+def make_scan(path, rng, dpi, image_format):
+    """
+    Página A4 escaneada: renglones de "palabras" oscuras sobre papel con ruido, para que
+    JPEG y PNG la compriman como un escaneo real.
+    """
+    size = (round(210 / 25.4 * dpi), round(297 / 25.4 * dpi))
+    mode = "RGB" if image_format == "JPEG" and rng.random() < 0.5 else "L"
+    paper = Image.effect_noise((size[0] // 4, size[1] // 4), 12).resize(size)
+    image = Image.eval(paper, lambda value: min(255, value + 110)).convert(mode)
+    draw = ImageDraw.Draw(image)
+    line_height = max(4, dpi // 6)
+    margin = dpi // 2
+    y = margin
+    while y < size[1] - margin:
+        x = margin
+        while x < size[0] - margin:
+            width = rng.randint(dpi // 8, dpi // 2)
+            draw.rectangle((x, y, min(x + width, size[0] - margin), y + line_height // 2), fill=rng.randint(0, 70))
+            x += width + dpi // 12
+        y += line_height
+    if image_format == "JPEG":
+        image.save(path, "JPEG", quality=rng.choice([75, 85, 92]), dpi=(dpi, dpi))
+    else:
+        # Los PNG suelen ser escaneos en blanco y negro
+        image.convert("1").save(path, "PNG", dpi=(dpi, dpi))
+
+
+def make_docx(path, rng, letterhead):
+    """Formulario DOCX: encabezado, membrete, párrafos y una tabla."""
+    doc = Document()
+    header = doc.sections[0].header
+    header.is_linked_to_previous = False
+    header.paragraphs[0].text = f"Mesa de entradas - {sentence(rng, 3)}"
+    doc.add_picture(letterhead, width=Mm(60))
+    for _ in range(rng.randint(4, 20)):
+        doc.add_paragraph(sentence(rng, rng.randint(5, 80)))
+    table = doc.add_table(rows=rng.randint(3, 25), cols=rng.choice([2, 3, 4]))
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = sentence(rng, rng.randint(1, 6))
+    # python-docx guarda la fecha actual en las propiedades del documento
+    doc.core_properties.created = doc.core_properties.modified = datetime.datetime(2024, 1, 1)
+    doc.save(path)
+
+
+def make_txt(path, rng, size_bytes):
+    """Texto tipo log o nota, con algunas líneas largas que ocupan varios renglones."""
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        while written < size_bytes:
+            line = sentence(rng, rng.choice([4, 8, 12, 40])) + "\n"
+            f.write(line)
+            written += len(line.encode("utf-8"))
+
+
+def make_corpus(folder, profile="chico", seed=0, pdf_pages=5, scan_dpi=200, txt_kilobytes=50, counts=None):
+    """
+    Genera el corpus en folder (que se crea si no existe) y devuelve su descripción:
+    parámetros, cantidad y bytes por tipo, y firma. counts reemplaza cantidades del perfil.
+    """
+    counts = dict(PROFILES[profile], **(counts or {}))
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    # Orden del expediente: documentos sueltos intercalados con tandas de escaneos
+    kinds = ["pdf"] * counts["pdfs"] + ["docx"] * counts["docx"] + ["txt"] * counts["txt"]
+    rng.shuffle(kinds)
+    scans = counts["escaneos"]
+    sequence = []
+    for kind in kinds:
+        sequence.append(kind)
+        if scans and rng.random() < 0.4:
+            run = min(scans, rng.randint(1, 10))
+            sequence.extend(["escaneo"] * run)
+            scans -= run
+    sequence.extend(["escaneo"] * scans)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        letterhead = os.path.join(temp_dir, "membrete.jpg")
+        make_letterhead(letterhead)
+        for number, kind in enumerate(sequence):
+            base = os.path.join(folder, f"{number:04d}_{kind}")
+            if kind == "pdf":
+                make_pdf(base + ".pdf", rng, rng.randint(1, 2 * pdf_pages - 1), letterhead)
+            elif kind == "docx":
+                make_docx(base + ".docx", rng, letterhead)
+            elif kind == "txt":
+                make_txt(base + ".txt", rng, rng.randint(txt_kilobytes // 2, txt_kilobytes * 3 // 2) * 1024)
+            else:
+                image_format = "PNG" if rng.random() < 0.2 else "JPEG"
+                make_scan(base + (".png" if image_format == "PNG" else ".jpg"), rng, scan_dpi, image_format)
+
+    return describe_corpus(folder, {
+        "profile": profile, "seed": seed, "pdf_pages": pdf_pages, "scan_dpi": scan_dpi,
+        "txt_kilobytes": txt_kilobytes, "counts": counts, "version": CORPUS_VERSION,
+    })
+
+
+def describe_corpus(folder, parameters):
+    files = sorted(os.listdir(folder))
+    by_kind = {}
+    for filename in files:
+        kind = os.path.splitext(filename)[1].lower()
+        entry = by_kind.setdefault(kind, {"files": 0, "bytes": 0})
+        entry["files"] += 1
+        entry["bytes"] += os.path.getsize(os.path.join(folder, filename))
+    return {
+        "parameters": parameters,
+        "files": len(files),
+        "bytes": sum(entry["bytes"] for entry in by_kind.values()),
+        "by_kind": by_kind,
+        "signature": corpus_signature(folder, parameters),
+    }
+
+
+def corpus_signature(folder, parameters):
+    """
+    Firma del corpus: parámetros de generación más nombre y tamaño de cada archivo.
+    No usa el contenido porque FPDF guarda la fecha de creación dentro de cada PDF.
+    """
+    digest = hashlib.sha256(json.dumps(parameters, sort_keys=True).encode("utf-8"))
+    for filename in sorted(os.listdir(folder)):
+        digest.update(f"{filename}:{os.path.getsize(os.path.join(folder, filename))}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("carpeta")
+    parser.add_argument("--perfil", choices=sorted(PROFILES), default="chico")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+    description = make_corpus(args.carpeta, args.perfil, args.semilla)
+    print(json.dumps(description, indent=2))
+
+
+if __name__ == "__main__":
+    main()